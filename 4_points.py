@@ -35,253 +35,228 @@
 #---------------------------------------------------------------------------------------------------------------------------------------
 
 #Libraries
-import pyueye
-from pyueye import ueye
-import numpy as np
+import time
+started = time.perf_counter()   # start of the time-to-first-measurement report
 import cv2
-import sys
 import datetime
-from imutils import perspective
-from imutils import contours
-import imutils
 import argparse
-import math
-from matplotlib import pyplot as plt
-
+from optical import UEyeError
+from optical.aoi import AOITracker
+from optical.buffers import BufferPool
+from optical.metrics import Metrics, MetricsServer
+from optical.orientation import Orientation, MODES as ORIENTATIONS
+from optical.overlay import Display
+from optical.scale import AcquisitionScale, MODES
+from optical.snapshots import SnapshotWriter, FORMATS
+from optical.strategies import STRATEGIES, create, measure_frame
+from optical.recorder import SessionRecorder, RecordingSource
+from optical.pipeline import Pipeline, POLICIES, BLOCK, DROP_OLDEST
+from optical.sources import add_source_arguments, open_source, uses_camera
 
 
 #---------------------------------------------------------------------------------------------------------------------------------------
 
+#Arguments
+parser = argparse.ArgumentParser(description="Measure the X/Y offset between two fiber end faces")
+add_source_arguments(parser)
+parser.add_argument("--record", help="also write the raw frames to this session file (see optical/recorder.py)")
+parser.add_argument("--record-frames", type=int, default=1000, help="number of frames the session file has room for")
+mode = parser.add_mutually_exclusive_group()
+mode.add_argument("--strategy", choices=list(STRATEGIES), default="4_points",
+                  help="how the fiber ends are found (see optical/strategies.py)")
+mode.add_argument("--track", action="store_true",
+                  help="follow the four corners with optical flow, detecting them again only when tracking fails")
+mode.add_argument("--predict", action="store_true",
+                  help="predict where the ends move and only search a window around the prediction")
+parser.add_argument("--track-aoi", action="store_true",
+                    help="read out only a sensor AOI around the fiber ends once they are found (camera only)")
+parser.add_argument("--downscale", type=int, default=3,
+                    help="shrink frames by this integer factor before measuring (3: 1/3, the old fx=0.3)")
+parser.add_argument("--scale-mode", choices=MODES, default="auto",
+                    help="use sensor binning/subsampling for the downscale where available, or only software")
+parser.add_argument("--orientation", choices=ORIENTATIONS, default="auto",
+                    help="turn the image the right way up by mirroring the sensor readout where available, or by "
+                         "rotating the measured coordinates instead of the image; pixels flips every frame")
+parser.add_argument("--headless", action="store_true",
+                    help="no window and no drawing at all; print one line per measured frame")
+parser.add_argument("--metrics-port", type=int, default=None,
+                    help="serve per-stage latency histograms and frame counters in Prometheus format on this local port")
+parser.add_argument("--display-fps", type=float, default=15.0,
+                    help="refresh the window at most this many times a second (the measurement is not limited)")
+parser.add_argument("--snapshots", default="snapshots", help="folder the images saved with s are written to")
+parser.add_argument("--snapshot-format", choices=FORMATS, default="png",
+                    help="png, or npy for the raw array; a .json with the measurement is written next to each")
+parser.add_argument("--queue", type=int, default=2, help="frames buffered between acquisition and measurement")
+parser.add_argument("--policy", choices=POLICIES, default=None,
+                    help="what to do when the queue is full (default: drop_oldest live, block on a replay)")
+args = parser.parse_args()
+if args.record is not None and not uses_camera(args):
+    parser.error("--record needs the camera")
+
 #Variables
-hCam = ueye.HIDS(0)             #0: first available camera;  1-254: The camera with the specified camera ID
-sInfo = ueye.SENSORINFO()
-cInfo = ueye.CAMINFO()
-pcImageMemory = ueye.c_mem_p()
-MemID = ueye.int()
-rectAOI = ueye.IS_RECT()
-pitch = ueye.INT()
-nBitsPerPixel = ueye.INT(24)    #24: bits per pixel for color mode; take 8 bits per pixel for monochrome
-channels = 3                    #3: channels for color mode(RGB); take 1 channel for monochrome
-m_nColorMode = ueye.INT()		# Y8/RGB16/RGB24/REG32
-bytes_per_pixel = int(nBitsPerPixel / 8)
+pix = 2.75 # float(input('pix size (in um): ')), size of one pixel of the 0.3-scaled image
+scale = AcquisitionScale(args.downscale, args.scale_mode if uses_camera(args) else "software")
+orientation = Orientation(args.orientation)
+# --track and --predict are the "track" and "predict" strategies
+strategy_name = "track" if args.track else "predict" if args.predict else args.strategy
+try:
+    strategy = create(strategy_name, scale, pix)
+except IOError as e:
+    parser.error(str(e))
 #---------------------------------------------------------------------------------------------------------------------------------------
 print("START")
 print()
-
-def midpoint(ptA, ptB):
-    return ((ptA[0] + ptB[0]) * 0.5, (ptA[1] + ptB[1]) * 0.5)
-
-
-# Starts the driver and establishes the connection to the camera
-nRet = ueye.is_InitCamera(hCam, None)
-if nRet != ueye.IS_SUCCESS:
-    print("is_InitCamera ERROR")
-
-# Reads out the data hard-coded in the non-volatile camera memory and writes it to the data structure that cInfo points to
-nRet = ueye.is_GetCameraInfo(hCam, cInfo)
-if nRet != ueye.IS_SUCCESS:
-    print("is_GetCameraInfo ERROR")
-
-# You can query additional information about the sensor type used in the camera
-nRet = ueye.is_GetSensorInfo(hCam, sInfo)
-if nRet != ueye.IS_SUCCESS:
-    print("is_GetSensorInfo ERROR")
-
-nRet = ueye.is_ResetToDefault( hCam)
-if nRet != ueye.IS_SUCCESS:
-    print("is_ResetToDefault ERROR")
-
-# Set display mode to DIB
-nRet = ueye.is_SetDisplayMode(hCam, ueye.IS_SET_DM_DIB)
-
-# Set the right color mode
-if int.from_bytes(sInfo.nColorMode.value, byteorder='big') == ueye.IS_COLORMODE_BAYER:
-    # setup the color depth to the current windows setting
-    ueye.is_GetColorDepth(hCam, nBitsPerPixel, m_nColorMode)
-    bytes_per_pixel = int(nBitsPerPixel / 8)
-    print("IS_COLORMODE_BAYER: ", )
-    print("\tm_nColorMode: \t\t", m_nColorMode)
-    print("\tnBitsPerPixel: \t\t", nBitsPerPixel)
-    print("\tbytes_per_pixel: \t\t", bytes_per_pixel)
-    print()
-
-elif int.from_bytes(sInfo.nColorMode.value, byteorder='big') == ueye.IS_COLORMODE_CBYCRY:
-    # for color camera models use RGB32 mode
-    m_nColorMode = ueye.IS_CM_BGRA8_PACKED
-    nBitsPerPixel = ueye.INT(32)
-    bytes_per_pixel = int(nBitsPerPixel / 8)
-    print("IS_COLORMODE_CBYCRY: ", )
-    print("\tm_nColorMode: \t\t", m_nColorMode)
-    print("\tnBitsPerPixel: \t\t", nBitsPerPixel)
-    print("\tbytes_per_pixel: \t\t", bytes_per_pixel)
-    print()
-
-elif int.from_bytes(sInfo.nColorMode.value, byteorder='big') == ueye.IS_COLORMODE_MONOCHROME:
-    # for color camera models use RGB32 mode
-    m_nColorMode = ueye.IS_CM_MONO8
-    nBitsPerPixel = ueye.INT(8)
-    bytes_per_pixel = int(nBitsPerPixel / 8)
-    print("IS_COLORMODE_MONOCHROME: ", )
-    print("\tm_nColorMode: \t\t", m_nColorMode)
-    print("\tnBitsPerPixel: \t\t", nBitsPerPixel)
-    print("\tbytes_per_pixel: \t\t", bytes_per_pixel)
-    print()
-
+startup = {'imports': time.perf_counter() - started}
+
+
+# Latency of every stage, exported with --metrics-port (optical/metrics.py)
+metrics = Metrics() if args.metrics_port is not None else None
+if metrics is not None:
+    metrics.count("detection_failures", 0)
+
+
+# Per-frame intermediates are written into preallocated buffers and reused (optical/buffers.py): one pool for the
+# measurement thread (the strategy has its own), one for the display
+buffers = BufferPool()
+display_buffers = BufferPool()
+
+
+def measure(array):
+    # The frame is shrunk by what the sensor did not already bin or subsample, measured in Mono8 (a colour frame,
+    # --color, is only kept for the display) and, the camera being upside down, measured the right way up: the sensor
+    # mirrors its readout, or the strategy measures the frame as it is and returns the coordinates of the flipped one;
+    # the image is only turned for the display (optical/strategies.py measure_frame, optical/orientation.py)
+    m = measure_frame(array, scale, orientation, strategy, buffers, metrics)
+    dic2 = m.dic2()
+    dic2['image'] = m.image
+    if m.color is not None:
+        dic2['color'] = m.color
+    return dic2
+
+
+def print_measurement(frame, dic2):
+    mids = " ".join("(%.1f, %.1f)" % (x, y) for (x, y) in dic2['XYTupleList'][:2])
+    print(frame.index, mids, "X-Difference is", abs(dic2['XDifference']), "um", "Y-Difference is", abs(dic2['YDifference']), "um")
+
+
+# Frames come from a recording, the synthetic generator or the camera, acquiring into a ring of image memories
+# (see optical/sources.py and optical/ring.py)
+if not uses_camera(args):
+    source = open_source(args)
+    session = getattr(source, "session", None)
+    if session is not None:
+        # a session recorded with sensor binning/subsampling only needs the rest of the reduction in software
+        scale.assume(session.meta.get('hardware', "none"), session.meta.get('hardware_factor', 1))
+        scale.rotated = orientation.assume(session.meta.get('rotated', False)).in_sensor
+    policy = args.policy or BLOCK
+    tracker = None
 else:
-    # for monochrome camera models use Y8 mode
-    m_nColorMode = ueye.IS_CM_MONO8
-    nBitsPerPixel = ueye.INT(8)
-    bytes_per_pixel = int(nBitsPerPixel / 8)
-    print("else")
-
-# Can be used to set the size and position of an "area of interest"(AOI) within an image
-nRet = ueye.is_AOI(hCam, ueye.IS_AOI_IMAGE_GET_AOI, rectAOI, ueye.sizeof(rectAOI))
-if nRet != ueye.IS_SUCCESS:
-    print("is_AOI ERROR")
-
-width = rectAOI.s32Width
-height = rectAOI.s32Height
-
-# Prints out some information about the camera and the sensor
-print("Camera model:\t\t", sInfo.strSensorName.decode('utf-8'))
-print("Camera serial no.:\t", cInfo.SerNo.decode('utf-8'))
-print("Maximum image width:\t", width)
-print("Maximum image height:\t", height)
-
-#---------------------------------------------------------------------------------------------------------------------------------------
-
-# Allocates an image memory for an image having its dimensions defined by width and height and its color depth defined by nBitsPerPixel
-nRet = ueye.is_AllocImageMem(hCam, width, height, nBitsPerPixel, pcImageMemory, MemID)
-if nRet != ueye.IS_SUCCESS:
-    print("is_AllocImageMem ERROR")
-else:
-    # Makes the specified image memory the active memory
-    nRet = ueye.is_SetImageMem(hCam, pcImageMemory, MemID)
-    if nRet != ueye.IS_SUCCESS:
-        print("is_SetImageMem ERROR")
-    else:
-        # Set the desired color mode
-        nRet = ueye.is_SetColorMode(hCam, m_nColorMode)
-
-
-
-# Activates the camera's live video mode (free run mode)
-nRet = ueye.is_CaptureVideo(hCam, ueye.IS_DONT_WAIT)
-if nRet != ueye.IS_SUCCESS:
-    print("is_CaptureVideo ERROR")
-
-# Enables the queue mode for existing image memory sequences
-nRet = ueye.is_InquireImageMem(hCam, pcImageMemory, MemID, width, height, nBitsPerPixel, pitch)
-if nRet != ueye.IS_SUCCESS:
-    print("is_InquireImageMem ERROR")
+    try:
+        source = open_source(args, scale, buffers=args.queue + 2, orientation=orientation)
+    except UEyeError as e:
+        print(e)
+        raise SystemExit(1)
+    camera = source.camera
+    if args.record is not None:
+        # raw frames as they come out of the ring (sensor reduction, mirroring and AOI applied, not yet resized)
+        recorder = SessionRecorder(args.record, args.record_frames, camera.width, camera.height, camera.bits_per_pixel // 8,
+                                   meta={'hardware': scale.hardware, 'hardware_factor': scale.hardware_factor,
+                                         'rotated': orientation.in_sensor, 'sensor': camera.sensor_name,
+                                         'serial_no': camera.serial_no})
+        source = RecordingSource(source, recorder)
+    policy = args.policy or DROP_OLDEST
+    tracker = AOITracker(camera, flipped=not orientation.in_sensor) if args.track_aoi else None
+    if metrics is not None:
+        gaps = source.gaps
+        metrics.counter("sensor_frames_missed", "Sensor frames missing from the camera frame counter",
+                        lambda: gaps.missed)
+        metrics.counter("sensor_frame_gaps", "Jumps of the camera frame counter by more than one", lambda: gaps.gaps)
+startup['source'] = time.perf_counter() - started
+
+
+def startup_report():
+    return "Startup: first measurement %.3f s after start: imports %.3f s, opening the %s %.3f s, first frame %.3f s" % (
+        startup['first'], startup['imports'], "camera" if uses_camera(args) else "source",
+        startup['source'] - startup['imports'], startup['first'] - startup['source'])
+
+
+def sink(frame, dic2):
+    if 'first' not in startup:
+        startup['first'] = time.perf_counter() - started
+        print(startup_report())
+    if metrics is not None and len(dic2['XYTupleList']) < 2:
+        metrics.count("detection_failures")
+    if tracker is not None:
+        tracker.update(frame, dic2)
+    if args.headless:
+        print_measurement(frame, dic2)
+
+
+# Acquisition and measurement run on their own threads (optical/pipeline.py); this loop only shows the latest result,
+# at most --display-fps times a second, with an overlay that is redrawn only when the values change (optical/overlay.py)
+pipeline = Pipeline(source, measure, depth=args.queue, policy=policy, sink=sink, metrics=metrics).start()
+server = None
+if metrics is not None:
+    server = MetricsServer(metrics, args.metrics_port)
+    print("Metrics on http://127.0.0.1:%d/metrics" % server.port)
+
+if args.headless:
+    display = None
+    try:
+        pipeline.wait()
+    except KeyboardInterrupt:
+        pass
 else:
+    display = Display("froggy", args.display_fps)
+    snapshots = SnapshotWriter(args.snapshots, args.snapshot_format)
     print("Press s to save the image")
     print("Press q to leave the programm")
 
-
-# DECLARE VARIABLES
-pix = 2.75 # float(input('pix size (in um): '))
-
-
-# Continuous image display
-while(nRet == ueye.IS_SUCCESS):
-    # In order to display the image in an OpenCV window we need to extract the data of our image memory
-    array = ueye.get_data(pcImageMemory, width, height, nBitsPerPixel, pitch, copy=False)
-
-    # bytes_per_pixel = int(nBitsPerPixel / 8)
-
-    # ...reshape it in an numpy array...
-    frame = np.reshape(array,(height.value, width.value, bytes_per_pixel))
-
-    # ...resize the image by a half
-    frame = cv2.resize(frame,(0,0),fx=0.3, fy=0.3)
-    #print('size',frame.shape)
-    
-#---------------------------------------------------------------------------------------------------------------------------------------
-
-    #Include image data processing here
-
-    # Flip image
-    # DECLARE VARIABLES WHICH WILL BE RESET EACH TIME IT LOOPS
-    dic2 = {
-        'XYTupleList': [],
-        'XDifference': 0,
-        'YDifference': 0,
-    }
-
-    image = cv2.flip(frame, -1)
-
-    # Find contours
-    cnts = cv2.findContours(image.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    cnts = imutils.grab_contours(cnts)
-
-    for c in cnts:
-        # Use goodFeaturesToTrack to identify the corners, aka points with high definition and with which the gradient
-        # fades off abruptly
-        pts = cv2.goodFeaturesToTrack(image, 9, 0.01, 12)
-        # Convert it into keypoints so that they can be plotted later
-        kps = [cv2.KeyPoint(x=f[0][0], y=f[0][1], _size=20) for f in pts]
-
-        for i in range(len(pts)):
-            for j in range(len(pts)):
-                # Calculate the difference in the y-coordinates so that we can use it to filter the lines
-                y_distance = pts[i][0][1] - pts[j][0][1]
-                x_distance = abs(pts[i][0][0] - pts[j][0][0])
-                # print("X-distance is: ", x_distance)
-                # print("Y-distance is: ", y_distance)
-                # The distance is calculated as 219 by using plt.imshow(image), plt.show()
-                if 200 < y_distance < 223 and 0 < x_distance < 8:
-                    (cX, cY) = midpoint((pts[i][0][0], pts[i][0][1]), (pts[j][0][0], pts[j][0][1]))
-
-                    cv2.line(image, (int(pts[i][0][0]), int(pts[i][0][1])), (int(pts[j][0][0]), int(pts[j][0][1])), (255, 0, 0), 1)
-                    cv2.circle(image, (int(cX), int(cY)), 4, (255, 255, 255), -1)
-                    # cv2.rectangle(image, (int(cX -20 ), int(cY -20)), (int(cX + 20), int(cY + 20)), (0, 0, 0), -1)
-                    cv2.putText(image, "mid", (int(cX-20), int(cY - 20)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-
-                    # Append the X and Y coordinates
-                    # Result of dic2['XYTupleList'] = [(288.0, 238.0), (322.0, 157.5)]
-                    # Where dic2['XYTupleList'] = [(x, y), (x1, y1)]
-                    # To access x, do dic2['XYTupleList'][0][0]
-                    dic2['XYTupleList'].append((cX, cY))
-
-                    if len(dic2['XYTupleList']) == 2:
-                        xDifference = dic2['XYTupleList'][0][0] - dic2['XYTupleList'][1][0]
-                        yDifference = dic2['XYTupleList'][0][1] - dic2['XYTupleList'][1][1]
-                        dic2['XDifference'] = xDifference * pix
-                        dic2['YDifference'] = yDifference * pix
-                    # print(dic2)
-                    cv2.rectangle(image, (0, 0), (225, 80), (255, 255, 255), -1)
-                    cv2.putText(image, "X-Difference is " + str(abs(dic2['XDifference'])) + " um", (0, 60), cv2.QT_FONT_NORMAL,
-                                0.5,
-                                (0, 0, 0), thickness=1)
-                    cv2.putText(image, "Y-Difference is " + str(abs(dic2['YDifference'])) + " um", (0, 30), cv2.QT_FONT_NORMAL,
-                                0.5,
-                                (0, 0, 0), thickness=1)
-
-
-        # pts = pts.sort()
-        img2 = cv2.drawKeypoints(image, kps, None, color=(0, 255, 0), flags=0)
-        cv2.imshow("froggy", img2)
-        # print("break")
-
-    # Save screenshot into file. edit the file location to be saved into
-    img_name = datetime.datetime.now().strftime("%Y-%m-%d%H-%M-%S-%f")
-    # cv2.imwrite('output_image/' + str(img_name) + '.jpg', input_rgb)
-    # Press q if you want to end the loop
-    if cv2.waitKey(1) &0xFF==ord('s'):
-        cv2.imwrite('C:/Users/Er Wen/Pictures/Optical' + str(img_name) + '.jpg', image) #儲存路徑
-    if cv2.waitKey(1) & 0xFF == ord('q'):
+shown = None
+while not args.headless and pipeline.running():
+    if display.due():
+        latest = pipeline.latest()
+        if latest is not None and latest[0] != shown:
+            shown, dic2 = latest
+            display.show(orientation.upright(dic2.get('color', dic2['image']), display_buffers), dic2)
+
+    # Press s to save a screenshot, q if you want to end the loop
+    key = cv2.waitKey(display.wait_ms()) & 0xFF
+    if key == ord('s') and shown is not None:
+        # Save the measured image and its measurement; written in the background, see optical/snapshots.py
+        img_name = datetime.datetime.now().strftime("%Y-%m-%d%H-%M-%S-%f")
+        metadata = dict((k, v) for k, v in dic2.items() if k not in ('image', 'color', 'groups', 'corners'))
+        metadata['frame'] = shown
+        if not snapshots.save(orientation.upright(dic2.get('color', dic2['image'])), metadata, 'Optical' + str(img_name)):
+            print("Snapshot dropped, the writer is still busy with the previous ones")
+    if key == ord('q'):
         break
 #---------------------------------------------------------------------------------------------------------------------------------------
 
-# Releases an image memory that was allocated using is_AllocImageMem() and removes it from the driver management
-ueye.is_FreeImageMem(hCam, pcImageMemory, MemID)
-
-# Disables the hCam camera handle and releases the data structures and memory areas taken up by the uEye camera
-ueye.is_ExitCamera(hCam)
+pipeline.stop()
+if server is not None:
+    server.close()
+print(pipeline.report())
+if 'first' in startup:
+    print(startup_report())
+if getattr(source, "gaps", None) is not None and source.gaps.delivered:
+    # sensor frames lost between the camera and the ring, from the camera frame counter (optical/gaps.py)
+    print(source.gaps.report(pipeline.stats()['measured_fps']))
+if strategy.report() is not None:
+    print(strategy.report())
+if display is not None:
+    print("Display: %d refreshes, overlay drawn %d times" % (display.shown, display.overlay.renders))
+    snapshots.close()
+    print(snapshots.report())
+
+# Releases the image memories of the ring and the camera handle (and closes the session file)
+source.close()
+if args.record is not None:
+    print(recorder.report())
 
 # Destroys the OpenCv windows
-cv2.destroyAllWindows()
+if not args.headless:
+    cv2.destroyAllWindows()
 
 print()
 print("END")
@@ -0,0 +1,80 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Accuracy against speed, on synthetic frames with known offsets
+#
+#     python benchmarks/bench_accuracy.py [--frames 40] [--seed 1]
+#
+# Renders full sensor frames with optical/synthetic.py and compares what is measured with the true X/Y difference.
+#   scale:  independent frames (random offset, blur, noise, gradient) measured from scratch at 1/2 ... 1/6
+#   modes:  a sequence with the second fiber drifting, measured at 1/3 by detection on every frame, --track
+#           (optical/tracking.py) and --predict (optical/motion.py)
+# Errors are in um on the magnitudes (the order of the two ends in a result is not fixed): the mean (bias) and
+# RMS of |measured| - |true|, over the frames where both ends were found.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.measure import measure_4_points
+from optical.motion import PredictiveWindow
+from optical.scale import AcquisitionScale
+from optical.synthetic import generate
+from optical.tracking import CornerTracker
+
+
+def run(images, truth, scale, measure):
+    found, ex, ey, times = 0, [], [], []
+    for image, t in zip(images, truth):
+        start = time.perf_counter()
+        dic2 = measure(cv2.flip(scale.apply(image), -1))
+        times.append(time.perf_counter() - start)
+        if len(dic2['XYTupleList']) >= 2:
+            found += 1
+            ex.append(abs(dic2['XDifference']) - abs(t['x_um']))
+            ey.append(abs(dic2['YDifference']) - abs(t['y_um']))
+    ex, ey = np.array(ex), np.array(ey)
+
+    def stats(e):
+        return (e.mean(), np.sqrt((e ** 2).mean())) if len(e) else (np.nan, np.nan)
+
+    return (found / float(len(images)),) + stats(ex) + stats(ey) + (np.median(times) * 1e3,)
+
+
+def detector(scale):
+    pix, y_window, x_window = scale.pixel_size(), scale.window(200, 223), scale.window(0, 8)
+    return lambda image: measure_4_points(image, pix, y_window, x_window)
+
+
+def row(name, result):
+    print("%-14s %6.0f%% %9.2f %8.2f %9.2f %8.2f %10.2f" % ((name, result[0] * 100) + result[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("%-14s %7s %9s %8s %9s %8s %10s" % ("", "found", "x bias", "x rms", "y bias", "y rms", "ms/frame"))
+    images, truth = generate(args.frames, args.seed, dx_um=(-5, 5), dy_um=(-20, 20), angle=(0.5, 1.2), blur=(0.5, 2),
+                             noise=(0, 4), gradient=(0, 0.3))
+    for factor in (2, 3, 4, 6):
+        scale = AcquisitionScale(factor, "software")
+        row("scale 1/%d" % factor, run(images, truth, scale, detector(scale)))
+
+    images, truth = generate(args.frames, args.seed, dy_um=np.linspace(-10, 10, args.frames), blur=1.0, noise=2.0)
+    scale = AcquisitionScale(3, "software")
+    pix, y_window, x_window = scale.pixel_size(), scale.window(200, 223), scale.window(0, 8)
+    row("detect", run(images, truth, scale, detector(scale)))
+    row("track", run(images, truth, scale, CornerTracker(pix, y_window, x_window).measure))
+    row("predict", run(images, truth, scale, PredictiveWindow(detector(scale), pix, y_window).measure))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Memory over a long replay: the per-frame buffers are allocated once
+#
+#     python benchmarks/bench_allocations.py [--frames 10000] [--warmup 200] [--strategy 4_points] [--recording PATH]
+#
+# Replays a recording (by default 20 synthetic frames saved to a temporary .npy stack, repeated) through a Pipeline
+# with the 4_points.py measurement and follows the memory with tracemalloc, which sees every NumPy array, including
+# the ones OpenCV returns, but not OpenCV's own scratch memory inside a call. After the warm-up frames:
+#   pool allocations   buffers the BufferPools still had to allocate (should be 0)
+#   growth             traced memory at the end minus after the warm-up (should stay near 0)
+#   largest transient  peak traced memory minus after the warm-up; below the size of one scaled frame means the loop
+#                      did not allocate a single frame-sized array
+# --no-pool runs the measurement the way it was before optical/buffers.py for comparison. The exit status is 1 when
+# one of the checks fails.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.buffers import BufferPool
+from optical.measure import measure_4_points
+from optical.orientation import Orientation
+from optical.pipeline import Pipeline, BLOCK
+from optical.scale import AcquisitionScale
+from optical.sources import mono8, open_recording
+from optical.strategies import STRATEGIES, create, measure_frame
+from optical.synthetic import generate
+
+GROWTH_LIMIT = 64 * 1024        # bytes of Python objects the run may leave behind (interned ints, caches, ...)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=10000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--downscale", type=int, default=3)
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="4_points")
+    parser.add_argument("--recording", help="replay this recording instead of synthetic frames")
+    parser.add_argument("--no-pool", action="store_true", help="scale, flip and measure without the buffer pools")
+    args = parser.parse_args()
+
+    folder = None
+    path = args.recording
+    if path is None:
+        folder = tempfile.mkdtemp()
+        path = os.path.join(folder, "frames.npy")
+        np.save(path, np.stack(generate(20, 1, dy_um=np.linspace(-10, 10, 20))[0]))
+    probe = open_recording(path)
+    count, shape = len(probe), probe.read().array.shape
+    probe.close()
+    source = open_recording(path, -(-args.frames // count))
+    frame_bytes = (shape[0] // args.downscale) * (shape[1] // args.downscale)
+
+    scale = AcquisitionScale(args.downscale, "software")
+    orientation = Orientation()
+    strategy = create(args.strategy, scale)
+    pools = (BufferPool(), strategy.pool)
+    pix, y_window, x_window = scale.pixel_size(), scale.window(200, 223), scale.window(0, 8)
+
+    def measure(array):
+        if args.no_pool:
+            return measure_4_points(cv2.flip(mono8(scale.apply(array)), -1), pix, y_window, x_window)
+        return measure_frame(array, scale, orientation, strategy, pools[0]).dic2()
+
+    def pooled(key):
+        return sum(pool.stats()[key] for pool in pools)
+
+    marks = {}
+
+    def sink(frame, dic2):
+        if frame.index == args.warmup - 1:
+            marks['allocations'] = pooled('allocations')
+            marks['memory'] = tracemalloc.get_traced_memory()[0]
+            marks['start'] = time.perf_counter()
+            tracemalloc.reset_peak()
+
+    tracemalloc.start()
+    pipeline = Pipeline(source, measure, policy=BLOCK, sink=sink).start()
+    pipeline.wait()
+    stop = time.perf_counter()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    source.close()
+    if folder is not None:
+        shutil.rmtree(folder)
+
+    measured = pipeline.measured - args.warmup
+    new = pooled('allocations') - marks['allocations']
+    growth = current - marks['memory']
+    transient = peak - marks['memory']
+    print("%d frames after %d warm-up frames, %.1f fps%s" % (measured, args.warmup, measured / (stop - marks['start']),
+                                                            " (without the buffer pools)" if args.no_pool else ""))
+    print("pool allocations:  %d (%d buffers, %.1f MB held)" % (new, pooled('buffers'), pooled('bytes') / 1e6))
+    print("growth:            %+d bytes" % growth)
+    print("largest transient: %d bytes (one scaled frame is %d)" % (transient, frame_bytes))
+    failed = new > 0 or growth > GROWTH_LIMIT or transient >= frame_bytes
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
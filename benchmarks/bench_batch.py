@@ -0,0 +1,82 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Batch analyzer throughput against the number of worker processes
+#
+#     python benchmarks/bench_batch.py [--frames 256] [--chunk 32]
+#
+# Writes a .npy stack of simulated frames and measures it with optical.batch using 1, 2, 4, ... workers up to the
+# number of cores, printing frames/s and the speedup over one worker.
+# Before that it checks that python -m optical.batch --strategy dnn, run where the Caffe network files are not,
+# exits at once with an error instead of starting workers (exit status 1 if not).
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from optical.batch import analyze
+from optical.sim import fiber_scene
+
+
+def check_unbuildable(path, timeout=60):
+    """True if the batch analyzer refuses a strategy it cannot build with a non-zero exit, without writing output."""
+    folder = tempfile.mkdtemp()
+    out = os.path.join(folder, "rows.csv")
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT))
+    try:
+        done = subprocess.run([sys.executable, "-m", "optical.batch", path, "--out", out, "--strategy", "dnn"],
+                              cwd=folder, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print("  --strategy dnn was still running after %d s" % timeout)
+        return False
+    else:
+        return done.returncode != 0 and b"Caffe network files" in done.stdout and not os.path.exists(out)
+    finally:
+        shutil.rmtree(folder)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=256)
+    parser.add_argument("--chunk", type=int, default=32)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), "bench_batch.npy")
+    stack = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(args.frames, 1920, 2560))
+    for i in range(args.frames):
+        stack[i] = fiber_scene(i, 2560, 1920, 1)
+    stack.flush()
+    del stack
+
+    refused = check_unbuildable(path)
+    print("unbuildable strategy refused: %s" % ("OK" if refused else "FAILED"))
+
+    workers = [1]
+    while workers[-1] * 2 <= multiprocessing.cpu_count():
+        workers.append(workers[-1] * 2)
+    if workers[-1] != multiprocessing.cpu_count():
+        workers.append(multiprocessing.cpu_count())
+
+    print("%8s %10s %8s" % ("workers", "frames/s", "speedup"))
+    single = None
+    for n in workers:
+        start = time.perf_counter()
+        count = sum(1 for _ in analyze(path, n, args.chunk))
+        fps = count / (time.perf_counter() - start)
+        single = single or fps
+        print("%8d %10.1f %8.2f" % (n, fps, fps / single))
+    os.remove(path)
+    sys.exit(0 if refused else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Frame bus: analysis processes over shared memory against the single-process loop, at full sensor resolution
+#
+#     python benchmarks/bench_framebus.py [--frames 300] [--readers 1,2,4] [--slots 8] [--slow-ms 40]
+#
+# The same 2560 x 1920 Mono8 frames (20 synthetic ones, repeated) are measured the 4_points.py way (1/3 scale, upside
+# down, 4_points) by
+#   single     one process: the Pipeline of 4_points.py, acquisition and measurement threads sharing the GIL
+#   bus x N    this process publishes every frame into an optical/framebus.py FrameBus (policy block, so nothing is
+#              lost) and N analysis processes measure one N-th of them each, straight from the shared slots
+# and prints the frames per second, the time publish() takes (the one copy into shared memory) and the latency from
+# reading a frame to an analysis process having it. With N processes the speed-up can only show on a machine with
+# N free cores; the number of cores is printed with the results.
+# Before that it checks that frames a reader holds stay untouched while the writer goes on: two frames are held
+# across several publishes into a small bus, then one is released and the other still held; and that an analysis
+# process with two readers of the same bus can close one and go on reading with the other (exit status 1 if not).
+# The last two rows put one reader that needs --slow-ms per frame behind the bus with each policy: drop_oldest keeps
+# the publisher at full speed and the reader misses frames, block makes the publisher wait for it.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.buffers import BufferPool
+from optical.framebus import FrameBus
+from optical.orientation import Orientation
+from optical.pipeline import Pipeline, BLOCK, DROP_OLDEST
+from optical.scale import AcquisitionScale
+from optical.sources import ArraySource, Frame, each_frame
+from optical.strategies import create, measure_frame
+from optical.synthetic import generate
+
+
+def measurement(downscale):
+    scale = AcquisitionScale(downscale, "software")
+    orientation = Orientation()
+    strategy = create("4_points", scale)
+    buffers = BufferPool()
+
+    def measure(array):
+        return measure_frame(array, scale, orientation, strategy, buffers).dic2()
+    return measure
+
+
+def check_held():
+    """True if two frames held by one reader keep their pixels while the writer publishes around them."""
+    frame_bus = FrameBus(64, 8, 8, slots=3, readers=1, policy=DROP_OLDEST)
+    reader = frame_bus.attach()
+    counter = [0]
+
+    def publish(n):
+        for _ in range(n):
+            counter[0] += 1
+            frame_bus.publish(Frame(np.full((8, 64), counter[0], np.uint8), counter[0]))
+
+    publish(2)
+    a, b = reader.read(), reader.read()
+    publish(6)
+    ok = (a.array == a.index).all() and (b.array == b.index).all()
+    a.release()
+    publish(6)
+    ok = ok and (b.array == b.index).all()
+    b.release()
+    reader.close()
+    frame_bus.close()
+    return bool(ok)
+
+
+def two_readers(bus, results):
+    first, second = bus.attach((0, 2)), bus.attach((1, 2))
+    first.close()
+    results.put(None)
+    try:
+        results.put([frame.index for frame in each_frame(second)])
+    except Exception as e:
+        results.put(repr(e))
+    second.close()
+
+
+def check_readers():
+    """True if a reader goes on reading after another reader of the same process closed."""
+    # spawned, as on Windows: the analysis process gets the bus pickled instead of a forked copy of the owner's
+    method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method("spawn", force=True)
+    try:
+        frame_bus = FrameBus(64, 8, 8, slots=4, readers=2, policy=DROP_OLDEST)
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=two_readers, args=(frame_bus, results))
+        process.start()
+        results.get()
+        for i in range(1, 4):       # fewer frames than slots: none is lost, whatever the reader does
+            frame_bus.publish(Frame(np.full((8, 64), i, np.uint8), i))
+        frame_bus.close()
+        read = results.get(timeout=30)
+        process.join()
+    finally:
+        multiprocessing.set_start_method(method, force=True)
+    return read == [1, 3]
+
+
+def single(frames, count, downscale):
+    source = ArraySource(frames, -(-count // len(frames)))
+    pipeline = Pipeline(source, measurement(downscale), policy=BLOCK).start()
+    pipeline.wait()
+    return pipeline.stats()['measured_fps']
+
+
+def analyze(bus, part, downscale, slow_s, results):
+    cv2.setNumThreads(1)
+    measure = measurement(downscale)
+    reader = bus.attach(part)
+    latencies = []
+    for frame in each_frame(reader):
+        latencies.append(time.perf_counter() - frame.timestamp)
+        measure(frame.array)
+        if slow_s:
+            time.sleep(slow_s)
+    results.put((time.perf_counter(), latencies, reader.stats()))
+    reader.close()
+
+
+def bus(frames, count, downscale, readers, slots, policy=BLOCK, slow_s=0.0):
+    height, width = frames.shape[1:]
+    frame_bus = FrameBus(width, height, 8, slots=slots, readers=readers, policy=policy)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=analyze, args=(frame_bus, (i, readers), downscale, slow_s, results))
+                 for i in range(readers)]
+    for process in processes:
+        process.start()
+    while frame_bus.attached() < readers:
+        time.sleep(0.01)
+
+    source = ArraySource(frames, -(-count // len(frames)))
+    publish = []
+    start = time.perf_counter()
+    for frame in each_frame(source):
+        t = time.perf_counter()
+        frame_bus.publish(frame)
+        publish.append(time.perf_counter() - t)
+        if len(publish) == count:
+            break
+    published = time.perf_counter()
+    frame_bus.close()
+    done = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    end = max(finished for finished, latencies, stats in done)
+    latencies = [l for finished, ls, stats in done for l in ls]
+    measured = sum(stats['read'] for finished, ls, stats in done)
+    missed = sum(stats['missed'] for finished, ls, stats in done)
+    return {'fps': measured / (end - start), 'publish_fps': count / (published - start), 'measured': measured,
+            'missed': missed, 'publish_ms': np.median(publish) * 1e3, 'latency_ms': np.median(latencies) * 1e3}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--readers", default="1,2,4", help="numbers of analysis processes to try")
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--downscale", type=int, default=3)
+    parser.add_argument("--slow-ms", type=float, default=40.0, help="extra time per frame of the slow reader")
+    args = parser.parse_args()
+
+    held = check_held()
+    print("held frames untouched by the writer: %s" % ("OK" if held else "FAILED"))
+    readers = check_readers()
+    print("second reader of a process after the first closed: %s" % ("OK" if readers else "FAILED"))
+    frames = generate(20, 1, dy_um=np.linspace(-10, 10, 20))[0]
+    print("%d frames of %dx%d Mono8, %d cores" % (args.frames, frames.shape[2], frames.shape[1], os.cpu_count()))
+    print("%-22s %10s %10s %12s %12s %10s" % ("loop", "fps", "speed-up", "publish ms", "latency ms", "missed"))
+    base = single(frames, args.frames, args.downscale)
+    print("%-22s %10.1f %10.2f %12s %12s %10s" % ("single", base, 1.0, "-", "-", "-"))
+    for readers in (int(n) for n in args.readers.split(",")):
+        r = bus(frames, args.frames, args.downscale, readers, args.slots)
+        print("%-22s %10.1f %10.2f %12.2f %12.2f %10d" % ("bus x %d" % readers, r['fps'], r['fps'] / base,
+                                                         r['publish_ms'], r['latency_ms'], r['missed']))
+    for policy in (DROP_OLDEST, BLOCK):
+        r = bus(frames, args.frames, args.downscale, 1, args.slots, policy, args.slow_ms / 1e3)
+        print("%-22s %10.1f %10s %12.2f %12.2f %10d   publisher %.1f fps" % (
+            "slow reader, %s" % policy, r['fps'], "-", r['publish_ms'], r['latency_ms'], r['missed'], r['publish_fps']))
+    sys.exit(0 if held and readers else 1)
+
+
+if __name__ == "__main__":
+    main()
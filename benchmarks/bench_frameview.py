@@ -0,0 +1,159 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Frame views over padded image memories: correct pixels, no copies
+#
+#     python benchmarks/bench_frameview.py [--cases 2000] [--seed 0]
+#
+# Checks optical/frameview.py three ways and exits with status 1 if anything is off:
+#   synthetic  random buffers with an arbitrary line pitch (odd ones included), start offset, pixel format and
+#              sub-window; the view must hold the bytes the pitch arithmetic says it should and share the buffer
+#              (a byte changed in the buffer afterwards must show up in the view)
+#   sim        the simulated camera with image memories padded to several line alignments, full frame and an AOI,
+#              read through Camera, ImageRing and RingSource as 4_points.py does
+#   rejects    pitches shorter than a line and buffers too small for the frame must raise ValueError
+# and times building a view of a padded 2560 x 1920 Mono8 memory against the reshape and copy it replaces.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import ctypes
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical import Camera
+from optical.frameview import frame_view, memory_view, window
+from optical.orientation import Orientation
+from optical.sim import SimulatedUEye
+from optical.sources import RingSource
+
+FORMATS = ((8, "u1", 1), (16, "<u2", 1), (24, "u1", 3), (32, "u1", 4))
+
+
+def expected(raw, width, height, dtype, channels, pitch, offset):
+    # the frame as the pitch arithmetic says it is, line by line, as a copy
+    line = width * np.dtype(dtype).itemsize * channels
+    rows = [np.frombuffer(raw, dtype, line // np.dtype(dtype).itemsize, offset + r * pitch) for r in range(height)]
+    image = np.array(rows)
+    return image if channels == 1 else image.reshape(height, width, channels)
+
+
+def synthetic(cases, rng):
+    failures = 0
+    for case in range(cases):
+        bits, dtype, channels = FORMATS[rng.integers(len(FORMATS))]
+        width, height = int(rng.integers(1, 300)), int(rng.integers(1, 40))
+        pitch = width * (bits // 8) + int(rng.integers(0, 70))
+        offset = int(rng.integers(0, 16))
+        tail = 0 if rng.random() < 0.5 else pitch - width * (bits // 8)    # the last line may end without its padding
+        raw = (ctypes.c_ubyte * (offset + height * pitch - tail))()
+        flat = np.frombuffer(raw, np.uint8)
+        flat[:] = rng.integers(0, 256, flat.size)
+
+        views = [frame_view(raw, width, height, bits, pitch, offset)]
+        if offset == 0 and tail == 0:
+            views.append(memory_view(ctypes.cast(raw, ctypes.c_void_p), width, height, bits, pitch))
+        x, y = int(rng.integers(width)), int(rng.integers(height))
+        w, h = int(rng.integers(1, width - x + 1)), int(rng.integers(1, height - y + 1))
+        views.append(window(views[0], x, y, w, h))
+
+        truth = expected(raw, width, height, dtype, channels, pitch, offset)
+        ok = all(np.array_equal(v, truth) for v in views[:-1]) and np.array_equal(views[-1], truth[y:y + h, x:x + w])
+        ok = ok and all(np.shares_memory(v, flat) for v in views)
+        # a change to the driver memory must show up in every view
+        at = offset + (y + h - 1) * pitch + (x + w - 1) * (bits // 8)
+        flat[at] ^= 0xFF
+        truth = expected(raw, width, height, dtype, channels, pitch, offset)
+        ok = ok and all(np.array_equal(v, truth) for v in views[:-1]) and np.array_equal(views[-1], truth[y:y + h, x:x + w])
+        if not ok:
+            failures += 1
+            print("  case %d: %d bits %dx%d pitch %d offset %d window %d,%d %dx%d" % (case, bits, width, height, pitch,
+                                                                                    offset, x, y, w, h))
+    return failures
+
+
+def pattern(index, width, height, bytes_per_pixel):
+    # a frame where every pixel is different from its neighbours, so a sheared line cannot go unnoticed
+    rows, cols = np.mgrid[:height, :width]
+    image = np.stack([(rows * 7 + cols * 3 + c * 50) % 251 for c in range(bytes_per_pixel)], axis=2).astype(np.uint8)
+    return image[:, :, 0] if bytes_per_pixel == 1 else image
+
+
+def sim(frames):
+    failures = 0
+    width, height = 1000, 120
+    truth = pattern(0, width, height, 4)
+    for bits in (8, 32):
+        for line_align in (1, 3, 7, 64, 100):
+            api = SimulatedUEye(width, height, bits, frames=pattern, line_align=line_align)
+            camera = Camera(api=api, verbose=False, color=bits > 8, orientation=Orientation("pixels")).open()
+            source = RingSource(camera)
+            pitch = camera.ring.pitch
+            for aoi in ((0, 0, width, height), (264, 10, 480, 60)):
+                camera.request_aoi(aoi)
+                for _ in range(frames):
+                    frame = source.read()
+                    x, y, w, h = aoi
+                    want = truth[y:y + h, x:x + w, :bits // 8]
+                    ok = np.array_equal(frame.array, want[:, :, 0] if bits == 8 else want)
+                    ok = ok and frame.array.strides[0] == pitch
+                    ok = ok and any(np.shares_memory(frame.array, view) for view in camera.ring._views.values())
+                    frame.release()
+                    if not ok:
+                        failures += 1
+                        print("  sim: %d bits line_align %d (pitch %d) aoi %r" % (bits, line_align, pitch, aoi))
+                        break
+            camera.close()
+    return failures
+
+
+def rejects():
+    failures = 0
+    raw = (ctypes.c_ubyte * 1000)()
+    for args in ((10, 10, 8, 9), (10, 10, 24, 29), (10, 10, 16, 19), (100, 11, 8, 100), (10, 10, 12, 20), (0, 10, 8, 10)):
+        try:
+            frame_view(raw, *args)
+        except ValueError:
+            continue
+        failures += 1
+        print("  accepted %r" % (args,))
+    return failures
+
+
+def timing():
+    width, height, pitch = 2560, 1920, 2624
+    raw = (ctypes.c_ubyte * (height * pitch))()
+    flat = np.frombuffer(raw, np.uint8)
+    n = 2000
+    start = time.perf_counter()
+    for _ in range(n):
+        frame_view(raw, width, height, 8, pitch)
+    view_us = (time.perf_counter() - start) / n * 1e6
+    n = 50
+    start = time.perf_counter()
+    for _ in range(n):
+        np.ascontiguousarray(flat.reshape(height, pitch)[:, :width])
+    copy_us = (time.perf_counter() - start) / n * 1e6
+    print("2560 x 1920 Mono8, pitch %d: view %.1f us, reshape and copy %.0f us" % (pitch, view_us, copy_us))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--frames", type=int, default=3, help="frames read per simulated camera and AOI")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = (("synthetic", synthetic(args.cases, np.random.default_rng(args.seed))),
+               ("sim", sim(args.frames)),
+               ("rejects", rejects()))
+    for name, failures in results:
+        print("%-10s %s" % (name, "OK" if not failures else "%d FAILED" % failures))
+    timing()
+    sys.exit(1 if any(failures for name, failures in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
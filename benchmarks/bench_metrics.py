@@ -0,0 +1,90 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Overhead of the pipeline metrics (optical/metrics.py)
+#
+#     python benchmarks/bench_metrics.py [--frames 200] [--calls 200000]
+#
+#   per stage:  cost of Metrics.timed() around a function that does nothing, against calling it directly
+#   pipeline:   the 4_points.py measurement (optical.strategies.measure_frame: scale, detect) replayed through a
+#               Pipeline on synthetic frames, with and without metrics on every stage; the runs alternate and the best
+#               of each is kept, so the difference is mostly noise: the per-frame cost is the per-stage cost times the
+#               5 timed stages
+#   scrape:     time to render all metrics as Prometheus text
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.buffers import BufferPool
+from optical.metrics import Metrics
+from optical.orientation import Orientation
+from optical.pipeline import Pipeline, BLOCK
+from optical.scale import AcquisitionScale
+from optical.sources import SyntheticSource
+from optical.strategies import create, measure_frame
+
+
+def per_call(calls):
+    metrics = Metrics()
+
+    def nothing(x):
+        return x
+
+    start = time.perf_counter()
+    for i in range(calls):
+        nothing(i)
+    direct = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(calls):
+        metrics.timed("stage", nothing, i)
+    wrapped = time.perf_counter() - start
+    return (wrapped - direct) / calls * 1e9
+
+
+def pipeline_fps(frames, metrics):
+    scale = AcquisitionScale(3, "software")
+    orientation = Orientation()
+    strategy = create("4_points", scale)
+    buffers = BufferPool()
+
+    def measure(array):
+        return measure_frame(array, scale, orientation, strategy, buffers, metrics).dic2()
+
+    def sink(frame, dic2):
+        if metrics is not None and len(dic2['XYTupleList']) < 2:
+            metrics.count("detection_failures")
+
+    pipeline = Pipeline(SyntheticSource(frames), measure, policy=BLOCK, sink=sink, metrics=metrics).start()
+    pipeline.wait()
+    return pipeline.stats()['measured_fps']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    ns = per_call(args.calls)
+    print("per stage: %.0f ns per timed call, %.1f us per frame for 5 stages" % (ns, 5 * ns / 1e3))
+
+    metrics = Metrics()
+    plain, instrumented = [], []
+    for _ in range(args.runs):
+        plain.append(pipeline_fps(args.frames, None))
+        instrumented.append(pipeline_fps(args.frames, metrics))
+    plain, instrumented = max(plain), max(instrumented)
+    print("pipeline:  %.1f fps without metrics, %.1f fps with (%+.2f%%); the timed stages cost %.3f%% of a frame"
+          % (plain, instrumented, (instrumented / plain - 1) * 100, 5 * ns * 1e-9 * plain * 100))
+
+    start = time.perf_counter()
+    text = metrics.render()
+    print("scrape:    %.3f ms for %d lines" % ((time.perf_counter() - start) * 1e3, text.count("\n")))
+
+
+if __name__ == "__main__":
+    main()
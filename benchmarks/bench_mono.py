@@ -0,0 +1,69 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Bytes moved per frame: Mono8 end to end against colour frames converted late
+#
+#     python benchmarks/bench_mono.py [--frames 30] [--downscale 3]
+#
+# The same synthetic frames go through the 4_points.py measurement (scale, flip, measure_4_points) as
+#   mono8   what the camera now delivers by default (IS_CM_MONO8): one byte per pixel from the sensor on
+#   bgr8    a colour mode with three bytes per pixel, turned into Mono8 right before the detection
+#   bgra8   the same with four (the 32 bit mode of the SimpleLive scripts)
+# Bytes moved is what every stage reads plus what it writes, summed over the frame, with the transfer from the camera
+# counted once; the time is the median per frame on this machine (the transfer over USB is not included).
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.measure import measure_4_points
+from optical.scale import AcquisitionScale
+from optical.sources import mono8
+from optical.synthetic import generate
+
+PATHS = (("mono8", None), ("bgr8", cv2.COLOR_GRAY2BGR), ("bgra8", cv2.COLOR_GRAY2BGRA))
+
+
+def run(frames, scale):
+    """Median seconds per frame, bytes moved per frame."""
+    pix, y_window, x_window = scale.pixel_size(), scale.window(200, 223), scale.window(0, 8)
+    times, moved = [], 0
+    for array in frames:
+        start = time.perf_counter()
+        scaled = scale.apply(array)
+        flipped = cv2.flip(scaled, -1)
+        image = mono8(flipped)
+        measure_4_points(image, pix, y_window, x_window)
+        times.append(time.perf_counter() - start)
+        moved = array.nbytes + (array.nbytes + scaled.nbytes) + 2 * scaled.nbytes + image.nbytes
+        if image is not flipped:
+            moved += flipped.nbytes + image.nbytes
+    return np.median(times), moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--downscale", type=int, default=3)
+    args = parser.parse_args()
+
+    scale = AcquisitionScale(args.downscale, "software")
+    raw = generate(args.frames, 1, dy_um=np.linspace(-10, 10, args.frames))[0]
+    print("%-7s %12s %12s %10s" % ("path", "transfer MB", "moved MB", "ms/frame"))
+    baseline = None
+    for name, code in PATHS:
+        frames = raw if code is None else [cv2.cvtColor(image, code) for image in raw]
+        seconds, moved = run(frames, scale)
+        if baseline is None:
+            baseline = moved
+        print("%-7s %12.2f %12.2f %10.2f   %.1fx the Mono8 bytes" % (name, frames[0].nbytes / 1e6, moved / 1e6,
+                                                                      seconds * 1e3, moved / float(baseline)))
+
+
+if __name__ == "__main__":
+    main()
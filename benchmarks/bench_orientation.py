@@ -0,0 +1,78 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Orientation modes: time per frame and bit-identical results
+#
+#     python benchmarks/bench_orientation.py [--frames 40] [--downscale 3] [--recording session.npy]
+#
+# The 4_points.py measurement (scale, turn the right way up, measure_4_points) of the same frames with every mode of
+# optical/orientation.py:
+#   pixels       cv2.flip(frame, -1) on every frame, as the scripts did
+#   coordinates  measure_4_points(rotated=True) on the frame as it is
+#   sensor       the frames pre-rotated, as a mirrored sensor readout delivers them (the rotation is not timed)
+# and the number of frames whose result (midpoints, differences, corner pairs, corners) differs from pixels.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.orientation import Orientation
+from optical.scale import AcquisitionScale
+from optical.sources import each_frame, open_recording
+from optical.strategies import create, measure_frame
+from optical.synthetic import generate
+
+
+def result(m):
+    d = m.dic2()
+    corners = None if d['corners'] is None else d['corners'].tobytes()
+    return d['XYTupleList'], d['XDifference'], d['YDifference'], d['pairs'], corners
+
+
+def run(mode, raw, factor):
+    scale = AcquisitionScale(factor, "software")
+    orientation = Orientation(mode)
+    if mode == "sensor":
+        raw = [cv2.flip(array, -1) for array in raw]
+        scale.rotated = orientation.assume(True).in_sensor
+    strategy = create("4_points", scale)
+    times, results = [], []
+    for array in raw:
+        start = time.perf_counter()
+        m = measure_frame(array, scale, orientation, strategy)
+        times.append(time.perf_counter() - start)
+        results.append(result(m))
+    return np.median(times) * 1e3, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=40)
+    parser.add_argument("--downscale", type=int, default=3)
+    parser.add_argument("--recording", help="measure the frames of this recording instead of synthetic ones")
+    args = parser.parse_args()
+
+    if args.recording:
+        source = open_recording(args.recording)
+        raw = [np.ascontiguousarray(frame.array) for frame in each_frame(source)]
+        source.close()
+    else:
+        raw = generate(args.frames, 1, dy_um=np.linspace(-10, 10, args.frames), dx_um=np.linspace(-5, 5, args.frames))[0]
+
+    print("%-12s %10s %10s" % ("mode", "ms/frame", "differ"))
+    reference = None
+    for mode in ("pixels", "coordinates", "sensor"):
+        ms, results = run(mode, raw, args.downscale)
+        if reference is None:
+            reference = results
+        differ = sum(a != b for a, b in zip(results, reference))
+        print("%-12s %10.2f %10d" % (mode, ms, differ))
+
+
+if __name__ == "__main__":
+    main()
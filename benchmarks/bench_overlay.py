@@ -0,0 +1,86 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Display cost per measured frame: drawing every frame vs the retained overlay vs headless
+#
+#     python benchmarks/bench_overlay.py [--frames 100] [--fps 60] [--display-fps 15]
+#
+# Measures the simulated fiber scene the way 4_points.py does (1/3 scale, flipped), then times the display
+# work for each mode, divided over all measured frames:
+#   - every frame: the old loop, draw_4_points onto each frame
+#   - retained: optical/overlay.py, composing the overlay only on the frames a display capped at --display-fps
+#     would show when measuring at --fps, and redrawing it only when the values changed
+#   - headless: nothing is drawn
+# cv2.imshow is left out (it needs a window); it only adds to the first two rows, more to the first.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.measure import measure_4_points, draw_4_points
+from optical.overlay import Overlay
+from optical.scale import AcquisitionScale
+from optical.sim import fiber_scene
+
+
+def results(frames):
+    scale = AcquisitionScale(3, "software")
+    out = []
+    for index in range(frames):
+        image = cv2.flip(scale.apply(fiber_scene(index, 2560, 1920, 1)), -1)
+        out.append((image, measure_4_points(image, scale.pixel_size(), scale.window(200, 223), scale.window(0, 8))))
+    return out
+
+
+def every_frame(measured):
+    times = []
+    for image, dic2 in measured:
+        image = image.copy()
+        start = time.perf_counter()
+        draw_4_points(image, dic2)
+        times.append(time.perf_counter() - start)
+    return np.sum(times), len(measured), len(measured)
+
+
+def retained(measured, fps, display_fps):
+    overlay = Overlay()
+    period = 1.0 / display_fps
+    last = None
+    total = 0.0
+    shown = 0
+    for index, (image, dic2) in enumerate(measured):
+        now = index / fps
+        if last is not None and now - last < period:
+            continue
+        last = now
+        start = time.perf_counter()
+        overlay.render(dic2, image.shape)
+        overlay.compose(image)
+        total += time.perf_counter() - start
+        shown += 1
+    return total, shown, overlay.renders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--fps", type=float, default=60.0, help="measurement rate the display is sampled at")
+    parser.add_argument("--display-fps", type=float, default=15.0)
+    args = parser.parse_args()
+
+    measured = results(args.frames)
+    rows = [("every frame",) + every_frame(measured),
+            ("retained",) + retained(measured, args.fps, args.display_fps),
+            ("headless", 0.0, 0, 0)]
+    print("%-12s %10s %10s %14s" % ("display", "shown", "drawn", "ms per frame"))
+    for name, total, shown, drawn in rows:
+        print("%-12s %10d %10d %14.3f" % (name, shown, drawn, total / len(measured) * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Session recorder write rate
+#
+#     python benchmarks/bench_recorder.py [--dir /path/on/the/ssd] [--frames 300] [--downscale 1] [--sensor-fps 15]
+#
+# Appends simulated frames to a session in --dir and reports how many frames per second (and MB/s) the recorder
+# sustains, including the final flush to disk, against the sensor frame rate it has to keep up with.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.recorder import SessionRecorder, Session, session_paths
+from optical.sim import fiber_scene
+from optical.sources import Frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="where to write the test session")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--downscale", type=int, default=1, help="sensor reduction the frames are recorded at")
+    parser.add_argument("--sensor-fps", type=float, default=15.0, help="frame rate the recorder has to sustain")
+    args = parser.parse_args()
+
+    width, height = 2560 // args.downscale, 1920 // args.downscale
+    images = [fiber_scene(i, width, height, 1) for i in range(8)]
+    path = os.path.join(args.dir, "bench_session.npy")
+    recorder = SessionRecorder(path, args.frames, width, height)
+    start = time.perf_counter()
+    for i in range(args.frames):
+        recorder.append(Frame(images[i % len(images)], i))
+    recorder.close()
+    elapsed = time.perf_counter() - start
+
+    assert len(Session(path)) == args.frames
+    for name in session_paths(path):
+        os.remove(name)
+    fps = args.frames / elapsed
+    print("%dx%d, %d frames: %.1f frames/s, %.0f MB/s (sensor: %.1f frames/s, %s)"
+          % (width, height, args.frames, fps, fps * width * height / 1e6, args.sensor_fps,
+             "keeps up" if fps >= args.sensor_fps else "TOO SLOW"))
+
+
+if __name__ == "__main__":
+    main()
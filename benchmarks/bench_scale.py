@@ -0,0 +1,61 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Transfer and resize time per acquisition scale mode
+#
+#     python benchmarks/bench_scale.py [--factor 3] [--frames 50] [--usb-mb-s 350]
+#
+# Runs against the simulated camera. Transfer time is estimated from the bytes the sensor sends per frame and
+# the given USB bandwidth (the simulator does not model the bus); resize time is measured on this machine.
+# The first row is the old full-frame cv2.resize(fx=0.3) path for comparison.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical import Camera
+from optical.scale import AcquisitionScale, MODES
+from optical.sim import SimulatedUEye
+
+
+def run(mode, factor, frames, usb_mb_s):
+    api = SimulatedUEye()
+    scale = AcquisitionScale(factor, "software" if mode == "legacy" else mode)
+    camera = Camera(api=api, scale=scale, verbose=False).open()
+    times = []
+    for _ in range(frames):
+        frame = camera.ring.wait(1000)
+        start = time.perf_counter()
+        if mode == "legacy":
+            small = cv2.resize(frame.array, (0, 0), fx=0.3, fy=0.3)
+        else:
+            small = scale.apply(frame.array)
+        times.append(time.perf_counter() - start)
+        frame.release()
+    camera.close()
+    bytes_per_frame = api.bytes_transferred / float(api.frame_count)
+    label = "fx=0.3" if mode == "legacy" else "%s x%d + software x%d" % (scale.hardware, scale.hardware_factor,
+                                                                         scale.software_factor)
+    return (mode, label, "%dx%d" % (small.shape[1], small.shape[0]), bytes_per_frame / 1e6,
+            bytes_per_frame / (usb_mb_s * 1e6) * 1e3, np.median(times) * 1e3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--factor", type=int, default=3)
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--usb-mb-s", type=float, default=350.0, help="usable USB bandwidth in MB/s")
+    args = parser.parse_args()
+
+    print("%-12s %-32s %-10s %10s %14s %12s" % ("mode", "reduction", "image", "MB/frame", "transfer ms", "resize ms"))
+    for mode in ("legacy",) + MODES:
+        print("%-12s %-32s %-10s %10.2f %14.2f %12.3f" % run(mode, args.factor, args.frames, args.usb_mb_s))
+
+
+if __name__ == "__main__":
+    main()
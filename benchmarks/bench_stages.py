@@ -0,0 +1,166 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Time per processing stage and per pipeline, at several resolutions
+#
+#     python benchmarks/bench_stages.py [--recording session.npy] [--repeat 50] [--json stages.json] [--baseline old.json]
+#
+# Images: the simulated fiber ends (always) and the first frame of --recording (a session, .npy, video or image
+# folder). Resolutions: the full sensor frame, the 0.3-scaled frame the scripts measure, and an AOI crop of the
+# full frame around the two end faces (what 4_points.py --track-aoi reads out).
+#
+# Stages are timed one at a time, each on the output of the stage before it:
+#   flip, blur, canny, threshold, findContours, moments     the contour-moment scripts
+#   contours, gftt, pairs                                    measure_4_points: tall contours, masked corners, pairing
+# and the two whole pipelines, "4_points" (flip + measure_4_points) and "moments" (flip ... moments).
+# Every row reports the median and 99th percentile in ms and the frames/s the median allows. --json saves the rows
+# with the OpenCV / NumPy versions and the git commit; --baseline prints the change against an earlier --json file.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+import imutils
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.measure import candidate_contours, detect_corners, match_pairs, measure_4_points
+from optical.scale import REFERENCE_SCALE
+from optical.sim import fiber_scene
+from optical.sources import open_recording
+
+
+def timed(fn, repeat, warmup=3):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1e3
+    median = float(np.median(times))
+    return median, float(np.percentile(times, 99)), 1e3 / median
+
+
+def aoi_crop(image, margin=96):
+    # bounding box of the end faces (contours taller than the y window at full scale) plus margin
+    low = 200 / REFERENCE_SCALE
+    boxes = [box for c, box in candidate_contours(image, min_height=low)]
+    if not boxes:
+        return image
+    boxes = np.array(boxes)
+    rows, cols = image.shape[:2]
+    x0, y0 = np.maximum(boxes[:, :2].min(axis=0) - margin, 0)
+    x1 = min((boxes[:, 0] + boxes[:, 2]).max() + margin, cols)
+    y1 = min((boxes[:, 1] + boxes[:, 3]).max() + margin, rows)
+    return np.ascontiguousarray(image[y0:y1, x0:x1])
+
+
+def images(recording):
+    full = fiber_scene(0, 2560, 1920, 1)
+    sets = [("synthetic", full)]
+    if recording is not None:
+        source = open_recording(recording)
+        frame = source.read()
+        sets.append(("recorded", np.ascontiguousarray(frame.array)))
+        source.close()
+    for name, full in sets:
+        yield name, "full", full, 1.0
+        yield name, "0.3", cv2.resize(full, (0, 0), fx=0.3, fy=0.3), 0.3
+        yield name, "aoi", aoi_crop(full), 1.0
+
+
+def stages(image, scale):
+    """(stage, callable) in pipeline order, each called on the precomputed output of the previous stage."""
+    ratio = scale / REFERENCE_SCALE
+    y_window, x_window = (200 * ratio, 223 * ratio), (0, 8 * ratio)
+
+    flipped = cv2.flip(image, -1)
+    blurred = cv2.GaussianBlur(flipped, (5, 5), 0)
+    edges = cv2.Canny(blurred, 100, 255, apertureSize=5, L2gradient=True)
+    thresh = cv2.threshold(edges, 254, 255, cv2.THRESH_BINARY)[1]
+    cnts = imutils.grab_contours(cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+    candidates = candidate_contours(flipped, min_height=y_window[0])
+    boxes = [box for c, box in candidates]
+    corners, groups = detect_corners(flipped, boxes)
+    xy = corners[:, 0] if corners is not None else np.empty((0, 2), np.float32)
+
+    def moments(contours):
+        return [(cv2.moments(c), cv2.contourArea(c)) for c in contours]
+
+    def moment_pipeline():
+        f = cv2.flip(image, -1)
+        e = cv2.Canny(cv2.GaussianBlur(f, (5, 5), 0), 100, 255, apertureSize=5, L2gradient=True)
+        t = cv2.threshold(e, 254, 255, cv2.THRESH_BINARY)[1]
+        moments(imutils.grab_contours(cv2.findContours(t, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)))
+
+    return [
+        ("flip", lambda: cv2.flip(image, -1)),
+        ("blur", lambda: cv2.GaussianBlur(flipped, (5, 5), 0)),
+        ("canny", lambda: cv2.Canny(blurred, 100, 255, apertureSize=5, L2gradient=True)),
+        ("threshold", lambda: cv2.threshold(edges, 254, 255, cv2.THRESH_BINARY)),
+        ("findContours", lambda: cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)),
+        ("moments", lambda: moments(cnts)),
+        ("contours", lambda: candidate_contours(flipped, min_height=y_window[0])),
+        ("gftt", lambda: detect_corners(flipped, boxes)),
+        ("pairs", lambda: match_pairs(xy, y_window, x_window)),
+        ("4_points", lambda: measure_4_points(cv2.flip(image, -1), 2.75 / ratio, y_window, x_window)),
+        ("moments_pipeline", moment_pipeline),
+    ]
+
+
+def _commit():
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                      cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recording", help="also benchmark the first frame of this recording")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--baseline", help="a --json file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            for row in json.load(f)["results"]:
+                baseline[(row["image"], row["resolution"], row["stage"])] = row["median_ms"]
+
+    results = []
+    print("%-10s %-5s %-10s %-17s %10s %10s %10s %8s" % ("image", "res", "shape", "stage", "median ms", "p99 ms",
+                                                          "frames/s", "change"))
+    for name, resolution, image, scale in images(args.recording):
+        shape = "%dx%d" % (image.shape[1], image.shape[0])
+        for stage, fn in stages(image, scale):
+            median, p99, fps = timed(fn, args.repeat)
+            results.append({"image": name, "resolution": resolution, "shape": list(image.shape[:2]), "stage": stage,
+                            "median_ms": median, "p99_ms": p99, "fps": fps})
+            old = baseline.get((name, resolution, stage))
+            change = "%+7.1f%%" % ((median / old - 1) * 100) if old else ""
+            print("%-10s %-5s %-10s %-17s %10.3f %10.3f %10.1f %8s" % (name, resolution, shape, stage, median, p99,
+                                                                       fps, change))
+
+    if args.json:
+        report = {"date": datetime.datetime.now().isoformat(), "commit": _commit(), "opencv": cv2.__version__,
+                  "numpy": np.__version__, "python": platform.python_version(), "machine": platform.platform(),
+                  "threads": cv2.getNumThreads(), "repeat": args.repeat, "results": results}
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+        print("saved to", args.json)
+
+
+if __name__ == "__main__":
+    main()
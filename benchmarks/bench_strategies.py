@@ -0,0 +1,81 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# A/B of the measurement strategies on the same frames
+#
+#     python benchmarks/bench_strategies.py [--frames 40] [--seed 1] [--downscale 3] [--recording session.npy]
+#
+# Every registered strategy of optical/strategies.py measures the same synthetic frames (optical/synthetic.py, a
+# drifting second fiber, so the stateful strategies get a sequence) after the same scaling and flip, in this one
+# process. Reported: frames where both ends were found, bias and RMS in um of |measured| - |true| X/Y difference
+# over those frames, and the median time per frame. --recording also runs them on a recording, where there is no
+# ground truth, only found and time. Strategies that cannot be set up here (dnn without its network files) are
+# listed as skipped.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from optical.scale import AcquisitionScale
+from optical.sources import each_frame, open_recording
+from optical.strategies import STRATEGIES, create
+from optical.synthetic import generate
+
+
+def run(strategy, images, truth=None):
+    found, ex, ey, times = 0, [], [], []
+    for k, image in enumerate(images):
+        start = time.perf_counter()
+        m = strategy.measure(image)
+        times.append(time.perf_counter() - start)
+        if m.found:
+            found += 1
+            if truth is not None:
+                ex.append(abs(m.x_um) - abs(truth[k]['x_um']))
+                ey.append(abs(m.y_um) - abs(truth[k]['y_um']))
+    ex, ey = np.array(ex), np.array(ey)
+
+    def stats(e):
+        return (e.mean(), np.sqrt((e ** 2).mean())) if len(e) else (np.nan, np.nan)
+
+    return (found / float(len(images)),) + stats(ex) + stats(ey) + (np.median(times) * 1e3,)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--downscale", type=int, default=3)
+    parser.add_argument("--recording", help="also compare the strategies on this recording")
+    args = parser.parse_args()
+
+    scale = AcquisitionScale(args.downscale, "software")
+    raw, truth = generate(args.frames, args.seed, dy_um=np.linspace(-10, 10, args.frames), blur=1.0, noise=2.0)
+    sets = [("synthetic", [cv2.flip(scale.apply(image), -1) for image in raw], truth)]
+    if args.recording:
+        source = open_recording(args.recording)
+        images = [cv2.flip(scale.apply(np.ascontiguousarray(frame.array)), -1) for frame in each_frame(source)]
+        source.close()
+        sets.append(("recorded", images, None))
+
+    print("%-10s %-9s %7s %9s %8s %9s %8s %10s" % ("frames", "strategy", "found", "x bias", "x rms", "y bias",
+                                                   "y rms", "ms/frame"))
+    for name, images, t in sets:
+        for strategy_name in STRATEGIES:
+            try:
+                strategy = create(strategy_name, scale)
+            except IOError as e:
+                print("%-10s %-9s skipped: %s" % (name, strategy_name, e))
+                continue
+            result = run(strategy, images, t)
+            print("%-10s %-9s %6.0f%% %9.2f %8.2f %9.2f %8.2f %10.2f" % ((name, strategy_name, result[0] * 100)
+                                                                         + result[1:]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# optical: importable building blocks for the fiber-end measurement scripts
+#
+# The scripts in the repository root (4_points.py and friends) talk to the IDS uEye camera through pyueye.
+# The pieces that are shared between them live here so they can be reused and run against the simulated
+# camera in optical.sim when no UI-3480ML-M-GL is connected.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+from optical.api import UEyeError, check, ueye_api
+from optical.ring import ImageRing, RingFrame
+from optical.camera import Camera, list_cameras
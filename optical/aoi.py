@@ -0,0 +1,101 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Auto-tracking sensor AOI around the fiber ends
+#
+# After a detection on the full frame, the sensor is programmed to read out only a window just large enough
+# for both end faces (plus a margin). The window is moved when the corners get close to its border and
+# re-expanded to the full sensor when the end faces are lost for a few frames. Fewer lines read out means
+# a higher frame rate and less USB bandwidth; the measurement itself does not change, because the X/Y
+# difference only depends on the distance between the two midpoints.
+#
+#     tracker = AOITracker(camera)
+#     pipeline = Pipeline(RingSource(camera), measure, sink=tracker.update)
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+
+def _floor(v, step):
+    return int(v) // step * step
+
+
+def _ceil(v, step):
+    return -(-int(np.ceil(v)) // step) * step
+
+
+def to_sensor(points, aoi, image_shape, flipped=True):
+    """Map (x, y) points of the measured image back to sensor pixels.
+
+    image_shape is the shape of the image that was measured: the AOI resized (and, with flipped=True, rotated by
+    180 degrees with cv2.flip(frame, -1)) the way 4_points.py does it.
+    """
+    points = np.asarray(points, np.float64).reshape(-1, 2)
+    x0, y0, width, height = aoi
+    rows, cols = image_shape[:2]
+    if flipped:
+        points = np.column_stack((cols - 1 - points[:, 0], rows - 1 - points[:, 1]))
+    return np.column_stack((x0 + points[:, 0] * width / cols, y0 + points[:, 1] * height / rows))
+
+
+class AOITracker(object):
+    """Keeps the sensor AOI of a Camera around the matched end face corners of a measure_4_points result.
+
+    margin is the free border around the corners in sensor pixels, patience the number of frames without both
+    end faces before going back to the full frame.
+    """
+
+    def __init__(self, camera, margin=96, patience=3, flipped=True):
+        self.camera = camera
+        self.margin = margin
+        self.patience = patience
+        self.flipped = flipped
+        self.lost = 0
+        self.moves = 0
+        self.expansions = 0
+        self._increments = camera.aoi_increments()
+        self._requested = camera.aoi
+
+    def window_for(self, points):
+        """Smallest AOI the sensor accepts that contains points (sensor pixels) with the margin around them."""
+        pos_x, pos_y, size_x, size_y = self._increments
+        sensor_width, sensor_height = self.camera.width, self.camera.height
+        (left, top), (right, bottom) = points.min(axis=0) - self.margin, points.max(axis=0) + self.margin
+        width = min(_ceil(right - max(left, 0), size_x), _floor(sensor_width, size_x))
+        height = min(_ceil(bottom - max(top, 0), size_y), _floor(sensor_height, size_y))
+        x = min(_floor(max(left, 0), pos_x), _floor(sensor_width - width, pos_x))
+        y = min(_floor(max(top, 0), pos_y), _floor(sensor_height - height, pos_y))
+        # rounding the position down may have cut off the right/bottom edge by less than one step
+        if x + width < right and x + width + size_x <= sensor_width:
+            width += size_x
+        if y + height < bottom and y + height + size_y <= sensor_height:
+            height += size_y
+        return (x, y, width, height)
+
+    def _inside(self, points, aoi):
+        # keep the current window while the corners stay at least half a margin away from its border
+        x, y, width, height = aoi
+        keep = self.margin // 2
+        return (points[:, 0].min() >= x + keep and points[:, 1].min() >= y + keep
+                and points[:, 0].max() <= x + width - keep and points[:, 1].max() <= y + height - keep)
+
+    def update(self, frame, dic2):
+        """Pipeline sink: look at the result of one frame and request a new AOI if needed."""
+        aoi = frame.aoi if frame.aoi is not None else self.camera.full_aoi()
+        if aoi != self._requested:
+            # result of a frame captured before the last request took effect
+            return
+        if len(dic2['pairs']) < 2:
+            self.lost += 1
+            if self.lost >= self.patience and aoi != self.camera.full_aoi():
+                self._request(self.camera.full_aoi())
+                self.expansions += 1
+            return
+        self.lost = 0
+        corners = np.array([p for pair in dic2['pairs'] for p in pair], np.float64)
+        points = to_sensor(corners, aoi, dic2['image'].shape, self.flipped)
+        if aoi == self.camera.full_aoi() or not self._inside(points, aoi):
+            self._request(self.window_for(points))
+            self.moves += 1
+
+    def _request(self, aoi):
+        self._requested = aoi
+        self.camera.request_aoi(aoi)
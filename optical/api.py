@@ -0,0 +1,27 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Small helpers around the uEye API
+#
+# Every function that talks to the camera takes an "api" argument. On the measurement station this is the
+# pyueye.ueye module itself; for offline work it is an optical.sim.SimulatedUEye instance, which exposes
+# the same function names and constants.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+class UEyeError(RuntimeError):
+    """Raised when a uEye call returns something other than IS_SUCCESS."""
+
+    def __init__(self, call, code):
+        RuntimeError.__init__(self, "%s ERROR (%s)" % (call, code))
+        self.call = call
+        self.code = code
+
+
+def ueye_api():
+    # pyueye is only importable where the IDS driver is installed, so import it on first use
+    from pyueye import ueye
+    return ueye
+
+
+def check(api, nRet, call):
+    if nRet != api.IS_SUCCESS:
+        raise UEyeError(call, nRet)
+    return nRet
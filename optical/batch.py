@@ -0,0 +1,157 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Offline batch analysis of a recording
+#
+#     python -m optical.batch session.npy --out session.csv [--workers 8] [--chunk 32] [--downscale 3] [--strategy moments]
+#
+# Runs the 4_points.py measurement (1/3 scale, upside down, corner pairs -> midpoints -> X/Y difference in um, or another
+# strategy of optical/strategies.py) on every frame of a recording (anything optical.sources.open_recording accepts) with a pool of worker processes and
+# writes one row per frame to CSV, or to Parquet when --out ends in .parquet (needs pandas and pyarrow).
+#
+# Work is handed out as chunks of consecutive frame numbers. Every worker opens the recording itself (recordings
+# and .npy stacks are memory-mapped), so only frame numbers go to the workers and only result rows come back.
+# Chunks finish in any order; rows are written in frame order. Each worker keeps OpenCV to one thread, so the
+# pool, not OpenCV's own threads, spreads the frames over the cores. A strategy that cannot be built (the dnn
+# strategy without its network files) is reported before any worker starts.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+
+import cv2
+
+from optical.buffers import BufferPool
+from optical.orientation import Orientation
+from optical.scale import AcquisitionScale
+from optical.sources import open_recording
+from optical.strategies import STRATEGIES, create, measure_frame
+
+COLUMNS = ("frame", "timestamp", "ends", "x1", "y1", "x2", "y2", "x_difference_um", "y_difference_um")
+
+_worker = {}        # per worker process: the opened recording, its scale and orientation, the strategy and a pool
+
+
+def _init(path, downscale, pix, strategy):
+    try:
+        _open(path, downscale, pix, strategy)
+    except Exception as e:
+        # multiprocessing.Pool replaces a worker whose initializer raised with a new one, forever; the first chunk
+        # raises it instead, which ends analyze()
+        _worker['error'] = e
+
+
+def _open(path, downscale, pix, strategy):
+    cv2.setNumThreads(1)
+    source = open_recording(path)
+    scale = AcquisitionScale(downscale, "software")
+    orientation = Orientation()
+    session = getattr(source, "session", None)
+    if session is not None:
+        scale.assume(session.meta.get('hardware', "none"), session.meta.get('hardware_factor', 1))
+        scale.rotated = orientation.assume(session.meta.get('rotated', False)).in_sensor
+    _worker.update(source=source, scale=scale, orientation=orientation, strategy=create(strategy, scale, pix),
+                   buffers=BufferPool())
+
+
+def _row(frame, m, timed):
+    (x1, y1), (x2, y2) = m.mids[:2] if m.found else ((None, None), (None, None))
+    return (frame.index, frame.timestamp if timed else None, len(m.mids), x1, y1, x2, y2,
+            m.x_um if m.found else None, m.y_um if m.found else None)
+
+
+def _chunk(bounds):
+    if 'error' in _worker:
+        raise _worker['error']
+    start, stop = bounds
+    source, scale, strategy = _worker['source'], _worker['scale'], _worker['strategy']
+    orientation, buffers = _worker['orientation'], _worker['buffers']
+    # only a recorded session knows when its frames were taken
+    timed = getattr(source, "session", None) is not None
+    source.seek(start)
+    rows = []
+    for _ in range(start, stop):
+        frame = source.read()
+        if frame is None:
+            break
+        rows.append(_row(frame, measure_frame(frame.array, scale, orientation, strategy, buffers), timed))
+    return start, rows
+
+
+def analyze(path, workers=None, chunk=32, downscale=3, pix=2.75, strategy="4_points"):
+    """Yield the result row of every frame of the recording at path, in frame order.
+
+    Every worker has its own instance of the strategy, so "track" and "predict" only follow the ends within a chunk.
+    """
+    source = open_recording(path)
+    count = len(source)
+    source.close()
+    chunks = [(start, min(start + chunk, count)) for start in range(0, count, chunk)]
+    pool = multiprocessing.Pool(workers, _init, (path, downscale, pix, strategy))
+    try:
+        pending = {}
+        next_start = 0
+        for start, rows in pool.imap_unordered(_chunk, chunks):
+            pending[start] = rows
+            # hand out the finished chunks that are next in frame order
+            while next_start in pending:
+                rows = pending.pop(next_start)
+                for row in rows:
+                    yield row
+                next_start = min(next_start + chunk, count)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def write_csv(rows, path):
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_parquet(rows, path):
+    try:
+        import pandas
+    except ImportError:
+        raise SystemExit("writing Parquet needs pandas and pyarrow (pip install pandas pyarrow), or use a .csv output")
+    table = pandas.DataFrame.from_records(list(rows), columns=COLUMNS)
+    table.to_parquet(path, index=False)
+    return len(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure every frame of a recording with a pool of processes")
+    parser.add_argument("recording", help="a session written with --record, a .npy file, a video file or a folder of images")
+    parser.add_argument("--out", required=True, help="output file, .csv or .parquet")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--chunk", type=int, default=32, help="frames handed to a worker at a time")
+    parser.add_argument("--downscale", type=int, default=3, help="measure at 1/downscale, as 4_points.py --downscale")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="4_points",
+                        help="how the fiber ends are found (see optical/strategies.py)")
+    args = parser.parse_args()
+    try:
+        # every worker builds its own, so check once here that it can be built at all
+        create(args.strategy, AcquisitionScale(args.downscale, "software"))
+    except IOError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    rows = analyze(args.recording, args.workers, args.chunk, args.downscale, strategy=args.strategy)
+    if os.path.splitext(args.out)[1].lower() == ".parquet":
+        count = write_parquet(rows, args.out)
+    else:
+        count = write_csv(rows, args.out)
+    elapsed = time.perf_counter() - start
+    print("%d frames in %.2f s (%.1f fps, %d workers) -> %s" % (count, elapsed, count / elapsed,
+                                                                args.workers or multiprocessing.cpu_count(), args.out))
+
+
+if __name__ == "__main__":
+    main()
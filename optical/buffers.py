@@ -0,0 +1,61 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Preallocated buffers for the per-frame intermediates
+#
+# Every stage got a new array from OpenCV for each frame: the resize, the flip, the colour conversion, GaussianBlur,
+# Canny, threshold, the copy findContours was handed and the corner mask. BufferPool keeps those arrays from one
+# frame to the next; take() hands out one of the asked shape and dtype that nobody holds any more, and OpenCV
+# writes into it through its dst= argument:
+#
+#     pool = BufferPool()
+#     small = cv2.resize(frame, (cols, rows), dst=pool.take("scale", (rows, cols)), interpolation=cv2.INTER_AREA)
+#
+# A buffer is free again once the last reference to it (or to a view of it) is gone, e.g. when the display has
+# moved on to a newer result, so an image that leaves the stage is never overwritten while someone still reads it;
+# the pool grows to the number of frames in flight and then stops allocating. When a name is asked for with a new
+# shape (another AOI, another scale) the buffers of the old shape are let go. A pool belongs to one thread.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import sys
+
+import numpy as np
+
+
+def _free_refcount():
+    # references a buffer nobody else holds has while take() looks at it: the list, the loop variable and the
+    # argument of getrefcount (measured rather than assumed, it differs between Python versions)
+    for buffer in [np.empty(1)]:
+        return sys.getrefcount(buffer)
+
+
+_FREE = _free_refcount()
+
+
+class BufferPool(object):
+    """Arrays reused from frame to frame, by name; allocations and nbytes count what take() had to allocate."""
+
+    def __init__(self):
+        self.allocations = 0
+        self.nbytes = 0
+        self._buffers = {}          # name -> ((shape, dtype), [arrays])
+
+    def take(self, name, shape, dtype=np.uint8):
+        """An array of shape and dtype for name, with undefined contents, that is not in use anywhere else."""
+        kind = (tuple(shape), np.dtype(dtype))
+        entry = self._buffers.get(name)
+        if entry is None or entry[0] != kind:
+            entry = self._buffers[name] = (kind, [])
+        for buffer in entry[1]:
+            if sys.getrefcount(buffer) == _FREE:
+                return buffer
+        buffer = np.empty(kind[0], kind[1])
+        entry[1].append(buffer)
+        self.allocations += 1
+        self.nbytes += buffer.nbytes
+        return buffer
+
+    def stats(self):
+        return {
+            'buffers': sum(len(buffers) for kind, buffers in self._buffers.values()),
+            'bytes': sum(b.nbytes for kind, buffers in self._buffers.values() for b in buffers),
+            'allocations': self.allocations,
+        }
@@ -0,0 +1,291 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Camera setup shared by the scripts
+#
+# This is the initialisation sequence every script used to repeat at module level (InitCamera, GetCameraInfo,
+# GetSensorInfo, ResetToDefault, colour mode selection, AOI query), followed by an ImageRing and free-run capture.
+#
+# Every measurement works on Mono8, so colour sensors are set to Mono8 as well (the driver converts) unless colour
+# is asked for, which is only useful for the display: a BGR / BGRA frame is three or four times the bytes through
+# USB, the ring, the resize and the flip, and has to be converted back to Mono8 before it can be measured.
+#
+# With parameters="station.ini" the first start goes through all of that and then saves the camera's parameter set
+# to station.ini (is_ParameterSet) and what was derived from it (colour mode, AOI, binning) to station.json. Every
+# later start with the same camera and downscale loads the parameter set straight away instead and skips the
+# reset and all the queries. Delete the two files to set the camera up from scratch again.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import ctypes
+import json
+import os
+
+from optical.api import check, ueye_api
+from optical.ring import ImageRing
+
+
+def _color_mode(sInfo):
+    # SENSORINFO.nColorMode is a single char
+    mode = getattr(sInfo.nColorMode, "value", sInfo.nColorMode)
+    if isinstance(mode, bytes):
+        return int.from_bytes(mode, byteorder='big')
+    return int(mode)
+
+
+def list_cameras(api=None):
+    """The connected cameras (is_GetCameraList), as dicts with camera_id, device_id, serial_no, model and in_use.
+
+    Cameras leave the factory with camera ID 1, so IDs are not unique until they are set (IDS Camera Manager);
+    open_id is the ID to hand to Camera: the camera ID where it is unique, the device ID with IS_USE_DEVICE_ID
+    where it is not.
+    """
+    api = api if api is not None else ueye_api()
+    count = api.INT()
+    check(api, api.is_GetNumberOfCameras(count), "is_GetNumberOfCameras")
+    if count.value <= 0:
+        return []
+
+    # UEYE_CAMERA_LIST has room for one entry; the driver fills as many as dwCount announces
+    class CameraList(ctypes.Structure):
+        _fields_ = [("dwCount", dict(api.UEYE_CAMERA_LIST._fields_)["dwCount"]),
+                    ("uci", api.UEYE_CAMERA_INFO * count.value)]
+
+    listing = CameraList()
+    listing.dwCount = count.value
+    check(api, api.is_GetCameraList(ctypes.cast(ctypes.byref(listing), ctypes.POINTER(api.UEYE_CAMERA_LIST)).contents),
+          "is_GetCameraList")
+    cameras = [{'camera_id': int(info.dwCameraID), 'device_id': int(info.dwDeviceID),
+                'serial_no': info.SerNo.decode('utf-8'), 'model': info.Model.decode('utf-8'),
+                'in_use': bool(info.dwInUse)} for info in listing.uci[:min(listing.dwCount, count.value)]]
+    ids = [c['camera_id'] for c in cameras]
+    for c in cameras:
+        c['open_id'] = c['camera_id'] if ids.count(c['camera_id']) == 1 else c['device_id'] | api.IS_USE_DEVICE_ID
+    return cameras
+
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+class Camera(object):
+    """A uEye camera set up the way the scripts do it, acquiring into an ImageRing.
+
+    camera_id 0 opens the first available camera, 1-254 the camera with that ID (see list_cameras). scale, an
+    optical.scale.AcquisitionScale, programs sensor binning/subsampling before the image memories are allocated;
+    width and height are then the reduced image size. parameters is the .ini file of a saved parameter set, loaded
+    if it exists and was saved for this camera and scale, written otherwise. color keeps the colour format of a
+    colour sensor instead of Mono8. orientation, an optical.orientation.Orientation, mirrors the readout so the
+    frames arrive the right way up when the camera can.
+    """
+
+    def __init__(self, camera_id=0, buffers=4, api=None, verbose=True, scale=None, parameters=None, color=False,
+                 orientation=None):
+        self.api = api if api is not None else ueye_api()
+        self.camera_id = camera_id
+        self.scale = scale
+        self.buffers = buffers
+        self.verbose = verbose
+        self.parameters = parameters
+        self.color = color
+        self.orientation = orientation
+        self.loaded_parameters = False  # True when open() restored the saved parameter set
+        self.hCam = self.api.HIDS(camera_id)
+        self.width = 0
+        self.height = 0
+        self.bits_per_pixel = 0
+        self.color_mode = None
+        self.sensor_name = ""
+        self.serial_no = ""
+        self.ring = None
+        self.aoi = None                 # current sensor AOI as (x, y, width, height)
+        self._aoi_request = None
+
+    def _print(self, *args):
+        if self.verbose:
+            print(*args)
+
+    def open(self):
+        api = self.api
+        hCam = self.hCam
+        sInfo = api.SENSORINFO()
+        cInfo = api.CAMINFO()
+        rectAOI = api.IS_RECT()
+
+        # Starts the driver and establishes the connection to the camera
+        check(api, api.is_InitCamera(hCam, None), "is_InitCamera")
+        check(api, api.is_GetCameraInfo(hCam, cInfo), "is_GetCameraInfo")
+        self.serial_no = cInfo.SerNo.decode('utf-8')
+        self.loaded_parameters = self.parameters is not None and self._load_parameters()
+        if not self.loaded_parameters:
+            self._setup(sInfo, rectAOI)
+            if self.parameters is not None:
+                self._save_parameters()
+        if self.scale is not None and self.orientation is not None:
+            self.scale.rotated = self.orientation.in_sensor
+
+        # Ring of image memories in queue mode, see optical/ring.py
+        self.ring = ImageRing(hCam, self.width, self.height, self.bits_per_pixel, count=self.buffers, api=api).open()
+        check(api, api.is_SetColorMode(hCam, self.color_mode), "is_SetColorMode")
+
+        # Activates the camera's live video mode (free run mode)
+        check(api, api.is_CaptureVideo(hCam, api.IS_DONT_WAIT), "is_CaptureVideo")
+        return self
+
+    def _setup(self, sInfo, rectAOI):
+        api = self.api
+        hCam = self.hCam
+        check(api, api.is_GetSensorInfo(hCam, sInfo), "is_GetSensorInfo")
+        check(api, api.is_ResetToDefault(hCam), "is_ResetToDefault")
+        api.is_SetDisplayMode(hCam, api.IS_SET_DM_DIB)
+
+        # Set the right color mode: Mono8 unless colour was asked for and the sensor has it
+        sensor_mode = _color_mode(sInfo)
+        if self.color and sensor_mode == api.IS_COLORMODE_BAYER:
+            # setup the color depth to the current windows setting
+            nBitsPerPixel = api.INT(24)
+            m_nColorMode = api.INT()
+            api.is_GetColorDepth(hCam, nBitsPerPixel, m_nColorMode)
+            self.bits_per_pixel = nBitsPerPixel.value
+            self.color_mode = m_nColorMode.value
+        elif self.color and sensor_mode == api.IS_COLORMODE_CBYCRY:
+            # for color camera models use RGB32 mode
+            self.bits_per_pixel = 32
+            self.color_mode = api.IS_CM_BGRA8_PACKED
+        else:
+            # for monochrome camera models, and colour ones measured as they are, use Y8 mode
+            self.bits_per_pixel = 8
+            self.color_mode = api.IS_CM_MONO8
+        self._print("Color mode:\t\t", self.color_mode, "(%d bits per pixel)" % self.bits_per_pixel)
+
+        # Binning / subsampling, see optical/scale.py
+        if self.scale is not None:
+            self.scale.configure(api, hCam)
+            self._print("Acquisition scale:\t", self.scale)
+
+        # Mirrored readout instead of cv2.flip on every frame, see optical/orientation.py
+        if self.orientation is not None:
+            self.orientation.configure(api, hCam)
+            self._print("Orientation:\t\t", self.orientation)
+
+        # Can be used to set the size and position of an "area of interest"(AOI) within an image
+        check(api, api.is_AOI(hCam, api.IS_AOI_IMAGE_GET_AOI, rectAOI, api.sizeof(rectAOI)), "is_AOI")
+        self.width = rectAOI.s32Width
+        self.height = rectAOI.s32Height
+        self.aoi = (rectAOI.s32X, rectAOI.s32Y, self.width, self.height)
+        self.sensor_name = sInfo.strSensorName.decode('utf-8')
+
+        # Prints out some information about the camera and the sensor
+        self._print("Camera model:\t\t", self.sensor_name)
+        self._print("Camera serial no.:\t", self.serial_no)
+        self._print("Maximum image width:\t", self.width)
+        self._print("Maximum image height:\t", self.height)
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Saved parameter sets
+
+    def _layout_path(self):
+        return os.path.splitext(self.parameters)[0] + ".json"
+
+    def _layout(self):
+        layout = {'serial_no': self.serial_no, 'sensor_name': self.sensor_name, 'bits_per_pixel': self.bits_per_pixel,
+                  'color_mode': self.color_mode, 'color': self.color, 'aoi': list(self.aoi)}
+        if self.scale is not None:
+            layout.update(factor=self.scale.factor, mode=self.scale.mode, hardware=self.scale.hardware,
+                          hardware_factor=self.scale.hardware_factor)
+        if self.orientation is not None:
+            layout.update(orientation=self.orientation.mode, rotated=self.orientation.in_sensor)
+        return layout
+
+    def _load_parameters(self):
+        """Restore the saved parameter set; False (nothing changed) if there is none for this camera and scale."""
+        api = self.api
+        if not (os.path.isfile(self.parameters) and os.path.isfile(self._layout_path())):
+            return False
+        with open(self._layout_path()) as f:
+            layout = json.load(f)
+        if layout['serial_no'] != self.serial_no:
+            self._print("Parameter set %s is for camera %s, setting up from scratch" % (self.parameters,
+                                                                                     layout['serial_no']))
+            return False
+        scale = (self.scale.factor, self.scale.mode) if self.scale is not None else (None, None)
+        orientation = self.orientation.mode if self.orientation is not None else None
+        if (layout.get('factor'), layout.get('mode')) != scale or layout.get('color', False) != self.color or \
+                layout.get('orientation') != orientation:
+            return False
+        path = api.wchar_p()
+        path.value = os.path.abspath(self.parameters)
+        if api.is_ParameterSet(self.hCam, api.IS_PARAMETERSET_CMD_LOAD_FILE, path, 0) != api.IS_SUCCESS:
+            self._print("Could not load parameter set %s, setting up from scratch" % self.parameters)
+            return False
+        self.bits_per_pixel = layout['bits_per_pixel']
+        self.color_mode = layout['color_mode']
+        self.aoi = tuple(layout['aoi'])
+        self.width, self.height = self.aoi[2:]
+        self.sensor_name = layout['sensor_name']
+        if self.scale is not None:
+            self.scale.assume(layout['hardware'], layout['hardware_factor'])
+        if self.orientation is not None:
+            self.orientation.assume(layout['rotated'])
+        self._print("Parameter set:\t\t", self.parameters, "(%s, %dx%d)" % (self.sensor_name, self.width, self.height))
+        return True
+
+    def _save_parameters(self):
+        api = self.api
+        path = api.wchar_p()
+        path.value = os.path.abspath(self.parameters)
+        check(api, api.is_ParameterSet(self.hCam, api.IS_PARAMETERSET_CMD_SAVE_FILE, path, 0), "is_ParameterSet")
+        with open(self._layout_path(), "w") as f:
+            json.dump(self._layout(), f, indent=1)
+        self._print("Parameter set saved to\t", self.parameters)
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Area of interest
+    #
+    # The ring buffers are allocated for the full sensor; a smaller AOI is written at the start of each buffer with the
+    # same line pitch, so RingSource only has to slice the buffer view.
+
+    def full_aoi(self):
+        return (0, 0, self.width, self.height)
+
+    def aoi_increments(self):
+        """(x, y, width, height) steps the sensor accepts for the AOI position and size."""
+        api = self.api
+        pos, size = api.IS_POINT_2D(), api.IS_SIZE_2D()
+        check(api, api.is_AOI(self.hCam, api.IS_AOI_IMAGE_GET_POS_INC, pos, api.sizeof(pos)), "is_AOI")
+        check(api, api.is_AOI(self.hCam, api.IS_AOI_IMAGE_GET_SIZE_INC, size, api.sizeof(size)), "is_AOI")
+        return (pos.s32X, pos.s32Y, size.s32Width, size.s32Height)
+
+    def set_aoi(self, aoi):
+        """Program the sensor AOI. Capture is stopped and the frames still queued with the old AOI are dropped first,
+        so every frame handed out afterwards was read with the new one."""
+        api = self.api
+        if tuple(aoi) == self.aoi:
+            return
+        rect = api.IS_RECT()
+        rect.s32X, rect.s32Y, rect.s32Width, rect.s32Height = aoi
+        api.is_StopLiveVideo(self.hCam, api.IS_WAIT)
+        self.ring.drain()
+        check(api, api.is_AOI(self.hCam, api.IS_AOI_IMAGE_SET_AOI, rect, api.sizeof(rect)), "is_AOI")
+        self.aoi = tuple(aoi)
+        check(api, api.is_CaptureVideo(self.hCam, api.IS_DONT_WAIT), "is_CaptureVideo")
+
+    def request_aoi(self, aoi):
+        # may be called from any thread; the acquisition thread applies it before its next wait
+        self._aoi_request = tuple(aoi)
+
+    def apply_aoi_request(self):
+        aoi, self._aoi_request = self._aoi_request, None
+        if aoi is not None:
+            self.set_aoi(aoi)
+
+    def close(self):
+        api = self.api
+        api.is_StopLiveVideo(self.hCam, api.IS_WAIT)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        # Disables the hCam camera handle and releases the data structures and memory areas taken up by the uEye camera
+        api.is_ExitCamera(self.hCam)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
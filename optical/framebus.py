@@ -0,0 +1,322 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Shared-memory frame bus between an acquisition process and analysis processes
+#
+# Threads of one process share the GIL, and only the OpenCV calls release it: pair matching, the result dicts and
+# the drawing of every stage run one at a time, so the whole loop stays on one core. FrameBus puts the frames into a
+# ring of slots in multiprocessing.shared_memory instead, where analysis processes read them without a copy:
+#
+#     bus = FrameBus(camera.width, camera.height, camera.bits_per_pixel, slots=8, policy=DROP_OLDEST)
+#     multiprocessing.Process(target=analyze, args=(bus,)).start()     # the bus goes to the process as an argument
+#     for frame in each_frame(source):
+#         bus.publish(frame)                                           # one copy, ring buffer -> slot
+#     bus.close()
+#
+#     def analyze(bus):
+#         reader = bus.attach()                                        # an optical.sources frame source
+#         for frame in each_frame(reader):
+#             measure(frame.array)                                     # a view of the slot, nothing copied
+#
+# Every published frame gets the next sequence number, and every reader sees every frame in sequence order (or
+# its share of them, attach(part=(i, n))). A slot a reader holds is never written, however many frames it holds at
+# once (a Pipeline keeps up to its queue depth); the writer takes the slot with the oldest frame that is free. What happens when a reader falls behind is the policy, as in optical/pipeline.py:
+#   drop_oldest  the writer never waits; a slow reader loses the oldest frames it has not read yet and goes on
+#                with the oldest one still in the bus (counted in missed)
+#   block        the writer waits until every attached reader is done with the oldest frame: nothing is lost and
+#                the slowest reader sets the pace (counted in waits)
+# A frame that does not find a free slot (every slot held) is dropped. Slot lines are padded to 64 bytes and read
+# with optical.frameview, an AOI frame smaller than the bus lies at the top left of its slot.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import functools
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from optical.frameview import frame_view, window
+from optical.pipeline import BLOCK, DROP_OLDEST, POLICIES
+from optical.sources import Frame
+
+ALIGN = 64                  # bytes; slot lines and the start of the pixels are aligned to cache lines
+
+_SLOT = np.dtype([('seq', '<i8'), ('index', '<i8'), ('counter', '<i8'), ('timestamp', '<f8'), ('device_time', '<f8'),
+                  ('aoi', '<i4', 4), ('rows', '<i4'), ('cols', '<i4')])
+_READER = np.dtype([('active', '<i8'), ('next', '<i8'), ('held', '<u8'), ('waiting', '<i8'), ('read', '<i8'),
+                    ('missed', '<i8'), ('part', '<i8', 2)])
+_PUBLISHED, _CLOSED, _DROPPED, _WAITS, _WRITER_WAITING = range(5)     # control words
+
+
+def _aligned(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def _in_part(start, stop, part):
+    # sequence numbers in [start, stop) that belong to part (i, n)
+    i, n = part
+    return (stop - 1 - i) // n - (start - 1 - i) // n
+
+
+class FrameBus(object):
+    """Frames of up to width x height at bits_per_pixel in slots shared memory slots, for up to readers readers.
+
+    Created by the acquisition process, which publish()es into it and close()s it; analysis processes get it as an
+    argument of multiprocessing.Process and attach() a reader. Sequence numbers start at 1.
+    """
+
+    def __init__(self, width, height, bits_per_pixel=8, slots=8, readers=4, policy=DROP_OLDEST):
+        if policy not in POLICIES:
+            raise ValueError("unknown bus policy %r, expected one of %s" % (policy, ", ".join(POLICIES)))
+        if slots < 2 or readers < 1:
+            raise ValueError("a frame bus needs at least two slots and one reader")
+        if slots > 64:
+            raise ValueError("a frame bus has at most 64 slots (a reader's held slots are one 64 bit mask)")
+        self._geometry = (width, height, bits_per_pixel, slots, readers, policy)
+        self._lock = multiprocessing.Lock()
+        self._wake = [multiprocessing.Semaphore(0) for _ in range(readers)]
+        self._space = multiprocessing.Semaphore(0)
+        self._setup()
+        self._shm = shared_memory.SharedMemory(create=True, size=self._size)
+        self._owner = True
+        self._local = 0             # BusReaders attached through this object, open in this process
+        self._map()
+        self._control[:] = 0
+        self._slots[:] = 0
+        self._readers[:] = 0
+
+    def _setup(self):
+        width, height, bits_per_pixel, slots, readers, policy = self._geometry
+        self.width, self.height, self.bits_per_pixel = width, height, bits_per_pixel
+        self.slots, self.readers, self.policy = slots, readers, policy
+        self.pitch = _aligned(width * (bits_per_pixel // 8))
+        self._offsets = (0, ALIGN, ALIGN + _aligned(slots * _SLOT.itemsize))     # control, slots, readers
+        self._data = self._offsets[2] + _aligned(readers * _READER.itemsize)
+        self._size = self._data + slots * height * self.pitch
+
+    def _map(self):
+        buf = self._shm.buf
+        self._control = np.ndarray(8, '<i8', buffer=buf, offset=self._offsets[0])
+        self._slots = np.ndarray(self.slots, _SLOT, buffer=buf, offset=self._offsets[1])
+        self._readers = np.ndarray(self.readers, _READER, buffer=buf, offset=self._offsets[2])
+        self._views = [frame_view(buf, self.width, self.height, self.bits_per_pixel, self.pitch,
+                                  self._data + i * self.height * self.pitch) for i in range(self.slots)]
+
+    def __getstate__(self):
+        return {'geometry': self._geometry, 'name': self._shm.name, 'lock': self._lock, 'wake': self._wake,
+                'space': self._space}
+
+    def __setstate__(self, state):
+        self._geometry = state['geometry']
+        self._lock, self._wake, self._space = state['lock'], state['wake'], state['space']
+        self._setup()
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._owner = False
+        self._local = 0
+        self._map()
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Writer
+
+    def _free_slot(self):
+        # with the lock held: the slot with the oldest frame nobody holds (and, blocking, every reader is done with)
+        readers = self._readers[self._readers['active'] != 0]
+        held = int(np.bitwise_or.reduce(readers['held'])) if len(readers) else 0
+        done = readers['next'].min() if self.policy == BLOCK and len(readers) else None
+        seqs = self._slots['seq']
+        best = None
+        for i in range(self.slots):
+            if held >> i & 1 or (done is not None and seqs[i] >= done):
+                continue
+            if best is None or seqs[i] < seqs[best]:
+                best = i
+        if best is not None:
+            seqs[best] = 0          # being written, no reader takes it
+        return best
+
+    def publish(self, frame):
+        """Copy frame (an optical.sources.Frame) into a slot; its sequence number, or None if it was dropped."""
+        array = frame.array
+        rows, cols = array.shape[:2]
+        if rows > self.height or cols > self.width or array.shape[2:] != self._views[0].shape[2:]:
+            raise ValueError("a %r frame does not fit a %dx%d, %d bit frame bus" % (array.shape, self.width, self.height,
+                                                                                    self.bits_per_pixel))
+        control = self._control
+        with self._lock:
+            slot = self._free_slot()
+            if slot is None and self.policy == BLOCK:
+                control[_WAITS] += 1
+        while slot is None and self.policy == BLOCK and not control[_CLOSED]:
+            with self._lock:
+                slot = self._free_slot()
+                control[_WRITER_WAITING] = slot is None
+            if slot is None:
+                self._space.acquire(timeout=0.1)
+        if slot is None:
+            with self._lock:
+                control[_DROPPED] += 1
+            return None
+
+        window(self._views[slot], 0, 0, cols, rows)[...] = array
+        with self._lock:
+            seq = int(control[_PUBLISHED]) + 1
+            meta = self._slots[slot]
+            meta['index'] = frame.index
+            meta['counter'] = -1 if frame.counter is None else frame.counter
+            meta['timestamp'] = frame.timestamp
+            meta['device_time'] = np.nan if frame.device_time is None else frame.device_time
+            meta['aoi'] = (0, 0, 0, 0) if frame.aoi is None else frame.aoi
+            meta['rows'], meta['cols'] = rows, cols
+            meta['seq'] = seq
+            control[_PUBLISHED] = seq
+            self._wake_readers()
+        return seq
+
+    def _wake_readers(self):
+        # with the lock held
+        waiting = np.flatnonzero(self._readers['waiting'])
+        self._readers['waiting'][waiting] = 0
+        for i in waiting:
+            self._wake[i].release()
+
+    def close(self):
+        """Owner: tell the readers that no more frames come, then let go of the shared memory (unlinked once every
+        process has closed it). Readers: detach."""
+        if self._shm is None:
+            return
+        if self._owner:
+            with self._lock:
+                self._control[_CLOSED] = 1
+                self._wake_readers()
+        self._control = self._slots = self._readers = self._views = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass                    # frames are still held; the mapping goes away with them
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Readers
+
+    def attach(self, part=None):
+        """A BusReader for the frames published from now on; part=(i, n) reads only the frames whose sequence
+        number is i modulo n, so n readers can share the work."""
+        i, n = part if part is not None else (0, 1)
+        if not 0 <= i < n:
+            raise ValueError("part %r is not (i, n) with 0 <= i < n" % (part,))
+        with self._lock:
+            free = np.flatnonzero(self._readers['active'] == 0)
+            if not len(free):
+                raise ValueError("all %d readers of the frame bus are attached" % self.readers)
+            entry = self._readers[free[0]]
+            entry['active'], entry['next'], entry['held'], entry['waiting'] = 1, self._control[_PUBLISHED] + 1, 0, 0
+            entry['read'] = entry['missed'] = 0
+            entry['part'] = (i, n)
+        self._local += 1
+        return BusReader(self, int(free[0]))
+
+    def attached(self):
+        return int(np.count_nonzero(self._readers['active']))
+
+    def stats(self):
+        readers = self._readers[self._readers['active'] != 0]
+        return {
+            'published': int(self._control[_PUBLISHED]),
+            'dropped': int(self._control[_DROPPED]),
+            'waits': int(self._control[_WAITS]),
+            'readers': [{'read': int(r['read']), 'missed': int(r['missed']),
+                         'behind': int(self._control[_PUBLISHED] + 1 - r['next'])} for r in readers],
+            'policy': self.policy,
+        }
+
+
+class BusReader(object):
+    """A frame source (optical/sources.py) over a FrameBus: read() hands out the next frame of the bus as a view
+    of its slot, which stays the reader's until the frame is released. read() waits for it and returns None once
+    the bus is closed and drained, or after timeout seconds."""
+
+    def __init__(self, bus, reader, timeout=None):
+        self.bus = bus
+        self.reader = reader
+        self.timeout = timeout
+        self.seq = None             # sequence number of the frame read last
+        self._closed = False
+
+    def _claim(self):
+        # with the lock held: take the next frame of this reader's part, or None if there is none yet
+        bus = self.bus
+        entry = bus._readers[self.reader]
+        part = tuple(entry['part'])
+        seqs = bus._slots['seq']
+        while entry['next'] <= bus._control[_PUBLISHED]:
+            present = np.flatnonzero(seqs >= entry['next'])
+            if not len(present):
+                return None
+            slot = present[np.argmin(seqs[present])]
+            seq = int(seqs[slot])
+            # frames that were overwritten before this reader got to them
+            entry['missed'] += _in_part(int(entry['next']), seq, part)
+            entry['next'] = seq + 1
+            if seq % part[1] == part[0]:
+                entry['held'] = int(entry['held']) | 1 << int(slot)
+                entry['read'] += 1
+                return slot, seq
+        return None
+
+    def read(self):
+        bus = self.bus
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        while True:
+            with bus._lock:
+                claimed = self._claim()
+                if bus._control[_WRITER_WAITING]:
+                    bus._control[_WRITER_WAITING] = 0
+                    bus._space.release()
+                if claimed is None:
+                    if bus._control[_CLOSED]:
+                        return None
+                    bus._readers['waiting'][self.reader] = 1
+                else:
+                    slot, self.seq = claimed
+                    meta = bus._slots[slot].copy()
+            if claimed is not None:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            bus._wake[self.reader].acquire(timeout=0.1)
+        aoi = tuple(int(v) for v in meta['aoi'])
+        return Frame(window(bus._views[slot], 0, 0, int(meta['cols']), int(meta['rows'])), int(meta['index']),
+                     float(meta['timestamp']), release=functools.partial(self._release, int(slot)), aoi=aoi if aoi[2] else None,
+                     counter=None if meta['counter'] < 0 else int(meta['counter']),
+                     device_time=None if np.isnan(meta['device_time']) else float(meta['device_time']))
+
+    def _release(self, slot):
+        bus = self.bus
+        with bus._lock:
+            entry = bus._readers[self.reader]
+            entry['held'] = int(entry['held']) & ~(1 << slot)
+            if bus._control[_WRITER_WAITING]:
+                bus._control[_WRITER_WAITING] = 0
+                bus._space.release()
+
+    def stats(self):
+        entry = self.bus._readers[self.reader]
+        return {'read': int(entry['read']), 'missed': int(entry['missed'])}
+
+    def close(self):
+        """Detach from the bus; the frames still held are given back. In an analysis process the last reader of a
+        FrameBus to close lets go of its shared memory."""
+        bus = self.bus
+        if self._closed or bus._readers is None:
+            return
+        self._closed = True
+        bus._local -= 1
+        with bus._lock:
+            entry = bus._readers[self.reader]
+            entry['active'], entry['held'], entry['waiting'] = 0, 0, 0
+            if bus._control[_WRITER_WAITING]:
+                bus._control[_WRITER_WAITING] = 0
+                bus._space.release()
+        if not bus._owner and bus._local == 0:
+            bus.close()
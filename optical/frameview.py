@@ -0,0 +1,68 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Zero-copy NumPy views of image memories, honouring the line pitch
+#
+# The driver pads every image line to its line pitch (is_InquireImageMem), so a frame of width w is not w *
+# bytes_per_pixel bytes per line but pitch bytes, and reshaping the buffer to (height, width, bytes_per_pixel) only
+# works while the two happen to agree; on a camera or AOI where they do not, the lines shear, and np.reshape quietly
+# copies whatever it cannot express as a view. frame_view() instead lays a strided array directly over the buffer:
+# one line every pitch bytes, the padding skipped, nothing copied.
+#
+#     view = memory_view(mem, width, height, nBitsPerPixel, pitch)   # an image memory of is_AllocImageMem
+#     view = frame_view(data, width, height, nBitsPerPixel, pitch)   # the flat array of get_data(copy=False)
+#     crop = window(view, x, y, w, h)                                 # a sub-window, still the driver's memory
+#
+# Mono8 frames are (height, width) uint8 arrays, the 16 bit mono formats (Mono10/12/16) (height, width) uint16 and
+# the packed colour formats (height, width, 3 or 4) uint8. A view is only valid as long as the memory it looks at.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import ctypes
+
+import numpy as np
+
+
+def _address(mem):
+    return ctypes.cast(mem, ctypes.c_void_p).value
+
+
+def _layout(bits_per_pixel):
+    # dtype and channels of a pixel format
+    if bits_per_pixel == 8:
+        return np.dtype(np.uint8), 1
+    if bits_per_pixel == 16:
+        return np.dtype("<u2"), 1
+    if bits_per_pixel in (24, 32):
+        return np.dtype(np.uint8), bits_per_pixel // 8
+    raise ValueError("no frame view for %d bits per pixel" % bits_per_pixel)
+
+
+def frame_view(buffer, width, height, bits_per_pixel, pitch, offset=0):
+    """Zero-copy view of the image that starts offset bytes into buffer (anything with the buffer protocol: a ctypes
+    array, the flat array of get_data, a memoryview), one line every pitch bytes."""
+    dtype, channels = _layout(bits_per_pixel)
+    line = width * dtype.itemsize * channels
+    if width <= 0 or height <= 0:
+        raise ValueError("empty frame %dx%d" % (width, height))
+    if pitch < line:
+        raise ValueError("line pitch %d is shorter than a line of %d pixels (%d bytes)" % (pitch, width, line))
+    size = memoryview(buffer).nbytes
+    if offset < 0 or offset + (height - 1) * pitch + line > size:
+        raise ValueError("a %dx%d frame with pitch %d at offset %d does not fit in %d bytes"
+                         % (width, height, pitch, offset, size))
+    if channels == 1:
+        return np.ndarray((height, width), dtype, buffer=buffer, offset=offset, strides=(pitch, dtype.itemsize))
+    return np.ndarray((height, width, channels), dtype, buffer=buffer, offset=offset, strides=(pitch, channels, 1))
+
+
+def memory_view(mem, width, height, bits_per_pixel, pitch):
+    """Zero-copy view of an image memory of is_AllocImageMem (a c_mem_p), as frame_view()."""
+    raw = (ctypes.c_ubyte * (height * pitch)).from_address(_address(mem))
+    return frame_view(raw, width, height, bits_per_pixel, pitch)
+
+
+def window(view, x, y, width, height):
+    """The sub-window of a frame view at x, y, without copying; the driver writes an AOI image at the top left of
+    its memory, so window(view, 0, 0, w, h) is the frame of an AOI of w x h."""
+    rows, cols = view.shape[:2]
+    if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > cols or y + height > rows:
+        raise ValueError("window %d,%d %dx%d is outside the %dx%d frame" % (x, y, width, height, cols, rows))
+    return view[y:y + height, x:x + width]
@@ -0,0 +1,92 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Dropped sensor frames, from the camera frame counter
+#
+# In free run the sensor keeps exposing while we process, and whatever does not fit into a free image memory is
+# lost without anyone noticing. The driver numbers every frame (UEYEIMAGEINFO.u64FrameNumber) and stamps it with the
+# camera clock (u64TimestampDevice), which optical/ring.py reads for each frame it hands out. GapCounter follows those
+# numbers: a jump of more than one is a gap, and the counter and device clock together give the real sensor frame
+# rate, to compare with how fast frames are actually delivered and measured.
+#
+#     gaps = GapCounter()
+#     gaps.observe(frame.counter, frame.device_time, frame.timestamp)     # frames missed just before this one
+#     print(gaps.report(pipeline.stats()['measured_fps']))
+#
+# A counter that goes backwards (capture restarted, e.g. for a new AOI) starts a new segment and is not a gap.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+
+class GapCounter(object):
+    """Counts the sensor frames missing between consecutive delivered frames."""
+
+    def __init__(self):
+        self.delivered = 0
+        self.missed = 0             # sensor frames that never arrived
+        self.gaps = 0               # places where at least one was missing
+        self.largest = 0
+        self.restarts = 0
+        self._intervals = 0         # counter steps with a device time to go with them
+        self._device_seconds = 0.0
+        self._first_host = None
+        self._last = None           # (counter, device_time, host_time) of the previous frame
+
+    def observe(self, counter, device_time=None, host_time=None):
+        """Account for one delivered frame; returns the number of sensor frames missed right before it."""
+        missed = 0
+        if self._last is not None:
+            step = counter - self._last[0]
+            if step <= 0:
+                self.restarts += 1
+            else:
+                missed = step - 1
+                if device_time is not None and self._last[1] is not None:
+                    self._intervals += step
+                    self._device_seconds += device_time - self._last[1]
+        if missed:
+            self.missed += missed
+            self.gaps += 1
+            self.largest = max(self.largest, missed)
+        if self._first_host is None:
+            self._first_host = host_time
+        self._last = (counter, device_time, host_time)
+        self.delivered += 1
+        return missed
+
+    def sensor_fps(self):
+        """Frame rate of the sensor on its own clock, None before two frames with device timestamps."""
+        if self._device_seconds <= 0:
+            return None
+        return self._intervals / self._device_seconds
+
+    def delivered_fps(self):
+        if self._first_host is None or self._last[2] is None or self._last[2] <= self._first_host:
+            return None
+        return (self.delivered - 1) / (self._last[2] - self._first_host)
+
+    def stats(self):
+        return {
+            'sensor_frames': self.delivered + self.missed,
+            'delivered': self.delivered,
+            'missed': self.missed,
+            'gaps': self.gaps,
+            'largest_gap': self.largest,
+            'restarts': self.restarts,
+            'sensor_fps': self.sensor_fps(),
+            'delivered_fps': self.delivered_fps(),
+        }
+
+    def report(self, measured_fps=None):
+        s = self.stats()
+        text = "Camera: %(sensor_frames)d sensor frames, %(delivered)d delivered, %(missed)d missed in %(gaps)d gaps " \
+               "(largest %(largest_gap)d)" % s
+        sensor, delivered = s['sensor_fps'], s['delivered_fps']
+        if sensor is not None:
+            text += "; sensor %.1f fps (device clock)" % sensor
+        if delivered is not None:
+            text += ", delivered %.1f fps" % delivered
+        if measured_fps is not None:
+            text += ", measured %.1f fps" % measured_fps
+            if sensor:
+                text += " (%.0f%% of the sensor rate)" % (100.0 * measured_fps / sensor)
+        if s['restarts']:
+            text += "; capture restarted %d times" % s['restarts']
+        return text
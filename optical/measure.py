@@ -0,0 +1,228 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# 4-points measurement (the processing block of 4_points.py)
+#
+# goodFeaturesToTrack finds the corners of the two fiber end faces; two corners that are roughly above each
+# other (200 < y distance < 223 px and 0 < x distance < 8 px at 0.3 scale) are the top and bottom of one end
+# face and their midpoint is the centre of that face. The X/Y difference between the two midpoints, times
+# the pixel size, is the misalignment of the fibers in um.
+#
+# measure_4_points only measures; draw_4_points renders the overlay 4_points.py used to draw in the loop.
+#
+# The camera looks at the fibers upside down and the scripts measured cv2.flip(frame, -1). With rotated=True
+# measure_4_points takes the frame as it comes and returns exactly what it would have found in the flipped frame,
+# without flipping it: the contour boxes are mirrored, and only the region goodFeaturesToTrack searches is rotated
+# (its ties are broken by memory order, so it has to see those pixels the right way up to pick the same corners).
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import cv2
+import numpy as np
+
+# findContours has left its input alone since OpenCV 3.2; before that it had to be handed a copy
+_CONTOURS_MODIFY_INPUT = tuple(int(v) for v in cv2.__version__.split(".")[:2]) < (3, 2)
+
+
+def midpoint(ptA, ptB):
+    return ((ptA[0] + ptB[0]) * 0.5, (ptA[1] + ptB[1]) * 0.5)
+
+
+def external_contours(image):
+    """cv2.findContours(RETR_EXTERNAL, CHAIN_APPROX_SIMPLE) contours under OpenCV 3 and 4 alike.
+
+    What imutils.grab_contours does, without importing imutils (which pulls in urllib) just for that.
+    """
+    return cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+
+def candidate_contours(image, min_height=0):
+    """External contours of the non-zero regions of image whose bounding box is at least min_height tall,
+    as a list of (contour, (x, y, w, h)). An end face is as tall as its two corners are apart, so anything
+    lower than the y window cannot hold one."""
+    cnts = external_contours(image.copy() if _CONTOURS_MODIFY_INPUT else image)
+    candidates = []
+    for c in cnts:
+        box = cv2.boundingRect(c)
+        if box[3] >= min_height:
+            candidates.append((c, box))
+    return candidates
+
+
+CORNER_MARGIN = 8       # pixels around the masked boxes the corner response needs (Sobel, block, local maximum)
+
+
+def detect_corners(image, boxes, max_corners=9, quality=0.01, min_distance=12, pad=3, rotated=False, pool=None):
+    """Run goodFeaturesToTrack once, masked to the bounding boxes (grown by pad pixels).
+
+    Returns all corners, shaped (n, 1, 2) like goodFeaturesToTrack (None if there are none), and for every box
+    the indices of the corners that fall inside it, strongest first. With rotated=True boxes and corners are in the
+    coordinates of cv2.flip(image, -1). pool (an optical.buffers.BufferPool) holds the mask and the rotated region.
+    """
+    empty = np.empty(0, np.intp)
+    if not boxes:
+        return None, []
+    rows, cols = image.shape[:2]
+    grown = []
+    for (x, y, w, h) in boxes:
+        grown.append((max(x - pad, 0), max(y - pad, 0), min(x + w + pad, cols), min(y + h + pad, rows)))
+
+    # Only the masked pixels can be corners and their response only depends on the few pixels around them, so
+    # goodFeaturesToTrack runs on the rectangle around the boxes (plus CORNER_MARGIN) instead of the whole frame
+    x0 = max(min(g[0] for g in grown) - CORNER_MARGIN, 0)
+    y0 = max(min(g[1] for g in grown) - CORNER_MARGIN, 0)
+    x1 = min(max(g[2] for g in grown) + CORNER_MARGIN, cols)
+    y1 = min(max(g[3] for g in grown) + CORNER_MARGIN, rows)
+    # the region changes size from frame to frame, pooled buffers are full frames of which it uses the top left
+    if rotated:
+        dst = pool.take("corner region", image.shape)[:y1 - y0, :x1 - x0] if pool is not None else None
+        region = cv2.flip(image[rows - y1:rows - y0, cols - x1:cols - x0], -1, dst=dst)
+    else:
+        region = image[y0:y1, x0:x1]
+    if pool is not None:
+        mask = pool.take("corner mask", (rows, cols))[:y1 - y0, :x1 - x0]
+        mask[...] = 0
+    else:
+        mask = np.zeros(region.shape[:2], np.uint8)
+    for (gx0, gy0, gx1, gy1) in grown:
+        mask[gy0 - y0:gy1 - y0, gx0 - x0:gx1 - x0] = 255
+
+    pts = cv2.goodFeaturesToTrack(region, max_corners, quality, min_distance, mask=mask)
+    if pts is None:
+        return None, [empty for _ in boxes]
+    pts += np.array((x0, y0), np.float32)
+    xy = pts[:, 0]
+    groups = []
+    for (gx0, gy0, gx1, gy1) in grown:
+        inside = (xy[:, 0] >= gx0) & (xy[:, 0] < gx1) & (xy[:, 1] >= gy0) & (xy[:, 1] < gy1)
+        groups.append(np.flatnonzero(inside))
+    return pts, groups
+
+
+SWEEP_THRESHOLD = 64    # above this many corners match_pairs sorts and sweeps instead of comparing every pair
+
+
+def match_pairs(points, y_window=(200, 223), x_window=(0, 8)):
+    """Find the corner pairs (i, j) with y_window[0] < y_i - y_j < y_window[1] and x_window[0] < |x_i - x_j| <
+    x_window[1], i.e. i is the bottom and j the top corner of one end face.
+
+    points is an (n, 2) array of (x, y). Returns two index arrays, each pair once, ordered by i then j (the order
+    of the old double loop over the strongest-first corners). Small n compares all pairs with broadcasting; large n
+    sorts by y and only looks at the corners inside the y window of each point, which is O(n log n + matches).
+    """
+    points = np.asarray(points, np.float64).reshape(-1, 2)
+    x, y = points[:, 0], points[:, 1]
+    y_low, y_high = y_window
+    x_low, x_high = x_window
+    n = len(points)
+
+    if n <= SWEEP_THRESHOLD:
+        dy = y[:, None] - y[None, :]
+        keep = (dy > y_low) & (dy < y_high)
+        i, j = np.nonzero(keep)
+    else:
+        order = np.argsort(y, kind='stable')
+        ys = y[order]
+        # y_i - y_high < y_j < y_i - y_low
+        start = np.searchsorted(ys, y - y_high, side='right')
+        stop = np.searchsorted(ys, y - y_low, side='left')
+        counts = np.maximum(stop - start, 0)
+        i = np.repeat(np.arange(n), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(start, counts) + offsets]
+
+    dx = np.abs(x[i] - x[j])
+    keep = (dx > x_low) & (dx < x_high) & (i != j)
+    i, j = i[keep], j[keep]
+    if y_low < 0:
+        # a window around zero matches (i, j) and (j, i); keep one of them
+        keep = (i < j) | ~np.isin(j * n + i, i * n + j)
+        i, j = i[keep], j[keep]
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+def measure_4_points(image, pix=2.75, y_window=(200, 223), x_window=(0, 8), rotated=False, pool=None):
+    """Measure one (already scaled and flipped) Mono8 frame.
+
+    pix is the size of one pixel of image in um; y_window and x_window are the open intervals the y and x distance
+    of the two corners of one end face must fall into. The defaults are the values for the 0.3-scaled image,
+    optical.scale.AcquisitionScale converts them for other scales. rotated=True measures a frame that was not
+    flipped: the result is that of cv2.flip(image, -1), in its coordinates. pool, an optical.buffers.BufferPool,
+    keeps the intermediates from one frame to the next.
+
+    Returns the dic2 dictionary of 4_points.py (XYTupleList, XDifference, YDifference in um) plus the
+    detected corners, the indices of the corners of each candidate contour and the matched corner pairs, which the
+    overlay needs.
+    """
+    dic2 = {
+        'XYTupleList': [],
+        'XDifference': 0,
+        'YDifference': 0,
+        'corners': None,
+        'groups': [],
+        'pairs': [],
+    }
+
+    # Find the contours that are tall enough to be a fiber, then their corners, aka points with high definition and
+    # with which the gradient fades off abruptly. goodFeaturesToTrack runs once per frame, not once per contour.
+    candidates = candidate_contours(image, min_height=y_window[0])
+    boxes = [box for c, box in candidates]
+    if rotated:
+        rows, cols = image.shape[:2]
+        boxes = [(cols - x - w, rows - y - h, w, h) for (x, y, w, h) in boxes]
+    dic2['corners'], dic2['groups'] = detect_corners(image, boxes, rotated=rotated, pool=pool)
+
+    if dic2['corners'] is None:
+        return dic2
+    xy = dic2['corners'][:, 0]
+
+    # The two corners of one end face lie on the same contour
+    member = np.zeros((len(xy), len(dic2['groups'])), bool)
+    for k, group in enumerate(dic2['groups']):
+        member[group, k] = True
+    i, j = match_pairs(xy, y_window, x_window)
+    same_contour = (member[i] & member[j]).any(axis=1)
+    i, j = i[same_contour], j[same_contour]
+
+    midpoints = (xy[i] + xy[j]) * 0.5
+    dic2['pairs'] = [(tuple(xy[a]), tuple(xy[b])) for a, b in zip(i, j)]
+    # Result of dic2['XYTupleList'] = [(288.0, 238.0), (322.0, 157.5)]
+    # Where dic2['XYTupleList'] = [(x, y), (x1, y1)]
+    # To access x, do dic2['XYTupleList'][0][0]
+    dic2['XYTupleList'] = [(float(cX), float(cY)) for cX, cY in midpoints]
+    if len(midpoints) >= 2:
+        xDifference, yDifference = midpoints[0] - midpoints[1]
+        dic2['XDifference'] = float(xDifference) * pix
+        dic2['YDifference'] = float(yDifference) * pix
+
+    return dic2
+
+
+def draw_4_points(image, dic2, color=None):
+    """Draw the midpoints, the X/Y difference box and the corners of a measure_4_points result onto image.
+
+    color, if given, replaces every colour (optical/overlay.py uses it to draw the mask of the overlay).
+    """
+    def paint(default):
+        return default if color is None else color
+
+    for (pi, pj), (cX, cY) in zip(dic2['pairs'], dic2['XYTupleList']):
+        cv2.line(image, (int(pi[0]), int(pi[1])), (int(pj[0]), int(pj[1])), paint((255, 0, 0)), 1)
+        cv2.circle(image, (int(cX), int(cY)), 4, paint((255, 255, 255)), -1)
+        cv2.putText(image, "mid", (int(cX-20), int(cY - 20)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, paint((255, 255, 255)), 2)
+
+    if dic2['pairs']:
+        # the scripts passed cv2.QT_FONT_NORMAL here, which OpenCV 4 silently maps to FONT_HERSHEY_DUPLEX
+        cv2.rectangle(image, (0, 0), (225, 80), paint((255, 255, 255)), -1)
+        cv2.putText(image, "X-Difference is " + str(abs(dic2['XDifference'])) + " um", (0, 60), cv2.FONT_HERSHEY_DUPLEX,
+                    0.5, paint((0, 0, 0)), thickness=1)
+        cv2.putText(image, "Y-Difference is " + str(abs(dic2['YDifference'])) + " um", (0, 30), cv2.FONT_HERSHEY_DUPLEX,
+                    0.5, paint((0, 0, 0)), thickness=1)
+
+    if dic2['corners'] is None:
+        return image
+    # Convert the corners into keypoints so that they can be plotted
+    kps = [cv2.KeyPoint(float(f[0][0]), float(f[0][1]), 20) for f in dic2['corners']]
+    if image.ndim == 3 and image.shape[2] == 3:
+        # what drawKeypoints draws onto its own BGR copy of image, drawn onto image itself
+        return cv2.drawKeypoints(image, kps, image, color=paint((0, 255, 0)),
+                                 flags=cv2.DRAW_MATCHES_FLAGS_DRAW_OVER_OUTIMG)
+    return cv2.drawKeypoints(image, kps, None, color=paint((0, 255, 0)), flags=0)
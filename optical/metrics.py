@@ -0,0 +1,149 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Pipeline metrics in Prometheus text format
+#
+# Latency histograms per stage, counters and gauges, kept as plain Python numbers so that recording costs one
+# perf_counter() call and a bisect per stage (see benchmarks/bench_metrics.py for the measured overhead), and a
+# small HTTP server that renders them for Prometheus (or curl) on a local port:
+#
+#     metrics = Metrics()
+#     pipeline = Pipeline(source, measure, metrics=metrics)        # acquire / measure / sink latency, frame counts
+#     image = metrics.timed("flip", cv2.flip, frame, -1)           # any other stage
+#     metrics.count("detection_failures")
+#     server = MetricsServer(metrics, port=9108)                   # curl http://127.0.0.1:9108/metrics
+#
+# A histogram or counter is only ever updated by one thread (each stage runs on one); a scrape reads them without
+# locking, so it can see a sample counted but its time not yet added to the sum, which Prometheus tolerates.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import bisect
+import collections
+import threading
+import time
+
+# upper bounds in seconds, 0.5 ms (a flip on a scaled frame) up to 1 s (a stalled camera)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+HELP = {
+    'detection_failures': "Frames in which the two fiber end faces were not both found",
+}
+
+
+class Histogram(object):
+    """Counts per bucket (not cumulative, the last one is +Inf), sum and count of the observed values."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # bisect_left: a value equal to a bound belongs to that bucket (Prometheus "le")
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics(object):
+    """Stage latency histograms, counters and gauges of one process, rendered with render()."""
+
+    def __init__(self, prefix="optical", buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._stages = collections.OrderedDict()
+        self._counts = collections.OrderedDict()
+        self._callbacks = collections.OrderedDict()      # name -> (type, help, fn), read at scrape time
+
+    def histogram(self, stage):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            histogram = self._stages.setdefault(stage, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).observe(seconds)
+
+    def timed(self, stage, fn, *args):
+        """fn(*args), recording how long it took as one sample of stage."""
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.histogram(stage).observe(time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        self._counts[name] = self._counts.get(name, 0) + n
+
+    def counter(self, name, help, fn):
+        """A counter kept elsewhere (e.g. Pipeline.acquired), read by calling fn when scraped."""
+        self._callbacks[name] = ("counter", help, fn)
+
+    def gauge(self, name, help, fn):
+        self._callbacks[name] = ("gauge", help, fn)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        p = self.prefix
+        lines = []
+        if self._stages:
+            lines += ["# HELP %s_stage_seconds Time spent in each processing stage per frame" % p,
+                      "# TYPE %s_stage_seconds histogram" % p]
+            for stage, h in list(self._stages.items()):
+                counts, total, count = list(h.counts), h.sum, h.count
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    lines.append('%s_stage_seconds_bucket{stage="%s",le="%s"} %d' % (p, stage, _number(bound),
+                                                                                     cumulative))
+                lines.append('%s_stage_seconds_sum{stage="%s"} %s' % (p, stage, _number(total)))
+                lines.append('%s_stage_seconds_count{stage="%s"} %d' % (p, stage, count))
+        for name, value in list(self._counts.items()):
+            lines += ["# HELP %s_%s_total %s" % (p, name, HELP.get(name, name.replace("_", " "))),
+                      "# TYPE %s_%s_total counter" % (p, name),
+                      "%s_%s_total %s" % (p, name, _number(value))]
+        for name, (kind, help, fn) in list(self._callbacks.items()):
+            metric = "%s_%s%s" % (p, name, "_total" if kind == "counter" else "")
+            lines += ["# HELP %s %s" % (metric, help), "# TYPE %s %s" % (metric, kind),
+                      "%s %s" % (metric, _number(fn()))]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer(object):
+    """Serves metrics.render() at http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, metrics, port=9108, host="127.0.0.1"):
+        # http.server (with email, ssl, ...) takes longer to import than the camera takes to start; only load it here
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
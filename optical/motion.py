@@ -0,0 +1,131 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Predictive search window for the fiber ends
+#
+# While the stage moves the fibers, each end face midpoint follows a fairly smooth path. A constant-velocity
+# Kalman filter per end predicts where the midpoint will be in the next frame, and the detection (contours,
+# corners, pair matching) only runs on a window around the two predictions, so its cost depends on the size
+# of the end faces and not on the size of the sensor. When nothing is found in the window it grows (twice as
+# large every frame) until it covers the whole image; if the whole image fails too, prediction restarts from
+# the next full-frame detection.
+#
+#     window = PredictiveWindow(lambda image: measure_4_points(image, pix), pix)
+#     dic2 = window.measure(image)        # dic2['window'] is the (x0, y0, x1, y1) that was searched
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import cv2
+import numpy as np
+
+
+class EndModel(object):
+    """Constant-velocity Kalman filter on one end face midpoint; state (x, y, vx, vy), one step per frame."""
+
+    def __init__(self, x, y, process_noise=0.03, measurement_noise=0.5):
+        kf = cv2.KalmanFilter(4, 2)
+        kf.transitionMatrix = np.array([[1, 0, 1, 0],
+                                        [0, 1, 0, 1],
+                                        [0, 0, 1, 0],
+                                        [0, 0, 0, 1]], np.float32)
+        kf.measurementMatrix = np.eye(2, 4, dtype=np.float32)
+        kf.processNoiseCov = np.eye(4, dtype=np.float32) * process_noise
+        kf.measurementNoiseCov = np.eye(2, dtype=np.float32) * measurement_noise
+        kf.errorCovPost = np.eye(4, dtype=np.float32)
+        kf.statePost = np.array([[x], [y], [0], [0]], np.float32)
+        self.kf = kf
+
+    def predict(self):
+        state = self.kf.predict()
+        return float(state[0, 0]), float(state[1, 0])
+
+    def correct(self, x, y):
+        self.kf.correct(np.array([[x], [y]], np.float32))
+
+
+def _shift(dic2, dx, dy):
+    # move a result measured on a window back into full image coordinates
+    if dic2['corners'] is not None:
+        dic2['corners'] = dic2['corners'] + np.array([dx, dy], np.float32)
+    dic2['pairs'] = [((a[0] + dx, a[1] + dy), (b[0] + dx, b[1] + dy)) for a, b in dic2['pairs']]
+    dic2['XYTupleList'] = [(x + dx, y + dy) for x, y in dic2['XYTupleList']]
+    return dic2
+
+
+class PredictiveWindow(object):
+    """Runs measure (image -> measure_4_points style dictionary) on a window around the predicted end faces.
+
+    pix is the um per pixel measure uses, needed to recompute the difference once the ends are assigned.
+    y_window is the corner distance window measure uses: the search window reaches half its upper end above and
+    below each predicted midpoint, plus margin pixels (times the current growth) on every side.
+    """
+
+    def __init__(self, measure, pix=2.75, y_window=(200, 223), margin=24):
+        self._measure = measure
+        self.pix = pix
+        self.half_face = y_window[1] / 2.0
+        self.margin = margin
+        self.growth = 1
+        self.models = None
+        self.windowed = 0
+        self.full = 0
+        self.misses = 0
+
+    def _window(self, predictions, shape):
+        rows, cols = shape[:2]
+        pad = self.margin * self.growth
+        xs = [p[0] for p in predictions]
+        ys = [p[1] for p in predictions]
+        x0 = int(max(min(xs) - pad, 0))
+        x1 = int(min(max(xs) + pad + 1, cols))
+        y0 = int(max(min(ys) - self.half_face - pad, 0))
+        y1 = int(min(max(ys) + self.half_face + pad + 1, rows))
+        return (x0, y0, x1, y1)
+
+    def _assign(self, dic2, predictions):
+        # take the midpoint closest to each prediction and keep the two ends in model order, so a spurious extra
+        # pair on one end face is ignored and the sign of the difference does not flip between frames
+        mids = np.array(dic2['XYTupleList'], np.float64)
+        distance = np.hypot(mids[:, None, 0] - np.array([p[0] for p in predictions]),
+                            mids[:, None, 1] - np.array([p[1] for p in predictions]))
+        cost = distance[:, None, 0] + distance[None, :, 1]
+        np.fill_diagonal(cost, np.inf)
+        first, second = np.unravel_index(np.argmin(cost), cost.shape)
+        order = [first, second] + [k for k in range(len(mids)) if k not in (first, second)]
+        dic2['XYTupleList'] = [dic2['XYTupleList'][k] for k in order]
+        dic2['pairs'] = [dic2['pairs'][k] for k in order]
+        dic2['XDifference'] = float(mids[first, 0] - mids[second, 0]) * self.pix
+        dic2['YDifference'] = float(mids[first, 1] - mids[second, 1]) * self.pix
+        return dic2
+
+    def measure(self, image):
+        rows, cols = image.shape[:2]
+        if self.models is None:
+            window = (0, 0, cols, rows)
+            predictions = None
+        else:
+            predictions = [model.predict() for model in self.models]
+            window = self._window(predictions, image.shape)
+
+        x0, y0, x1, y1 = window
+        dic2 = _shift(self._measure(image[y0:y1, x0:x1]), x0, y0)
+        dic2['window'] = window
+        if window == (0, 0, cols, rows):
+            self.full += 1
+        else:
+            self.windowed += 1
+
+        if len(dic2['XYTupleList']) < 2:
+            self.misses += 1
+            if window == (0, 0, cols, rows):
+                self.models = None
+                self.growth = 1
+            else:
+                self.growth *= 2
+            return dic2
+
+        self.growth = 1
+        if predictions is None:
+            self.models = [EndModel(x, y) for x, y in dic2['XYTupleList'][:2]]
+        else:
+            dic2 = self._assign(dic2, predictions)
+            for model, (x, y) in zip(self.models, dic2['XYTupleList'][:2]):
+                model.correct(x, y)
+        return dic2
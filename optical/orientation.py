@@ -0,0 +1,81 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Image orientation: the 180 degree rotation without cv2.flip on every frame
+#
+# The camera sees the fibers upside down, so every script ran cv2.flip(frame, -1) on each frame before measuring
+# it, a full extra pass over the image and a new allocation just to have it the right way up. Orientation moves that
+# rotation out of the pixel path:
+#   sensor       the sensor reads out mirrored in x and y (is_SetRopEffect), the frames arrive the right way up
+#   coordinates  the frame is measured as it comes and the strategy returns the coordinates of the rotated frame
+#                (Strategy.measure_rotated, optical/strategies.py); only the displayed image is flipped, when shown
+#   pixels       the old cv2.flip of every frame, for comparison
+# "auto" takes sensor when the camera supports it and coordinates otherwise. In every mode the measurement is
+# bit-identical to measuring cv2.flip(frame, -1): the strategies that cannot rotate their result exactly flip the
+# frame themselves, and with the sensor mirrored the software resize cuts an uneven remainder from the other side
+# (AcquisitionScale.rotated, set by the Camera).
+#
+#     orientation = Orientation("auto")
+#     camera = Camera(scale=scale, orientation=orientation).open()       # programs the sensor if it can
+#     m = orientation.measure(strategy, scale.apply(frame.array))         # coordinates of the upright image
+#     display.show(orientation.upright(image), m.dic2())
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import cv2
+
+from optical.api import UEyeError, check
+
+MODES = ("auto", "sensor", "coordinates", "pixels")
+
+
+class Orientation(object):
+    """Where the 180 degree rotation of the camera image is done; applied is what configure() / assume() chose."""
+
+    def __init__(self, mode="auto"):
+        if mode not in MODES:
+            raise ValueError("unknown orientation mode %r, expected one of %s" % (mode, ", ".join(MODES)))
+        self.mode = mode
+        self.applied = "pixels" if mode == "pixels" else "coordinates"
+
+    @property
+    def in_sensor(self):
+        """True if the frames already arrive the right way up."""
+        return self.applied == "sensor"
+
+    def configure(self, api, hCam):
+        """Mirror the sensor readout in x and y if the mode allows it and the camera can do it."""
+        if self.mode not in ("auto", "sensor"):
+            return self
+        names = ("is_SetRopEffect", "IS_SET_ROP_MIRROR_UPDOWN", "IS_SET_ROP_MIRROR_LEFTRIGHT")
+        if not all(hasattr(api, n) for n in names):
+            if self.mode == "sensor":
+                raise UEyeError("is_SetRopEffect", "not available")
+            return self.assume(False)
+        nRet = api.is_SetRopEffect(hCam, api.IS_SET_ROP_MIRROR_UPDOWN | api.IS_SET_ROP_MIRROR_LEFTRIGHT, 1, 0)
+        if self.mode == "sensor":
+            check(api, nRet, "is_SetRopEffect")
+        return self.assume(nRet == api.IS_SUCCESS)
+
+    def assume(self, in_sensor):
+        """The frames arrive rotated by the sensor already (in_sensor) or not, e.g. a recorded session."""
+        if in_sensor:
+            self.applied = "sensor"
+        else:
+            self.applied = "pixels" if self.mode == "pixels" else "coordinates"
+        return self
+
+    def measure(self, strategy, image):
+        """strategy's Measurement of the upright image."""
+        if self.applied == "sensor":
+            return strategy.measure(image)
+        if self.applied == "pixels":
+            return strategy.measure(cv2.flip(image, -1))
+        return strategy.measure_rotated(image)
+
+    def upright(self, image, pool=None):
+        """image (a frame as measured) the right way up, for the display and snapshots; the flip goes into a buffer
+        of pool (an optical.buffers.BufferPool) if given."""
+        if self.applied == "sensor":
+            return image
+        return cv2.flip(image, -1, dst=pool.take("upright", image.shape) if pool is not None else None)
+
+    def __repr__(self):
+        return "Orientation(%s)" % self.applied
@@ -0,0 +1,115 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Retained, rate-limited display overlay
+#
+# The scripts drew the lines, circles, the X/Y difference box and the corner keypoints onto every frame and
+# showed it, although nobody reads the screen at the camera frame rate. Here the drawing is kept out of the
+# measurement path altogether:
+#   - Overlay draws a result once onto a blank layer, keeps only the drawn pixels and reuses them until the
+#     values it shows change: the differences rounded to the digits shown and the pixel positions
+#   - Display shows the latest result at most max_fps times a second, writing the retained pixels onto it
+# With --headless neither is created and nothing is drawn at all.
+#
+#     display = Display("froggy", max_fps=15)
+#     while pipeline.running():
+#         if display.due():
+#             image = display.show(dic2['image'], dic2)
+#         key = cv2.waitKey(display.wait_ms())
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import time
+
+import cv2
+import numpy as np
+
+from optical.buffers import BufferPool
+from optical.measure import draw_4_points
+
+
+def _rounded(dic2, digits):
+    # what is actually drawn: differences to the digits shown, positions to whole pixels
+    shown = dict(dic2)
+    shown['XDifference'] = round(dic2['XDifference'], digits)
+    shown['YDifference'] = round(dic2['YDifference'], digits)
+    shown['XYTupleList'] = [(int(x), int(y)) for x, y in dic2['XYTupleList']]
+    shown['pairs'] = [((int(a[0]), int(a[1])), (int(b[0]), int(b[1]))) for a, b in dic2['pairs']]
+    if dic2['corners'] is not None:
+        shown['corners'] = np.rint(dic2['corners']).astype(np.float32)
+    return shown
+
+
+def _key(shape, shown):
+    corners = None if shown['corners'] is None else shown['corners'].tobytes()
+    return (shape[:2], shown['XDifference'], shown['YDifference'], tuple(shown['XYTupleList']),
+            tuple(shown['pairs']), corners)
+
+
+class Overlay(object):
+    """The drawing of one result, kept until the values it shows change. digits is the precision of the um text."""
+
+    def __init__(self, digits=2):
+        self.digits = digits
+        self.renders = 0
+        self.reuses = 0
+        self._key = None
+        self._shape = None
+        self._index = None          # flat indices of the drawn pixels of a BGR frame, and their colours
+        self._pixels = None
+        self.pool = BufferPool()    # the composed frames, see optical/buffers.py
+
+    def render(self, dic2, shape):
+        shown = _rounded(dic2, self.digits)
+        key = _key(shape, shown)
+        if key == self._key:
+            self.reuses += 1
+            return
+        layer = draw_4_points(np.zeros(shape[:2] + (3,), np.uint8), shown)
+        mask = draw_4_points(np.zeros(shape[:2] + (3,), np.uint8), shown, color=(255, 255, 255))
+        # only the few drawn pixels are kept, so showing a frame does not touch the rest of it
+        self._index = np.flatnonzero(mask[:, :, 0])
+        self._pixels = layer.reshape(-1, 3)[self._index]
+        self._shape = shape[:2]
+        self._key = key
+        self.renders += 1
+
+    def compose(self, image):
+        """A BGR copy of image with the retained overlay on top; image itself is not touched."""
+        out = self.pool.take("composed", image.shape[:2] + (3,))
+        if image.ndim == 2:
+            cv2.cvtColor(image, cv2.COLOR_GRAY2BGR, dst=out)
+        elif image.shape[2] == 4:
+            # BGRA from a 32 bit colour mode (--color)
+            cv2.cvtColor(image, cv2.COLOR_BGRA2BGR, dst=out)
+        else:
+            out[...] = image
+        if self._index is not None and self._shape == out.shape[:2]:
+            out.reshape(-1, 3)[self._index] = self._pixels
+        return out
+
+
+class Display(object):
+    """Shows results in an OpenCV window at most max_fps times a second."""
+
+    def __init__(self, name="froggy", max_fps=15.0, digits=2):
+        self.name = name
+        self.period = 1.0 / max_fps
+        self.overlay = Overlay(digits)
+        self.shown = 0
+        self._last = None
+
+    def due(self):
+        return self._last is None or time.perf_counter() - self._last >= self.period
+
+    def wait_ms(self):
+        """How long the caller can block in cv2.waitKey before the next refresh is due (at least 1 ms)."""
+        if self._last is None:
+            return 1
+        remaining = self.period - (time.perf_counter() - self._last)
+        return max(1, int(remaining * 1000))
+
+    def show(self, image, dic2):
+        self._last = time.perf_counter()
+        self.overlay.render(dic2, image.shape)
+        out = self.overlay.compose(image)
+        cv2.imshow(self.name, out)
+        self.shown += 1
+        return out
@@ -0,0 +1,230 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Threaded acquisition -> measurement -> display pipeline
+#
+# The original while loop acquired, resized, flipped, measured, drew and showed every frame on one thread,
+# so the slowest of those steps set the frame rate. Here acquisition and measurement run on their own
+# threads connected by a bounded FrameQueue, and the display (which has to stay on the main thread for
+# cv2.imshow) only samples the latest result.
+#
+#     pipeline = Pipeline(source, measure, depth=2, policy=DROP_OLDEST).start()
+#     while pipeline.running():
+#         latest = pipeline.latest()         # (frame index, result) or None
+#         ...
+#     pipeline.stop()
+#     print(pipeline.report())
+#
+# OpenCV releases the GIL inside resize/Canny/goodFeaturesToTrack, so the stages really do overlap.
+# With metrics (optical/metrics.py) the time of every read, measure and sink call goes into a histogram, and the
+# frame counts and queue depth are published as counters and gauges.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import collections
+import functools
+import threading
+import time
+
+DROP_OLDEST = "drop_oldest"     # a full queue discards its oldest frame: measure the freshest frames, never stall the camera
+BLOCK = "block"                 # a full queue makes the producer wait: measure every frame (offline replay)
+POLICIES = (DROP_OLDEST, BLOCK)
+
+
+def _release(item):
+    release = getattr(item, "release", None)
+    if release is not None:
+        release()
+
+
+class FrameQueue(object):
+    """Bounded FIFO between two stages. Dropped frames are released so their ring buffers go back to the camera."""
+
+    def __init__(self, maxsize=2, policy=DROP_OLDEST):
+        if policy not in POLICIES:
+            raise ValueError("unknown queue policy %r, expected one of %s" % (policy, ", ".join(POLICIES)))
+        if maxsize < 1:
+            raise ValueError("queue size must be at least 1")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.put_count = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._items = collections.deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            while len(self._items) >= self.maxsize and not self._closed:
+                if self.policy == DROP_OLDEST:
+                    _release(self._items.popleft())
+                    self.dropped += 1
+                else:
+                    self._cond.wait()
+            if self._closed:
+                _release(item)
+                return False
+            self._items.append(item)
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Next item, or None once the queue is closed and empty (or on timeout)."""
+        with self._cond:
+            while not self._items and not self._closed:
+                if not self._cond.wait(timeout) and timeout is not None:
+                    break
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        # wakes up both sides; items still queued can be drained with get()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            while self._items:
+                _release(self._items.popleft())
+            self._cond.notify_all()
+
+    def depth(self):
+        return len(self._items)
+
+
+class Pipeline(object):
+    """Acquisition and measurement threads around a frame source.
+
+    measure(array) is called on the measurement thread for every frame that makes it through the queue;
+    the frame is released right after it returns. sink(frame, result), if given, also runs on the
+    measurement thread, for every result (e.g. to log measurements when running headless); only the
+    frame's metadata (index, timestamp, aoi) may be used there, its pixels are already released.
+    metrics, an optical.metrics.Metrics, records the "acquire", "measure" and "sink" stage latencies.
+    """
+
+    def __init__(self, source, measure, depth=2, policy=DROP_OLDEST, sink=None, metrics=None):
+        self.source = source
+        self.measure = measure
+        self.sink = sink
+        self.metrics = metrics
+        self.frames = FrameQueue(depth, policy)
+        self.acquired = 0
+        self.measured = 0
+        self.displayed = 0
+        self.error = None
+        self._latest = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._started = None
+        self._stopped = None
+        if metrics is not None:
+            metrics.counter("frames_acquired", "Frames read from the source", lambda: self.acquired)
+            metrics.counter("frames_measured", "Frames measured", lambda: self.measured)
+            metrics.counter("frames_dropped", "Frames dropped because the measurement fell behind",
+                            lambda: self.frames.dropped)
+            metrics.gauge("queue_depth", "Frames waiting to be measured", self.frames.depth)
+            metrics.gauge("queue_max_depth", "Most frames that were waiting at once", lambda: self.frames.max_depth)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._threads = [threading.Thread(target=self._run, args=(self._acquire,), name="acquisition", daemon=True),
+                         threading.Thread(target=self._run, args=(self._measure,), name="measurement", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _run(self, stage):
+        try:
+            stage()
+        except Exception as e:
+            self.error = e
+            self._stop.set()
+            self.frames.close()
+
+    def _acquire(self):
+        read = self.source.read
+        if self.metrics is not None:
+            histogram = self.metrics.histogram("acquire")
+
+            def read():
+                start = time.perf_counter()
+                frame = self.source.read()
+                histogram.observe(time.perf_counter() - start)
+                return frame
+
+        while not self._stop.is_set():
+            frame = read()
+            if frame is None:
+                break
+            self.acquired += 1
+            self.frames.put(frame)
+        self.frames.close()
+
+    def _measure(self):
+        measure, sink = self.measure, self.sink
+        if self.metrics is not None:
+            measure = functools.partial(self.metrics.timed, "measure", self.measure)
+            if sink is not None:
+                sink = functools.partial(self.metrics.timed, "sink", self.sink)
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            try:
+                result = measure(frame.array)
+            finally:
+                frame.release()
+            self.measured += 1
+            self._latest = (frame.index, result)
+            if sink is not None:
+                sink(frame, result)
+        self._stopped = time.perf_counter()
+
+    def latest(self):
+        """The most recent (frame index, result), for the display to sample; None before the first result."""
+        if self._latest is not None:
+            self.displayed += 1
+        return self._latest
+
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def wait(self):
+        for thread in self._threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        self._stop.set()
+        self.frames.clear()
+        self.frames.close()
+        for thread in self._threads:
+            thread.join(2.0)
+
+    def stats(self):
+        end = self._stopped if self._stopped is not None else time.perf_counter()
+        elapsed = max(end - (self._started or end), 1e-9)
+        return {
+            'elapsed_s': elapsed,
+            'acquired': self.acquired,
+            'measured': self.measured,
+            'displayed': self.displayed,
+            'dropped': self.frames.dropped,
+            'acquired_fps': self.acquired / elapsed,
+            'measured_fps': self.measured / elapsed,
+            'queue_depth': self.frames.depth(),
+            'queue_max_depth': self.frames.max_depth,
+            'queue_size': self.frames.maxsize,
+            'policy': self.frames.policy,
+        }
+
+    def report(self):
+        s = self.stats()
+        return ("%(acquired)d frames acquired (%(acquired_fps).1f fps), %(measured)d measured (%(measured_fps).1f fps), "
+                "%(dropped)d dropped, %(displayed)d displayed; queue %(queue_depth)d/%(queue_size)d "
+                "(max %(queue_max_depth)d, %(policy)s) in %(elapsed_s).2f s" % s)
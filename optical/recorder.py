@@ -0,0 +1,146 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Session recorder: raw frames into a preallocated memory-mapped file
+#
+# A session is three files next to each other:
+#   session.npy         (capacity, height, width) uint8 frames, created at full size before recording starts
+#   session.index.npy   one row per frame: camera frame counter, timestamp, camera timestamp and the AOI / size
+#                       the frame was read with; rows not written yet have counter -1, and a jump of the counter by
+#                       more than one means the camera exposed frames that were not recorded
+#   session.json        image size, capacity, the sensor reduction the frames were taken with and the wall clock
+#                       time matching timestamp 0 (timestamps are time.perf_counter() seconds)
+# Both .npy files are plain NumPy files, so np.load(path, mmap_mode='r') reads them back without copying. Each frame
+# is copied once, straight from the locked ring buffer into the mapped file; a frame smaller than the image (an
+# AOI) goes into the top-left corner of its slot. Writing the index row last means a session cut short (crash,
+# power loss) still reads back up to the last complete frame.
+#
+#     recorder = SessionRecorder("session.npy", 1000, camera.width, camera.height)
+#     source = RecordingSource(RingSource(camera), recorder)
+#     ...
+#     session = Session("session.npy")
+#     session.frame(10)                   # zero-copy view of frame 10, cropped to the size it was read with
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import json
+import os
+import time
+
+import numpy as np
+
+INDEX_DTYPE = np.dtype([('counter', '<i8'), ('timestamp', '<f8'), ('device_time', '<f8'),
+                        ('x', '<i4'), ('y', '<i4'), ('width', '<i4'), ('height', '<i4')])
+
+
+def session_paths(path):
+    """(frames, index, metadata) file names of the session at path (with or without .npy)."""
+    base = path[:-4] if path.endswith(".npy") else path
+    return base + ".npy", base + ".index.npy", base + ".json"
+
+
+def is_session(path):
+    return os.path.isfile(session_paths(path)[1])
+
+
+def _preallocate(path):
+    # reserve the blocks now instead of while recording; not every platform / file system can
+    if not hasattr(os, "posix_fallocate"):
+        return
+    with open(path, "r+b") as f:
+        try:
+            os.posix_fallocate(f.fileno(), 0, os.fstat(f.fileno()).st_size)
+        except OSError:
+            pass
+
+
+class SessionRecorder(object):
+    """Appends frames (optical.sources.Frame) to a new session of at most capacity frames of width x height.
+
+    meta is added to the .json file, e.g. the acquisition scale, so a replay knows how the frames were reduced.
+    """
+
+    def __init__(self, path, capacity, width, height, channels=1, meta=None):
+        self.path, index_path, meta_path = session_paths(path)
+        shape = (capacity, height, width) if channels == 1 else (capacity, height, width, channels)
+        self._frames = np.lib.format.open_memmap(self.path, mode='w+', dtype=np.uint8, shape=shape)
+        _preallocate(self.path)
+        self._index = np.lib.format.open_memmap(index_path, mode='w+', dtype=INDEX_DTYPE, shape=(capacity,))
+        self._index['counter'] = -1
+        info = {'capacity': capacity, 'width': width, 'height': height, 'channels': channels,
+                'start_time': time.time(), 'start_perf': time.perf_counter()}
+        info.update(meta or {})
+        with open(meta_path, "w") as f:
+            json.dump(info, f, indent=1)
+        self.capacity = capacity
+        self.count = 0
+        self.skipped = 0                # frames that arrived after the file was full
+
+    def append(self, frame):
+        """Copy one frame into the next slot. Returns False (and counts it) once the session is full."""
+        if self.count >= self.capacity:
+            self.skipped += 1
+            return False
+        n = self.count
+        rows, cols = frame.array.shape[:2]
+        self._frames[n, :rows, :cols] = frame.array
+        x, y = frame.aoi[:2] if frame.aoi is not None else (0, 0)
+        row = self._index[n:n + 1]
+        row['timestamp'], row['x'], row['y'], row['width'], row['height'] = frame.timestamp, x, y, cols, rows
+        # the camera frame counter where there is one (NaN device time otherwise), else the order frames were read in
+        row['device_time'] = frame.device_time if frame.device_time is not None else np.nan
+        row['counter'] = frame.counter if frame.counter is not None else frame.index
+        self.count += 1
+        return True
+
+    def close(self):
+        if self._frames is None:
+            return
+        self._frames.flush()
+        self._index.flush()
+        self._frames = self._index = None
+
+    def report(self):
+        return "Recorded %d frames to %s (%d not recorded, the file was full)" % (self.count, self.path, self.skipped)
+
+
+class RecordingSource(object):
+    """Wraps a source: every frame read is also appended to recorder, on the thread that reads it."""
+
+    def __init__(self, source, recorder):
+        self.source = source
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.source, name)
+
+    def read(self):
+        frame = self.source.read()
+        if frame is not None:
+            self.recorder.append(frame)
+        return frame
+
+    def close(self):
+        self.recorder.close()
+        self.source.close()
+
+
+class Session(object):
+    """A recorded session, memory-mapped read-only. frames holds every slot; only the first len(session) are written."""
+
+    def __init__(self, path):
+        frames_path, index_path, meta_path = session_paths(path)
+        self.frames = np.load(frames_path, mmap_mode='r')
+        index = np.load(index_path, mmap_mode='r')
+        unwritten = np.flatnonzero(index['counter'] < 0)
+        self.index = index[:unwritten[0] if len(unwritten) else len(index)]
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self, i):
+        row = self.index[i]
+        return self.frames[i, :row['height'], :row['width']]
+
+    def array(self):
+        """All recorded frames as one (n, height, width) array, without copying; AOI frames are padded with zeros."""
+        return self.frames[:len(self.index)]
@@ -0,0 +1,149 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Ring of uEye image memories used in queue mode
+#
+# The original scripts allocate a single image memory and read it with get_data(copy=False) while the camera
+# keeps writing into it in free-run mode, so the processing code sees half-written (torn) frames. Here N image
+# memories are added to the driver sequence and the image queue is enabled: is_WaitForNextImage hands out the
+# oldest filled buffer *locked*, the driver keeps filling the other ones, and the buffer only goes back to the
+# camera once it is unlocked with is_UnlockSeqBuf. Every frame also carries the camera frame counter and device
+# timestamp of is_GetImageInfo, so frames the sensor exposed but nobody received can be counted (optical/gaps.py).
+#
+#     ring = ImageRing(hCam, width, height, nBitsPerPixel, count=4)
+#     ring.open()
+#     ueye.is_CaptureVideo(hCam, ueye.IS_DONT_WAIT)
+#     with ring.wait(1000) as frame:
+#         small = cv2.resize(frame.array, (0, 0), fx=0.3, fy=0.3)
+#         frame.counter, frame.device_time                    # u64FrameNumber, u64TimestampDevice in seconds
+#     ring.close()
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+from optical.api import check, ueye_api
+from optical.frameview import memory_view
+
+DEVICE_TICK = 1e-7              # UEYEIMAGEINFO.u64TimestampDevice counts in 0.1 us
+
+
+def _value(v):
+    # accepts plain ints as well as the ctypes wrappers (ueye.INT, ueye.int) used by the scripts
+    return int(getattr(v, "value", v))
+
+
+class RingFrame(object):
+    """A locked image memory handed out by ImageRing.wait().
+
+    array is a view into driver memory; it is only valid until release() (or the end of the with block).
+    Copy whatever has to outlive the lock. counter and device_time (seconds on the camera clock) are None when
+    the driver could not report them.
+    """
+
+    __slots__ = ("ring", "mem", "mem_id", "array", "counter", "device_time", "_locked")
+
+    def __init__(self, ring, mem, mem_id, array, counter=None, device_time=None):
+        self.ring = ring
+        self.mem = mem
+        self.mem_id = mem_id
+        self.array = array
+        self.counter = counter
+        self.device_time = device_time
+        self._locked = True
+
+    def release(self):
+        if self._locked:
+            self._locked = False
+            self.ring.unlock(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class ImageRing(object):
+
+    def __init__(self, hCam, width, height, bits_per_pixel, count=4, api=None):
+        if count < 2:
+            raise ValueError("an image ring needs at least two buffers")
+        self.api = api if api is not None else ueye_api()
+        self.hCam = hCam
+        self.width = _value(width)
+        self.height = _value(height)
+        self.bits_per_pixel = _value(bits_per_pixel)
+        self.bytes_per_pixel = self.bits_per_pixel // 8
+        self.count = count
+        self.pitch = 0
+        self._buffers = []          # (mem, mem_id) in sequence order
+        self._views = {}            # mem_id -> numpy view
+        self._info = None           # UEYEIMAGEINFO filled in by wait(), allocated once
+
+    def open(self):
+        api = self.api
+        for _ in range(self.count):
+            mem = api.c_mem_p()
+            mem_id = api.int()
+            check(api, api.is_AllocImageMem(self.hCam, self.width, self.height, self.bits_per_pixel, mem, mem_id),
+                  "is_AllocImageMem")
+            check(api, api.is_AddToSequence(self.hCam, mem, mem_id), "is_AddToSequence")
+            self._buffers.append((mem, mem_id))
+
+        # All buffers share one layout, so asking the driver once is enough; the views skip the line padding of the
+        # pitch it reports (optical/frameview.py)
+        mem, mem_id = self._buffers[0]
+        width, height, bits, pitch = api.INT(), api.INT(), api.INT(), api.INT()
+        check(api, api.is_InquireImageMem(self.hCam, mem, mem_id, width, height, bits, pitch), "is_InquireImageMem")
+        self.pitch = _value(pitch)
+
+        for mem, mem_id in self._buffers:
+            self._views[_value(mem_id)] = memory_view(mem, self.width, self.height, self.bits_per_pixel, self.pitch)
+
+        check(api, api.is_InitImageQueue(self.hCam, 0), "is_InitImageQueue")
+        if hasattr(api, "is_GetImageInfo"):
+            self._info = api.UEYEIMAGEINFO()
+        return self
+
+    def wait(self, timeout_ms=1000):
+        """Block until the next frame is complete and return it locked, or None on timeout."""
+        api = self.api
+        mem = api.c_mem_p()
+        mem_id = api.int()
+        nRet = api.is_WaitForNextImage(self.hCam, timeout_ms, mem, mem_id)
+        if nRet == api.IS_TIMED_OUT:
+            return None
+        check(api, nRet, "is_WaitForNextImage")
+        mem_id = _value(mem_id)
+        counter = device_time = None
+        info = self._info
+        if info is not None and api.is_GetImageInfo(self.hCam, mem_id, info, api.sizeof(info)) == api.IS_SUCCESS:
+            counter = _value(info.u64FrameNumber)
+            device_time = _value(info.u64TimestampDevice) * DEVICE_TICK
+        return RingFrame(self, mem, mem_id, self._views[mem_id], counter, device_time)
+
+    def unlock(self, frame):
+        api = self.api
+        check(api, api.is_UnlockSeqBuf(self.hCam, api.IS_IGNORE_PARAMETER, frame.mem), "is_UnlockSeqBuf")
+
+    def drain(self):
+        """Unlock every frame that is already complete, e.g. after stopping capture to change the AOI."""
+        frame = self.wait(0)
+        while frame is not None:
+            frame.release()
+            frame = self.wait(0)
+
+    def close(self):
+        api = self.api
+        if not self._buffers:
+            return
+        api.is_ExitImageQueue(self.hCam)
+        api.is_ClearSequence(self.hCam)
+        for mem, mem_id in self._buffers:
+            api.is_FreeImageMem(self.hCam, mem, mem_id)
+        self._buffers = []
+        self._views = {}
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
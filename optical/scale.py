@@ -0,0 +1,149 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Acquisition scale: sensor binning / subsampling with a software fallback
+#
+# The scripts read the full sensor and shrink every frame with cv2.resize(frame, (0, 0), fx=0.3, fy=0.3).
+# AcquisitionScale reduces the image by an integer factor instead, as much of it as possible in the sensor
+# (binning averages neighbouring pixels, subsampling skips them; both cut the data sent over USB) and the
+# rest with an integer-factor INTER_AREA resize, which is a plain block average.
+#
+# The measurement was calibrated on the 0.3-scaled image: pix = 2.75 um per pixel there, and the end face
+# corners are 200-223 px apart. pixel_size() and window() convert those to the scale actually used, so the
+# um readout does not depend on the scale.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import cv2
+
+from optical.api import check
+
+REFERENCE_SCALE = 0.3           # scale 4_points.py was calibrated at
+MODES = ("auto", "binning", "subsampling", "software")
+
+# uEye flag names for each factor, (vertical, horizontal)
+_BINNING = {2: ("IS_BINNING_2X_VERTICAL", "IS_BINNING_2X_HORIZONTAL"),
+            3: ("IS_BINNING_3X_VERTICAL", "IS_BINNING_3X_HORIZONTAL"),
+            4: ("IS_BINNING_4X_VERTICAL", "IS_BINNING_4X_HORIZONTAL"),
+            5: ("IS_BINNING_5X_VERTICAL", "IS_BINNING_5X_HORIZONTAL"),
+            6: ("IS_BINNING_6X_VERTICAL", "IS_BINNING_6X_HORIZONTAL")}
+_SUBSAMPLING = {2: ("IS_SUBSAMPLING_2X_VERTICAL", "IS_SUBSAMPLING_2X_HORIZONTAL"),
+                3: ("IS_SUBSAMPLING_3X_VERTICAL", "IS_SUBSAMPLING_3X_HORIZONTAL"),
+                4: ("IS_SUBSAMPLING_4X_VERTICAL", "IS_SUBSAMPLING_4X_HORIZONTAL"),
+                5: ("IS_SUBSAMPLING_5X_VERTICAL", "IS_SUBSAMPLING_5X_HORIZONTAL"),
+                6: ("IS_SUBSAMPLING_6X_VERTICAL", "IS_SUBSAMPLING_6X_HORIZONTAL")}
+
+
+def _flags(api, names):
+    return getattr(api, names[0]) | getattr(api, names[1])
+
+
+def _shrink(array, f, rotated=False, dst=None):
+    # INTER_AREA is an exact block average only when the size is a multiple of the factor
+    rows, cols = array.shape[0] // f, array.shape[1] // f
+    if rotated:
+        # the remainder is cut from the top left, where the bottom right of the unrotated frame is
+        array = array[array.shape[0] - rows * f:, array.shape[1] - cols * f:]
+    else:
+        array = array[:rows * f, :cols * f]
+    return cv2.resize(array, (cols, rows), dst=dst, interpolation=cv2.INTER_AREA)
+
+
+def _dst(pool, name, array, f):
+    # the output of _shrink(array, f) in a buffer of pool, or None to let OpenCV allocate it
+    if pool is None:
+        return None
+    return pool.take(name, (array.shape[0] // f, array.shape[1] // f) + array.shape[2:])
+
+
+class AcquisitionScale(object):
+    """Shrink frames by an integer factor (3 gives 1/3, the closest to the old 0.3).
+
+    mode "auto" uses whichever of binning and subsampling takes the largest part of factor in the sensor;
+    "binning" / "subsampling" use only that one; software resizes whatever the sensor could not do. "software"
+    never touches the sensor. A factor of 1 keeps the full resolution.
+    """
+
+    def __init__(self, factor=3, mode="auto"):
+        if mode not in MODES:
+            raise ValueError("unknown scale mode %r, expected one of %s" % (mode, ", ".join(MODES)))
+        if int(factor) != factor or factor < 1:
+            raise ValueError("the acquisition scale factor must be a positive integer, got %r" % (factor,))
+        self.factor = int(factor)
+        self.mode = mode
+        self.hardware = "none"          # what configure() ended up using in the sensor
+        self.hardware_factor = 1
+        self.software_factor = self.factor
+        self.rotated = False            # frames arrive rotated by 180 degrees in the sensor (optical/orientation.py)
+
+    @property
+    def scale(self):
+        return 1.0 / self.factor
+
+    def _supported(self, api, hCam, kind):
+        if kind == "binning":
+            mask = api.is_SetBinning(hCam, api.IS_GET_SUPPORTED_BINNING)
+            table = _BINNING
+        else:
+            mask = api.is_SetSubSampling(hCam, api.IS_GET_SUPPORTED_SUBSAMPLING)
+            table = _SUBSAMPLING
+        supported = []
+        for f, names in table.items():
+            if all(hasattr(api, n) for n in names) and mask & _flags(api, names) == _flags(api, names):
+                supported.append(f)
+        return supported
+
+    def configure(self, api, hCam):
+        """Program the sensor. Call before querying the AOI and allocating image memory: both shrink with it."""
+        kinds = {"auto": ("binning", "subsampling"), "binning": ("binning",),
+                 "subsampling": ("subsampling",), "software": ()}[self.mode]
+        best = None
+        for kind in kinds:
+            factors = [f for f in self._supported(api, hCam, kind) if self.factor % f == 0]
+            # the largest factor the sensor can do wins; binning (which averages) on a tie
+            if factors and (best is None or max(factors) > best[1]):
+                best = (kind, max(factors))
+        if best is None:
+            return self.assume("none", 1)
+        kind, f = best
+        if kind == "binning":
+            check(api, api.is_SetBinning(hCam, _flags(api, _BINNING[f])), "is_SetBinning")
+        else:
+            check(api, api.is_SetSubSampling(hCam, _flags(api, _SUBSAMPLING[f])), "is_SetSubSampling")
+        return self.assume(kind, f)
+
+    def assume(self, kind, factor):
+        """The frames arrive already reduced by factor (kind "binning" / "subsampling"), e.g. a recorded session."""
+        if self.factor % factor != 0:
+            raise ValueError("1/%d cannot be reached from frames reduced by %d" % (self.factor, factor))
+        self.hardware, self.hardware_factor = kind, factor
+        self.software_factor = self.factor // factor
+        return self
+
+    def apply(self, array, pool=None):
+        """Software part of the reduction: integer-factor INTER_AREA resize, or the frame itself.
+
+        With pool, an optical.buffers.BufferPool, the result and the intermediate halvings are written into its
+        buffers instead of new arrays.
+        """
+        f = self.software_factor
+        # OpenCV only vectorises the 2x block average, so even factors are done as repeated halving first
+        step = 0
+        while f % 2 == 0:
+            step += 1
+            f //= 2
+            name = "scale" if f == 1 else "scale/2^%d" % step
+            array = _shrink(array, 2, self.rotated, _dst(pool, name, array, 2))
+        if f == 1:
+            return array
+        return _shrink(array, f, self.rotated, _dst(pool, "scale", array, f))
+
+    def pixel_size(self, pix=2.75):
+        """um per pixel of the scaled image, given pix um per pixel at REFERENCE_SCALE."""
+        return pix * REFERENCE_SCALE / self.scale
+
+    def window(self, low, high):
+        """A pixel distance window calibrated at REFERENCE_SCALE, converted to this scale."""
+        ratio = self.scale / REFERENCE_SCALE
+        return (low * ratio, high * ratio)
+
+    def __repr__(self):
+        return "AcquisitionScale(1/%d: %s x%d, software x%d)" % (self.factor, self.hardware, self.hardware_factor,
+                                                                   self.software_factor)
@@ -0,0 +1,581 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Stand-in for the pyueye.ueye module
+#
+# SimulatedUEye exposes the subset of the uEye API used by the scripts and by optical.ring (same function
+# names, same argument order, same by-reference ctypes outputs) so the acquisition code can be exercised
+# without a UI-3480ML-M-GL. Image memories are real ctypes buffers, so numpy views built over them behave
+# exactly like views over driver memory.
+#
+# Frames are "exposed" lazily: every is_WaitForNextImage renders the next frame into the oldest unlocked
+# buffer of the sequence and returns it locked. A buffer that is locked by the caller is never written, and
+# when every buffer is locked the frame is dropped and the call times out, like the driver does.
+#
+# Each delivered frame gets a frame number and a device timestamp, read back with is_GetImageInfo. By default frames
+# are exposed on demand and numbered consecutively; with frame_rate the sensor runs freely at that rate, frames that
+# arrive while no buffer is free are lost, and the numbers of the frames that are delivered jump accordingly.
+# gap_rate additionally loses that fraction of the sensor frames at random (a flaky cable), to test gap detection.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import collections
+import configparser
+import ctypes
+import functools
+import itertools
+import time
+
+import cv2
+import numpy as np
+
+from optical.frameview import frame_view, window
+from optical.synthetic import SCENE, render
+
+
+class IS_RECT(ctypes.Structure):
+    _fields_ = [("s32X", ctypes.c_int),
+                ("s32Y", ctypes.c_int),
+                ("s32Width", ctypes.c_int),
+                ("s32Height", ctypes.c_int)]
+
+
+class IS_POINT_2D(ctypes.Structure):
+    _fields_ = [("s32X", ctypes.c_int),
+                ("s32Y", ctypes.c_int)]
+
+
+class IS_SIZE_2D(ctypes.Structure):
+    _fields_ = [("s32Width", ctypes.c_int),
+                ("s32Height", ctypes.c_int)]
+
+
+class SENSORINFO(ctypes.Structure):
+    _fields_ = [("SensorID", ctypes.c_ushort),
+                ("strSensorName", ctypes.c_char * 32),
+                ("nColorMode", ctypes.c_char),
+                ("nMaxWidth", ctypes.c_uint),
+                ("nMaxHeight", ctypes.c_uint)]
+
+
+class CAMINFO(ctypes.Structure):
+    _fields_ = [("SerNo", ctypes.c_char * 12),
+                ("ID", ctypes.c_char * 20),
+                ("Version", ctypes.c_char * 10),
+                ("Date", ctypes.c_char * 12)]
+
+
+class UEYETIME(ctypes.Structure):
+    _fields_ = [("wYear", ctypes.c_ushort),
+                ("wMonth", ctypes.c_ushort),
+                ("wDay", ctypes.c_ushort),
+                ("wHour", ctypes.c_ushort),
+                ("wMinute", ctypes.c_ushort),
+                ("wSecond", ctypes.c_ushort),
+                ("wMilliseconds", ctypes.c_ushort),
+                ("byReserved", ctypes.c_ubyte * 10)]
+
+
+class UEYEIMAGEINFO(ctypes.Structure):
+    _fields_ = [("dwFlags", ctypes.c_uint32),
+                ("byReserved1", ctypes.c_ubyte * 4),
+                ("u64TimestampDevice", ctypes.c_uint64),
+                ("TimestampSystem", UEYETIME),
+                ("dwIoStatus", ctypes.c_uint32),
+                ("wAOIIndex", ctypes.c_ushort),
+                ("wAOICycle", ctypes.c_ushort),
+                ("u64FrameNumber", ctypes.c_uint64),
+                ("dwImageBuffers", ctypes.c_uint32),
+                ("dwImageBuffersInUse", ctypes.c_uint32),
+                ("dwReserved3", ctypes.c_uint32),
+                ("dwImageHeight", ctypes.c_uint32),
+                ("dwImageWidth", ctypes.c_uint32),
+                ("dwHostProcessTime", ctypes.c_uint32)]
+
+
+class UEYE_CAMERA_INFO(ctypes.Structure):
+    _fields_ = [("dwCameraID", ctypes.c_uint32),
+                ("dwDeviceID", ctypes.c_uint32),
+                ("dwSensorID", ctypes.c_uint32),
+                ("dwInUse", ctypes.c_uint32),
+                ("SerNo", ctypes.c_char * 16),
+                ("Model", ctypes.c_char * 16),
+                ("dwStatus", ctypes.c_uint32),
+                ("dwReserved", ctypes.c_uint32 * 2),
+                ("FullModelName", ctypes.c_char * 32),
+                ("dwReserved2", ctypes.c_uint32 * 5)]
+
+
+class UEYE_CAMERA_LIST(ctypes.Structure):
+    # as in uEye.h: room for one entry, callers allocate a larger structure for more cameras
+    _fields_ = [("dwCount", ctypes.c_uint32),
+                ("uci", UEYE_CAMERA_INFO * 1)]
+
+
+def _value(v):
+    return int(getattr(v, "value", v))
+
+
+@functools.lru_cache(maxsize=4)
+def _scene(width, height):
+    return render(width, height, **SCENE)[0]
+
+
+def fiber_scene(index, width, height, bytes_per_pixel):
+    """Default frame generator: two bright fiber ends on a dark background, facing each other across a gap.
+
+    The scene of optical/synthetic.py (render() with SCENE), rendered once per size. The end faces are slightly
+    slanted, as they are under the microscope, so their top and bottom corners are a few pixels apart in x.
+    """
+    frame = _scene(width, height)
+    if bytes_per_pixel == 1:
+        return frame.copy()
+    return np.repeat(frame[:, :, None], bytes_per_pixel, axis=2)
+
+
+class _Memory(object):
+
+    __slots__ = ("buffer", "address", "width", "height", "bits", "pitch")
+
+    def __init__(self, width, height, bits, line_align):
+        line = width * (bits // 8)
+        self.pitch = (line + line_align - 1) // line_align * line_align
+        self.buffer = ctypes.create_string_buffer(self.pitch * height)
+        self.address = ctypes.addressof(self.buffer)
+        self.width = width
+        self.height = height
+        self.bits = bits
+
+    def array(self):
+        return frame_view(self.buffer, self.width, self.height, self.bits, self.pitch)
+
+
+class SimulatedUEye(object):
+
+    # Constants, with the values of the real API
+    IS_SUCCESS = 0
+    IS_NO_SUCCESS = -1
+    IS_CANT_OPEN_DEVICE = 3
+    IS_INVALID_PARAMETER = 125
+    IS_TIMED_OUT = 122
+    IS_IGNORE_PARAMETER = -1
+    IS_DONT_WAIT = 0
+    IS_WAIT = 1
+    IS_SET_DM_DIB = 1
+    IS_COLORMODE_MONOCHROME = 1
+    IS_COLORMODE_BAYER = 2
+    IS_COLORMODE_CBYCRY = 4
+    IS_CM_BGRA8_PACKED = 0
+    IS_CM_BGR8_PACKED = 1
+    IS_CM_MONO8 = 6
+    IS_AOI_IMAGE_SET_AOI = 0x0001
+    IS_AOI_IMAGE_GET_AOI = 0x0002
+    IS_AOI_IMAGE_GET_POS_INC = 0x0011
+    IS_AOI_IMAGE_GET_SIZE_INC = 0x0012
+    IS_GET_SUPPORTED_BINNING = 0x0002 | 0x8000
+    IS_BINNING_DISABLE = 0x0000
+    IS_BINNING_2X_VERTICAL = 0x0001
+    IS_BINNING_2X_HORIZONTAL = 0x0020
+    IS_BINNING_3X_VERTICAL = 0x0002
+    IS_BINNING_3X_HORIZONTAL = 0x0040
+    IS_BINNING_4X_VERTICAL = 0x0004
+    IS_BINNING_4X_HORIZONTAL = 0x0080
+    IS_GET_SUPPORTED_SUBSAMPLING = 0x0110 | 0x8000
+    IS_SUBSAMPLING_DISABLE = 0x0000
+    IS_SUBSAMPLING_2X_VERTICAL = 0x0001
+    IS_SUBSAMPLING_2X_HORIZONTAL = 0x0002
+    IS_SUBSAMPLING_4X_VERTICAL = 0x0004
+    IS_SUBSAMPLING_4X_HORIZONTAL = 0x0008
+    IS_SUBSAMPLING_3X_VERTICAL = 0x0010
+    IS_SUBSAMPLING_3X_HORIZONTAL = 0x0020
+    IS_PARAMETERSET_CMD_LOAD_EEPROM = 1
+    IS_PARAMETERSET_CMD_LOAD_FILE = 2
+    IS_PARAMETERSET_CMD_SAVE_EEPROM = 3
+    IS_PARAMETERSET_CMD_SAVE_FILE = 4
+    IS_GET_ROP_EFFECT = 0x8000
+    IS_SET_ROP_MIRROR_UPDOWN = 0x0008
+    IS_SET_ROP_MIRROR_LEFTRIGHT = 0x0010
+    IS_USE_DEVICE_ID = 0x8000
+
+    # ctypes types the scripts instantiate through the ueye module
+    HIDS = ctypes.c_uint
+    INT = ctypes.c_int
+    int = ctypes.c_int
+    c_mem_p = ctypes.c_void_p
+    wchar_p = ctypes.c_wchar_p
+    IS_RECT = IS_RECT
+    IS_POINT_2D = IS_POINT_2D
+    IS_SIZE_2D = IS_SIZE_2D
+    SENSORINFO = SENSORINFO
+    CAMINFO = CAMINFO
+    UEYETIME = UEYETIME
+    UEYEIMAGEINFO = UEYEIMAGEINFO
+    UEYE_CAMERA_INFO = UEYE_CAMERA_INFO
+    UEYE_CAMERA_LIST = UEYE_CAMERA_LIST
+    sizeof = staticmethod(ctypes.sizeof)
+
+    # AOI steps of the UI-3480: position and width in steps of 8/16 pixels, height in steps of 2 lines
+    AOI_POS_INC = (8, 2)
+    AOI_SIZE_INC = (16, 2)
+
+    def __init__(self, width=2560, height=1920, bits_per_pixel=8, frames=fiber_scene, line_align=4, line_time_us=0,
+                 binning=(2,), subsampling=(2, 3, 4), frame_rate=None, gap_rate=0.0, seed=None, cameras=1):
+        self.cameras = cameras              # simulated cameras connected, with camera and device IDs 1 .. cameras
+        self.camera_id = 0                  # the one opened by is_InitCamera
+        self.sensor_width = width
+        self.sensor_height = height
+        self.binning_factors = binning          # factors the simulated sensor supports
+        self.subsampling_factors = subsampling
+        self.reduction = (None, 1)              # ("binning" | "subsampling" | None, factor) currently programmed
+        self.rop = 0                            # IS_SET_ROP_MIRROR_* flags currently programmed
+        self.sensor_bits = bits_per_pixel
+        self.frames = frames
+        self.line_align = line_align
+        self.line_time_us = line_time_us    # readout time per sensor line; 0 delivers frames as fast as possible
+        self.frame_rate = frame_rate        # free-run sensor frame rate; None exposes a frame whenever one is asked for
+        self.gap_rate = gap_rate            # fraction of sensor frames lost on the way to the host
+        self.aoi = (0, 0, width, height)
+        self.frame_count = 0            # frames exposed into a buffer
+        self.frames_dropped = 0         # frames lost because every buffer was locked
+        self.frames_lost = 0            # frames lost to gap_rate
+        self.sensor_frames = 0          # frame number of the last frame the sensor read out
+        self.bytes_transferred = 0      # image data "sent over USB", i.e. AOI pixels times bytes per pixel
+        self._ids = itertools.count(1)
+        self._memories = {}             # mem_id -> _Memory
+        self._active = None
+        self._sequence = []             # mem_ids in sequence order
+        self._locked = set()
+        self._next = 0                  # position in _sequence the next frame goes to
+        self._info = {}                 # mem_id -> (frame number, device ticks) of the frame in that buffer
+        self._pending = collections.deque()     # free run: (frame number, device ticks) received, not yet handed out
+        self._clock = None              # perf_counter() at device time 0
+        self._rng = np.random.default_rng(seed)
+        self._queue = False
+        self._capturing = False
+        self._open = False
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Camera handle
+
+    def is_GetNumberOfCameras(self, nNum):
+        nNum.value = self.cameras
+        return self.IS_SUCCESS
+
+    def is_GetCameraList(self, pucl):
+        # fills as many entries as pucl.dwCount says there is room for and sets dwCount to the number of cameras
+        room = min(pucl.dwCount, self.cameras)
+        entries = (UEYE_CAMERA_INFO * room).from_address(ctypes.addressof(pucl) + type(pucl).uci.offset)
+        for n, info in enumerate(entries, 1):
+            info.dwCameraID = info.dwDeviceID = n
+            info.dwInUse = int(self._open and self.camera_id == n)
+            info.SerNo = b"SIM%05d" % n
+            info.Model = b"UI-3480ML-M"
+            info.FullModelName = b"UI-3480ML-M-GL (simulated)"
+        pucl.dwCount = self.cameras
+        return self.IS_SUCCESS
+
+    def is_InitCamera(self, hCam, hWnd):
+        # 0 opens the first camera, 1-254 the one with that camera ID, or with that device ID with IS_USE_DEVICE_ID
+        n = _value(hCam) & ~self.IS_USE_DEVICE_ID or 1
+        if n > self.cameras:
+            return self.IS_CANT_OPEN_DEVICE
+        self.camera_id = n
+        self._open = True
+        return self.IS_SUCCESS
+
+    def is_ExitCamera(self, hCam):
+        self._open = False
+        self._capturing = False
+        return self.IS_SUCCESS
+
+    def is_GetCameraInfo(self, hCam, cInfo):
+        cInfo.SerNo = b"SIM%05d" % self.camera_id
+        cInfo.ID = b"IDS GmbH"
+        return self.IS_SUCCESS
+
+    def is_GetSensorInfo(self, hCam, sInfo):
+        sInfo.strSensorName = b"UI-3480ML-M (simulated)"
+        sInfo.nColorMode = bytes([self.IS_COLORMODE_MONOCHROME if self.sensor_bits == 8 else self.IS_COLORMODE_CBYCRY])
+        sInfo.nMaxWidth = self.sensor_width
+        sInfo.nMaxHeight = self.sensor_height
+        return self.IS_SUCCESS
+
+    def is_GetColorDepth(self, hCam, bits, mode):
+        bits.value = self.sensor_bits
+        mode.value = self.IS_CM_MONO8 if self.sensor_bits == 8 else self.IS_CM_BGRA8_PACKED
+        return self.IS_SUCCESS
+
+    def is_SetDisplayMode(self, hCam, mode):
+        return self.IS_SUCCESS
+
+    def is_SetColorMode(self, hCam, mode):
+        return self.IS_SUCCESS
+
+    def is_ResetToDefault(self, hCam):
+        return self.IS_SUCCESS
+
+    def is_ParameterSet(self, hCam, nCommand, pParam, cbSizeOfParam):
+        # the driver writes an .ini of every sensor setting; here only what the simulation has: reduction and AOI
+        path = pParam.value
+        ini = configparser.ConfigParser()
+        if nCommand == self.IS_PARAMETERSET_CMD_SAVE_FILE:
+            kind, factor = self.reduction
+            ini['Sensor'] = {'reduction': kind or "none", 'factor': str(factor), 'rop': str(self.rop)}
+            ini['Image size'] = dict(zip(("x", "y", "width", "height"), (str(v) for v in self.aoi)))
+            with open(path, "w") as f:
+                ini.write(f)
+            return self.IS_SUCCESS
+        if nCommand == self.IS_PARAMETERSET_CMD_LOAD_FILE:
+            if not ini.read(path):
+                return self.IS_NO_SUCCESS
+            kind = ini['Sensor']['reduction']
+            self.reduction = (None if kind == "none" else kind, int(ini['Sensor']['factor']))
+            self.rop = int(ini['Sensor'].get('rop', "0"))
+            self.aoi = tuple(int(ini['Image size'][k]) for k in ("x", "y", "width", "height"))
+            return self.IS_SUCCESS
+        return self.IS_INVALID_PARAMETER
+
+    def is_AOI(self, hCam, command, param, size):
+        if command == self.IS_AOI_IMAGE_GET_AOI:
+            param.s32X, param.s32Y, param.s32Width, param.s32Height = self.aoi
+        elif command == self.IS_AOI_IMAGE_SET_AOI:
+            aoi = (param.s32X, param.s32Y, param.s32Width, param.s32Height)
+            if not self._valid_aoi(aoi):
+                return self.IS_INVALID_PARAMETER
+            self.aoi = aoi
+        elif command == self.IS_AOI_IMAGE_GET_POS_INC:
+            param.s32X, param.s32Y = self.AOI_POS_INC
+        elif command == self.IS_AOI_IMAGE_GET_SIZE_INC:
+            param.s32Width, param.s32Height = self.AOI_SIZE_INC
+        else:
+            return self.IS_INVALID_PARAMETER
+        return self.IS_SUCCESS
+
+    def _valid_aoi(self, aoi):
+        x, y, width, height = aoi
+        return (x % self.AOI_POS_INC[0] == 0 and y % self.AOI_POS_INC[1] == 0
+                and width % self.AOI_SIZE_INC[0] == 0 and height % self.AOI_SIZE_INC[1] == 0
+                and width > 0 and height > 0 and x >= 0 and y >= 0
+                and x + width <= self.image_width() and y + height <= self.image_height())
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Binning / subsampling: the image (and every AOI coordinate) shrinks by the factor
+
+    def image_width(self):
+        return self.sensor_width // self.reduction[1]
+
+    def image_height(self):
+        return self.sensor_height // self.reduction[1]
+
+    def _set_reduction(self, kind, mode, factors, prefix):
+        if mode == self.IS_GET_SUPPORTED_BINNING and kind == "binning" or \
+                mode == self.IS_GET_SUPPORTED_SUBSAMPLING and kind == "subsampling":
+            mask = 0
+            for f in factors:
+                mask |= getattr(self, "%s_%dX_VERTICAL" % (prefix, f)) | getattr(self, "%s_%dX_HORIZONTAL" % (prefix, f))
+            return mask
+        if mode == 0:
+            self.reduction = (None, 1)
+        else:
+            for f in factors:
+                if mode == getattr(self, "%s_%dX_VERTICAL" % (prefix, f)) | getattr(self, "%s_%dX_HORIZONTAL" % (prefix, f)):
+                    self.reduction = (kind, f)
+                    break
+            else:
+                return self.IS_INVALID_PARAMETER
+        self.aoi = (0, 0, self.image_width(), self.image_height())
+        return self.IS_SUCCESS
+
+    def is_SetBinning(self, hCam, mode):
+        return self._set_reduction("binning", mode, self.binning_factors, "IS_BINNING")
+
+    def is_SetSubSampling(self, hCam, mode):
+        return self._set_reduction("subsampling", mode, self.subsampling_factors, "IS_SUBSAMPLING")
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Readout mirroring: applied after binning / subsampling, the AOI is a window of the mirrored image
+
+    def is_SetRopEffect(self, hCam, effect, param, reserved):
+        if effect == self.IS_GET_ROP_EFFECT:
+            return self.rop
+        mirror = self.IS_SET_ROP_MIRROR_UPDOWN | self.IS_SET_ROP_MIRROR_LEFTRIGHT
+        if effect & ~mirror:
+            return self.IS_INVALID_PARAMETER
+        self.rop = self.rop | effect if param else self.rop & ~effect
+        return self.IS_SUCCESS
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Image memories
+
+    def is_AllocImageMem(self, hCam, width, height, bits, mem, mem_id):
+        memory = _Memory(_value(width), _value(height), _value(bits), self.line_align)
+        new_id = next(self._ids)
+        self._memories[new_id] = memory
+        mem.value = memory.address
+        mem_id.value = new_id
+        return self.IS_SUCCESS
+
+    def is_SetImageMem(self, hCam, mem, mem_id):
+        self._active = _value(mem_id)
+        return self.IS_SUCCESS
+
+    def is_InquireImageMem(self, hCam, mem, mem_id, width, height, bits, pitch):
+        memory = self._memories.get(_value(mem_id))
+        if memory is None:
+            return self.IS_INVALID_PARAMETER
+        width.value, height.value, bits.value, pitch.value = memory.width, memory.height, memory.bits, memory.pitch
+        return self.IS_SUCCESS
+
+    def is_FreeImageMem(self, hCam, mem, mem_id):
+        memory = self._memories.pop(_value(mem_id), None)
+        return self.IS_SUCCESS if memory is not None else self.IS_INVALID_PARAMETER
+
+    def is_AddToSequence(self, hCam, mem, mem_id):
+        if _value(mem_id) not in self._memories:
+            return self.IS_INVALID_PARAMETER
+        self._sequence.append(_value(mem_id))
+        return self.IS_SUCCESS
+
+    def is_ClearSequence(self, hCam):
+        self._sequence = []
+        self._locked.clear()
+        self._info.clear()
+        self._pending.clear()
+        self._next = 0
+        return self.IS_SUCCESS
+
+    def is_InitImageQueue(self, hCam, mode):
+        if not self._sequence:
+            return self.IS_NO_SUCCESS
+        self._queue = True
+        return self.IS_SUCCESS
+
+    def is_ExitImageQueue(self, hCam):
+        self._queue = False
+        return self.IS_SUCCESS
+
+    #-----------------------------------------------------------------------------------------------------------------------------------
+    # Acquisition
+
+    def is_CaptureVideo(self, hCam, wait):
+        if self._clock is None:
+            self._clock = time.perf_counter()
+        elif self.frame_rate:
+            # the numbering goes on where it stopped; the time capture was off is not a gap
+            self._clock = time.perf_counter() - self.sensor_frames / float(self.frame_rate)
+        self._capturing = True
+        return self.IS_SUCCESS
+
+    def is_StopLiveVideo(self, hCam, wait):
+        self._capturing = False
+        self._pending.clear()
+        return self.IS_SUCCESS
+
+    def _ticks(self, seconds):
+        # device clock in the 0.1 us units of u64TimestampDevice
+        return int(round(seconds * 1e7))
+
+    def _lost(self):
+        return self.gap_rate > 0 and self._rng.random() < self.gap_rate
+
+    def _receive(self):
+        # free run: every sensor frame read out since the last call goes into a free buffer, or is lost
+        due = int((time.perf_counter() - self._clock) * self.frame_rate)
+        while self.sensor_frames < due:
+            self.sensor_frames += 1
+            if self._lost():
+                self.frames_lost += 1
+            elif len(self._pending) + len(self._locked) < len(self._sequence):
+                self._pending.append((self.sensor_frames, self._ticks(self.sensor_frames / float(self.frame_rate))))
+            else:
+                self.frames_dropped += 1
+
+    def _next_frame(self, timeout):
+        """(frame number, device ticks) of the frame to hand out next, or None if none arrives within timeout ms."""
+        if self.frame_rate:
+            deadline = time.perf_counter() + timeout * 1e-3
+            self._receive()
+            while not self._pending:
+                wake = self._clock + (self.sensor_frames + 1) / float(self.frame_rate)
+                if wake > deadline:
+                    time.sleep(max(0.0, deadline - time.perf_counter()))
+                    return None
+                time.sleep(max(0.0, wake - time.perf_counter()))
+                self._receive()
+            return self._pending.popleft()
+        while self._lost():
+            self.sensor_frames += 1
+            self.frames_lost += 1
+        self.sensor_frames += 1
+        if len(self._locked) >= len(self._sequence):
+            self.frames_dropped += 1
+            return None
+        return self.sensor_frames, self._ticks(time.perf_counter() - self._clock)
+
+    def _expose(self, memory, index=None):
+        # the scene is rendered for the whole sensor and the AOI is read out of it, written at the start of the buffer
+        x, y, width, height = self.aoi
+        if width > memory.width or height > memory.height:
+            raise ValueError("AOI %r does not fit an image memory of %dx%d" % (self.aoi, memory.width, memory.height))
+        index = self.frame_count if index is None else index
+        image = self.frames(index, self.sensor_width, self.sensor_height, memory.bits // 8)
+        image = image.reshape(self.sensor_height, self.sensor_width, -1)
+        kind, f = self.reduction
+        if kind == "subsampling":
+            image = image[::f, ::f]
+        elif kind == "binning":
+            rows, cols = self.image_height(), self.image_width()
+            image = image[:rows * f, :cols * f].reshape(rows, f, cols, f, -1).mean(axis=(1, 3)).astype(np.uint8)
+        if self.rop & self.IS_SET_ROP_MIRROR_UPDOWN:
+            image = image[:self.image_height()][::-1]
+        if self.rop & self.IS_SET_ROP_MIRROR_LEFTRIGHT:
+            image = image[:, :self.image_width()][:, ::-1]
+        target = window(memory.array(), 0, 0, width, height)
+        target[...] = image[y:y + height, x:x + width].reshape(target.shape)
+        self.frame_count += 1
+        self.bytes_transferred += width * height * (memory.bits // 8)
+        if self.line_time_us:
+            time.sleep(height * self.line_time_us * 1e-6)
+
+    def is_WaitForNextImage(self, hCam, timeout, mem, mem_id):
+        if not (self._queue and self._capturing):
+            return self.IS_TIMED_OUT
+        received = self._next_frame(_value(timeout))
+        if received is None:
+            return self.IS_TIMED_OUT
+        for step in range(len(self._sequence)):
+            position = (self._next + step) % len(self._sequence)
+            target = self._sequence[position]
+            if target not in self._locked:
+                break
+        self._next = (position + 1) % len(self._sequence)
+        memory = self._memories[target]
+        self._expose(memory, received[0])
+        self._info[target] = received
+        self._locked.add(target)
+        mem.value = memory.address
+        mem_id.value = target
+        return self.IS_SUCCESS
+
+    def is_UnlockSeqBuf(self, hCam, num, mem):
+        address = ctypes.cast(mem, ctypes.c_void_p).value
+        for mem_id, memory in self._memories.items():
+            if memory.address == address:
+                self._locked.discard(mem_id)
+                return self.IS_SUCCESS
+        return self.IS_INVALID_PARAMETER
+
+    def is_GetImageInfo(self, hCam, nImageBufferID, pImageInfo, nImageInfoSize):
+        received = self._info.get(_value(nImageBufferID))
+        if received is None:
+            return self.IS_INVALID_PARAMETER
+        pImageInfo.u64FrameNumber, pImageInfo.u64TimestampDevice = received
+        pImageInfo.dwImageBuffers = len(self._sequence)
+        pImageInfo.dwImageBuffersInUse = len(self._locked)
+        pImageInfo.dwImageWidth, pImageInfo.dwImageHeight = self.aoi[2:]
+        return self.IS_SUCCESS
+
+    def get_data(self, mem, width, height, bits, pitch, copy):
+        # single-buffer path of the original scripts: expose into the active memory and return it flat
+        memory = self._memories[self._active]
+        if self._capturing:
+            self._expose(memory)
+        data = np.frombuffer(memory.buffer, np.uint8)
+        return data.copy() if copy else data
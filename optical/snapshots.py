@@ -0,0 +1,107 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Background snapshot writer
+#
+# Pressing s used to encode a JPEG and write it to disk inside the display loop. SnapshotWriter hands the image
+# and its measurement to a small pool of writer threads through a bounded queue instead: save() returns at once,
+# and when the queue is full the snapshot is dropped (and counted) rather than stalling the loop. Images are
+# written lossless, as PNG or as the raw array in .npy, each with a .json file holding the measurement.
+#
+#     writer = SnapshotWriter("snapshots", fmt="png")
+#     writer.save(dic2['image'], {'frame': 12, 'XDifference': 1.5}, "Optical2021-03-0912-00-00-000000")
+#     writer.close()                      # writes whatever is still queued
+#     print(writer.report())
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import json
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+FORMATS = ("png", "npy")
+
+
+def _plain(value):
+    # numpy scalars and arrays in a measurement dictionary, as something json can write
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return dict((k, _plain(v)) for k, v in value.items())
+    return value
+
+
+class SnapshotWriter(object):
+    """Writes snapshots to directory on worker threads; at most depth snapshots wait to be written."""
+
+    def __init__(self, directory, fmt="png", workers=2, depth=8):
+        if fmt not in FORMATS:
+            raise ValueError("unknown snapshot format %r, expected one of %s" % (fmt, ", ".join(FORMATS)))
+        self.directory = directory
+        self.fmt = fmt
+        self.saved = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(depth)
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name="snapshot-%d" % i) for i in range(workers)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def save(self, image, metadata, name):
+        """Queue image (and metadata, a dictionary) to be written as name.png / name.npy and name.json.
+
+        Returns False if the queue was full and the snapshot was dropped. image must not be modified afterwards.
+        """
+        try:
+            self._queue.put_nowait((image, metadata, name))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def _write(self, image, metadata, name):
+        # created on the first save, so a session without snapshots leaves no empty folder behind
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        if self.fmt == "png":
+            if not cv2.imwrite(path + ".png", image):
+                raise IOError("cv2.imwrite could not write %s.png" % path)
+        else:
+            np.save(path + ".npy", image)
+        with open(path + ".json", "w") as f:
+            json.dump(_plain(metadata), f, indent=1)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except (IOError, OSError, cv2.error) as e:
+                print("Snapshot %s not written: %s" % (item[2], e))
+                with self._lock:
+                    self.failed += 1
+            else:
+                with self._lock:
+                    self.saved += 1
+
+    def close(self):
+        """Write the snapshots still queued and stop the workers."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def report(self):
+        return "Snapshots: %d saved, %d dropped (writer busy), %d failed, in %s" % (self.saved, self.dropped,
+                                                                                  self.failed, self.directory)
@@ -0,0 +1,295 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Frame sources
+#
+# A source has read(), returning the next Frame or None when there are no more frames, and close().
+# Frames coming from the camera are locked ring buffers: whoever consumes a Frame calls release() once the
+# pixels are no longer needed. For frames that own their memory release() does nothing. Camera frames also carry
+# the camera frame counter and device timestamp, and RingSource counts the sensor frames that never arrived in
+# source.gaps (optical/gaps.py). Recordings also have
+# len() and seek(index), so several processes can each read their own part of one (see optical/batch.py).
+#
+# Backends: RingSource (the uEye camera, or optical/sim.py), SessionSource / ArraySource (a recorded session or
+# a .npy stack, memory-mapped), DirectorySource (a folder of images), VideoSource (a video file) and
+# SyntheticSource (generated fiber ends). Everything except the camera hands out frames as fast as it can read
+# them, so a replay measures the throughput of the processing and not the frame rate of the recording.
+# add_source_arguments() / open_source() give every script the same command line options to pick one.
+#
+#     for frame in each_frame(open_source(args)):
+#         image = cv2.flip(frame.array, -1)
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from optical.camera import Camera
+from optical.frameview import window
+from optical.gaps import GapCounter
+from optical.recorder import Session, is_session
+
+
+class Frame(object):
+    """One acquired frame. aoi is the sensor window (x, y, width, height) the pixels came from, None for full frame.
+
+    counter and device_time are the camera frame number and timestamp (seconds on the camera clock), None when the
+    frame did not come from a camera.
+    """
+
+    __slots__ = ("array", "index", "timestamp", "aoi", "counter", "device_time", "_release")
+
+    def __init__(self, array, index, timestamp=None, release=None, aoi=None, counter=None, device_time=None):
+        self.array = array
+        self.index = index
+        self.timestamp = time.perf_counter() if timestamp is None else timestamp
+        self.aoi = aoi
+        self.counter = counter
+        self.device_time = device_time
+        self._release = release
+
+    def release(self):
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+
+def mono8(image, pool=None):
+    """image as a 2-D Mono8 array: unchanged if it is one, a view of the only channel of an (h, w, 1) array, and
+    converted from BGR / BGRA otherwise (into a buffer of pool, an optical.buffers.BufferPool, if given)."""
+    if image.ndim == 2:
+        return image
+    channels = image.shape[2]
+    if channels == 1:
+        return image[:, :, 0]
+    dst = pool.take("mono8", image.shape[:2]) if pool is not None else None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY if channels == 3 else cv2.COLOR_BGRA2GRAY, dst=dst)
+
+
+class RingSource(object):
+    """Live frames from an opened optical.camera.Camera, cropped to the AOI they were captured with."""
+
+    def __init__(self, camera, timeout_ms=1000):
+        self.camera = camera
+        self.timeout_ms = timeout_ms
+        self.gaps = GapCounter()
+        self._index = 0
+
+    def read(self):
+        # AOI changes requested by other threads are applied here, between frames, by the thread that owns the camera
+        self.camera.apply_aoi_request()
+        locked = None
+        while locked is None:
+            locked = self.camera.ring.wait(self.timeout_ms)
+            if locked is None:
+                print("is_WaitForNextImage timed out")
+        # the driver writes the AOI image at the top left of the memory, with the pitch of the full frame
+        x, y, width, height = self.camera.aoi
+        frame = Frame(window(locked.array, 0, 0, width, height), self._index, release=locked.release, aoi=self.camera.aoi,
+                      counter=locked.counter, device_time=locked.device_time)
+        if frame.counter is not None:
+            self.gaps.observe(frame.counter, frame.device_time, frame.timestamp)
+        self._index += 1
+        return frame
+
+    def close(self):
+        self.camera.close()
+
+
+class ArraySource(object):
+    """Recorded frames held in memory, e.g. np.load('session.npy') with shape (n, height, width)."""
+
+    def __init__(self, frames, repeat=1):
+        self.frames = frames
+        self.repeat = repeat
+        self._index = 0
+
+    def read(self):
+        if self._index >= len(self.frames) * self.repeat:
+            return None
+        frame = Frame(self.frames[self._index % len(self.frames)], self._index)
+        self._index += 1
+        return frame
+
+    def __len__(self):
+        return len(self.frames) * self.repeat
+
+    def seek(self, index):
+        # the next read() returns frame index
+        self._index = index
+
+    def close(self):
+        pass
+
+
+class DirectorySource(ArraySource):
+    """Recorded frames saved as image files in one directory, read in file name order as Mono8."""
+
+    EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+    def __init__(self, path, repeat=1):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(self.EXTENSIONS))
+        ArraySource.__init__(self, [os.path.join(path, n) for n in names], repeat)
+
+    def read(self):
+        frame = ArraySource.read(self)
+        if frame is not None:
+            frame.array = cv2.imread(frame.array, cv2.IMREAD_GRAYSCALE)
+        return frame
+
+
+class SessionSource(ArraySource):
+    """Frames of a session written by optical.recorder.SessionRecorder, with their recorded timestamps and AOI."""
+
+    def __init__(self, path, repeat=1):
+        self.session = Session(path)
+        ArraySource.__init__(self, self.session.index, repeat)
+
+    def read(self):
+        if self._index >= len(self.frames) * self.repeat:
+            return None
+        i = self._index % len(self.frames)
+        row = self.session.index[i]
+        aoi = (int(row['x']), int(row['y']), int(row['width']), int(row['height']))
+        device_time = float(row['device_time']) if 'device_time' in row.dtype.names else np.nan
+        frame = Frame(self.session.frame(i), self._index, float(row['timestamp']), aoi=aoi, counter=int(row['counter']),
+                      device_time=None if np.isnan(device_time) else device_time)
+        self._index += 1
+        return frame
+
+
+class VideoSource(object):
+    """Frames of a video file, decoded with cv2.VideoCapture and converted to Mono8."""
+
+    EXTENSIONS = ('.avi', '.mp4', '.mkv', '.mov', '.wmv')
+
+    def __init__(self, path, repeat=1):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise IOError("cannot open video %s" % path)
+        self.repeat = repeat
+        self._index = 0
+        self._pass = 1
+
+    def read(self):
+        ok, image = self.capture.read()
+        if not ok and self._pass < self.repeat and self._index > 0:
+            self._pass += 1
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self.capture.read()
+        if not ok:
+            return None
+        frame = Frame(mono8(image), self._index)
+        self._index += 1
+        return frame
+
+    def __len__(self):
+        return int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)) * self.repeat
+
+    def seek(self, index):
+        count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if count <= 0:
+            # streams and some containers do not know their length: seek within the first pass
+            self._pass = 1
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        else:
+            self._pass = index // count + 1
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, index % count)
+        self._index = index
+
+    def close(self):
+        self.capture.release()
+
+
+class SyntheticSource(ArraySource):
+    """count frames of the simulated fiber ends (optical/synthetic.py render() with SCENE) at full sensor size.
+
+    The scene is rendered once, copied into the first cycle frames up front and then repeated, so reading costs
+    nothing.
+    """
+
+    def __init__(self, count, width=2560, height=1920, cycle=8):
+        from optical.synthetic import SCENE, render
+        image = render(width, height, **SCENE)[0]
+        ArraySource.__init__(self, [image.copy() for i in range(min(cycle, count))])
+        self.count = count
+
+    def read(self):
+        if self._index >= self.count:
+            return None
+        frame = Frame(self.frames[self._index % len(self.frames)], self._index)
+        self._index += 1
+        return frame
+
+    def __len__(self):
+        return self.count
+
+
+def open_recording(path, repeat=1):
+    """SessionSource for a recorded session, VideoSource for a video, ArraySource for a .npy file, DirectorySource
+    for a folder of images."""
+    if os.path.isdir(path):
+        return DirectorySource(path, repeat)
+    if is_session(path):
+        return SessionSource(path, repeat)
+    if path.lower().endswith(VideoSource.EXTENSIONS):
+        return VideoSource(path, repeat)
+    return ArraySource(np.load(path, mmap_mode='r'), repeat)
+
+
+def each_frame(source):
+    """Iterate over the frames of source until it runs out. Each frame is released when the next one is asked for
+    (or when the loop is left), so a loop body can use frame.array without thinking about ring buffers."""
+    while True:
+        frame = source.read()
+        if frame is None:
+            return
+        try:
+            yield frame
+        finally:
+            frame.release()
+
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Command line
+
+def add_source_arguments(parser):
+    parser.add_argument("--camera", type=int, default=0,
+                        help="0: first available camera;  1-254: the camera with the specified camera ID")
+    parser.add_argument("--color", action="store_true",
+                        help="acquire colour sensors in colour (for the display only, frames are measured in Mono8)")
+    parser.add_argument("--parameters", metavar="FILE.ini",
+                        help="camera parameter set: loaded at start if it was saved for this camera and downscale, "
+                             "otherwise the camera is set up from scratch and its parameters are saved here")
+    parser.add_argument("--sim", action="store_true", help="use the simulated camera of optical/sim.py instead of pyueye")
+    parser.add_argument("--sim-color", action="store_true", help="simulate a colour sensor")
+    parser.add_argument("--sim-fps", type=float, default=None,
+                        help="let the simulated camera run freely at this frame rate, losing frames when processing lags")
+    parser.add_argument("--sim-gaps", type=float, default=0.0, metavar="RATE",
+                        help="fraction of sensor frames the simulated camera loses at random")
+    parser.add_argument("--replay", help="measure a recording instead of the camera: a session written with "
+                                         "--record, a .npy file, a video file or a folder of images")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="measure N generated frames instead of the camera")
+    parser.add_argument("--repeat", type=int, default=1, help="play a recording this many times")
+    return parser
+
+
+def uses_camera(args):
+    return args.replay is None and args.synthetic is None
+
+
+def open_source(args, scale=None, buffers=4, verbose=True, orientation=None):
+    """The source chosen with the add_source_arguments() options. scale, buffers and orientation are passed on to the
+    Camera."""
+    if args.replay is not None:
+        return open_recording(args.replay, args.repeat)
+    if args.synthetic is not None:
+        return SyntheticSource(args.synthetic)
+    api = None
+    if args.sim:
+        from optical.sim import SimulatedUEye
+        api = SimulatedUEye(bits_per_pixel=32 if args.sim_color else 8, frame_rate=args.sim_fps,
+                            gap_rate=args.sim_gaps)
+    camera = Camera(args.camera, buffers=buffers, api=api, verbose=verbose, scale=scale,
+                    parameters=args.parameters, color=args.color, orientation=orientation).open()
+    return RingSource(camera)
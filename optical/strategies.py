@@ -0,0 +1,273 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Interchangeable measurement strategies
+#
+# The script variants share the camera, scaling and flip and differ only in how they find the two fiber ends in
+# the scaled, flipped Mono8 image. Each of those processing blocks is a Strategy here, registered under a name:
+#   4_points    goodFeaturesToTrack corner pairs -> end face midpoints (4_points.py, optical/measure.py)
+#   track       the same, followed with optical flow between detections (4_points.py --track, optical/tracking.py)
+#   predict     the same, searched around a Kalman prediction (4_points.py --predict, optical/motion.py)
+#   moments     centroids of the small Canny contours (SimpleLive_Pyueye_OpenCV_1_05032021.py, ..._with_X_Difference.py)
+#   dnn         centres of the boxes of a Caffe SSD detector (SimpleLive_Pyueye_OpenCV_1_090321_test.py)
+# and every one returns the same small Measurement record, so they can be swapped on the command line
+# (4_points.py --strategy, python -m optical.batch --strategy) and compared on the same frames in one process
+# (benchmarks/bench_strategies.py).
+#
+#     strategy = create("moments", AcquisitionScale(3))
+#     m = strategy.measure(cv2.flip(scale.apply(frame), -1))
+#     m = strategy.measure_rotated(scale.apply(frame))      # the same, without flipping the frame if the strategy can
+#     m.found, m.mids, m.x_um, m.y_um
+#     m.dic2()                            # the dic2 dictionary the overlay and the AOI tracker work on
+#
+# measure_frame() is the whole per-frame measurement of a raw frame (scale, Mono8, orientation, strategy) that
+# 4_points.py, the supervisor, the batch analyzer and the benchmarks run:
+#
+#     m = measure_frame(frame.array, scale, orientation, strategy, pool)
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import collections
+import os
+
+import cv2
+import numpy as np
+
+from optical.buffers import BufferPool
+from optical.measure import external_contours, measure_4_points
+from optical.motion import PredictiveWindow
+from optical.scale import REFERENCE_SCALE
+from optical.sources import mono8
+from optical.tracking import CornerTracker
+
+STRATEGIES = collections.OrderedDict()      # name -> Strategy subclass, in registration order
+
+
+def register(cls):
+    """Class decorator adding a Strategy subclass to STRATEGIES under cls.name."""
+    STRATEGIES[cls.name] = cls
+    return cls
+
+
+def create(name, scale, pix=2.75, **options):
+    """A new instance of the strategy registered as name; pix is um per pixel at REFERENCE_SCALE."""
+    if name not in STRATEGIES:
+        raise ValueError("unknown measurement strategy %r, expected one of %s" % (name, ", ".join(STRATEGIES)))
+    return STRATEGIES[name](scale, pix, **options)
+
+
+class Measurement(object):
+    """Result of one frame: the end face midpoints (x, y) in pixels of the measured image and the X/Y difference
+    between the first two in um (first minus second, 0 unless two were found).
+
+    detail is the strategy's own dic2 (corners, pairs, ...) when it has one, for drawing and the AOI tracker.
+    measure_frame() sets image, the Mono8 image that was measured, and color, the colour frame it came from (None
+    for a Mono8 frame).
+    """
+
+    __slots__ = ("mids", "x_um", "y_um", "detail", "image", "color")
+
+    def __init__(self, mids=(), x_um=0.0, y_um=0.0, detail=None):
+        self.mids = mids
+        self.x_um = x_um
+        self.y_um = y_um
+        self.detail = detail
+        self.image = None
+        self.color = None
+
+    @property
+    def found(self):
+        return len(self.mids) >= 2
+
+    @classmethod
+    def from_dic2(cls, dic2):
+        return cls(tuple(dic2['XYTupleList']), dic2['XDifference'], dic2['YDifference'], dic2)
+
+    def dic2(self):
+        if self.detail is not None:
+            return self.detail
+        return {'XYTupleList': list(self.mids), 'XDifference': self.x_um, 'YDifference': self.y_um, 'corners': None,
+                'groups': [], 'pairs': []}
+
+
+def _ordered(mids, spans, pix):
+    # the ends from left to right; pairs are (bottom, top) of each end like the corner pairs of measure_4_points,
+    # here the vertical extent of the contour or box, so the overlay and the AOI tracker work unchanged
+    order = sorted(range(len(mids)), key=lambda k: mids[k][0])
+    mids = [mids[k] for k in order]
+    pairs = [((mids[n][0], spans[k][1]), (mids[n][0], spans[k][0])) for n, k in enumerate(order)]
+    x_um = y_um = 0.0
+    if len(mids) >= 2:
+        x_um = (mids[0][0] - mids[1][0]) * pix
+        y_um = (mids[0][1] - mids[1][1]) * pix
+    dic2 = {'XYTupleList': mids, 'XDifference': x_um, 'YDifference': y_um, 'corners': None, 'groups': [],
+            'pairs': pairs}
+    return Measurement.from_dic2(dic2)
+
+
+def _untimed(stage, fn, *args):
+    return fn(*args)
+
+
+def measure_frame(array, scale, orientation, strategy, pool=None, metrics=None):
+    """The Measurement of one raw frame: reduced by what the sensor did not already bin or subsample (scale, an
+    optical.scale.AcquisitionScale), converted to Mono8 and measured with strategy the right way up (orientation,
+    an optical.orientation.Orientation).
+
+    The intermediates go into buffers of pool (an optical.buffers.BufferPool) if given, and metrics (an
+    optical.metrics.Metrics) times the scale, mono and detect stages. m.image and m.color never look at array: with
+    the whole reduction done by the sensor the scaled frame is array itself, a ring buffer or frame bus slot that
+    is reused as soon as the frame is released, while the display, the snapshots and the "track" strategy keep the
+    image longer, so it is copied.
+    """
+    timed = metrics.timed if metrics is not None else _untimed
+    frame = timed("scale", scale.apply, array, pool)
+    if np.shares_memory(frame, array):
+        kept = pool.take("frame", frame.shape, frame.dtype) if pool is not None else np.empty_like(frame)
+        kept[...] = frame
+        frame = kept
+    mono = timed("mono", mono8, frame, pool) if frame.ndim == 3 else frame
+    m = timed("detect", orientation.measure, strategy, mono)
+    m.image = mono
+    m.color = frame if mono is not frame else None
+    return m
+
+
+class Strategy(object):
+    """Base class: measure(image) takes a scaled, flipped Mono8 image and returns a Measurement.
+
+    scale is the optical.scale.AcquisitionScale the image was reduced with; the pixel size and the corner distance
+    windows, calibrated at REFERENCE_SCALE, are converted to it. pool keeps the intermediates of measure() from one
+    frame to the next (optical/buffers.py); a strategy is used by one thread.
+    """
+
+    name = None
+
+    def __init__(self, scale, pix=2.75):
+        self.scale = scale
+        self.pix = scale.pixel_size(pix)
+        self.y_window = scale.window(200, 223)
+        self.x_window = scale.window(0, 8)
+        self.pool = BufferPool()
+
+    def measure(self, image):
+        raise NotImplementedError
+
+    def measure_rotated(self, image):
+        """The Measurement of cv2.flip(image, -1), for frames that were not turned the right way up.
+
+        This flips image; a strategy that can find the same result on image itself and rotate only the coordinates
+        overrides it (optical/orientation.py).
+        """
+        return self.measure(cv2.flip(image, -1, dst=self.pool.take("rotated", image.shape)))
+
+    def report(self):
+        """One line about how the strategy went, printed at exit, or None."""
+        return None
+
+
+@register
+class FourPoints(Strategy):
+
+    name = "4_points"
+
+    def measure(self, image):
+        return Measurement.from_dic2(measure_4_points(image, self.pix, self.y_window, self.x_window, pool=self.pool))
+
+    def measure_rotated(self, image):
+        return Measurement.from_dic2(measure_4_points(image, self.pix, self.y_window, self.x_window, rotated=True,
+                                                      pool=self.pool))
+
+
+@register
+class Track(Strategy):
+
+    name = "track"
+
+    def __init__(self, scale, pix=2.75):
+        Strategy.__init__(self, scale, pix)
+        self.tracker = CornerTracker(self.pix, self.y_window, self.x_window, pool=self.pool)
+
+    def measure(self, image):
+        return Measurement.from_dic2(self.tracker.measure(image))
+
+    def report(self):
+        t = self.tracker
+        return "Corner tracking: %d frames tracked, %d detections, %d times lost" % (t.tracked, t.detections, t.losses)
+
+
+@register
+class Predict(Strategy):
+
+    name = "predict"
+
+    def __init__(self, scale, pix=2.75):
+        Strategy.__init__(self, scale, pix)
+        self.window = PredictiveWindow(lambda image: measure_4_points(image, self.pix, self.y_window, self.x_window,
+                                                                      pool=self.pool),
+                                       self.pix, self.y_window)
+
+    def measure(self, image):
+        return Measurement.from_dic2(self.window.measure(image))
+
+    def report(self):
+        w = self.window
+        return "Predictive window: %d frames searched in a window, %d full frames, %d misses" % (w.windowed, w.full,
+                                                                                               w.misses)
+
+
+@register
+class Moments(Strategy):
+    """Blur, Canny, threshold, external contours; the centroid of every contour with an area in area_window
+    (px at REFERENCE_SCALE, scaled with the square of the scale) is one end."""
+
+    name = "moments"
+
+    def __init__(self, scale, pix=2.75, area_window=(30, 50)):
+        Strategy.__init__(self, scale, pix)
+        ratio = scale.scale / REFERENCE_SCALE
+        self.area_window = (area_window[0] * ratio ** 2, area_window[1] * ratio ** 2)
+
+    def measure(self, image):
+        pool = self.pool
+        blurred = cv2.GaussianBlur(image, (5, 5), 0, dst=pool.take("blur", image.shape))
+        edges = cv2.Canny(blurred, 100, 255, edges=pool.take("edges", image.shape), apertureSize=5, L2gradient=True)
+        thresh = cv2.threshold(edges, 254, 255, cv2.THRESH_BINARY, dst=edges)[1]
+        cnts = external_contours(thresh)
+        low, high = self.area_window
+        mids, spans = [], []
+        for c in cnts:
+            M = cv2.moments(c)
+            if M["m00"] > low and low < cv2.contourArea(c) < high:
+                mids.append((M["m10"] / M["m00"], M["m01"] / M["m00"]))
+                x, y, w, h = cv2.boundingRect(c)
+                spans.append((y, y + h))
+        return _ordered(mids, spans, self.pix)
+
+
+@register
+class DNN(Strategy):
+    """Boxes of a Caffe SSD detector with at least confidence; the centres of the two most confident are the ends.
+
+    The network files are not part of the repository; prototxt and model default to the names the test script
+    loaded from the working directory.
+    """
+
+    name = "dnn"
+
+    def __init__(self, scale, pix=2.75, prototxt="deploy.prototxt", model="MobileNetSSD_deploy.caffemodel",
+                 confidence=0.5):
+        Strategy.__init__(self, scale, pix)
+        for path in (prototxt, model):
+            if not os.path.isfile(path):
+                raise IOError("the dnn strategy needs the Caffe network files, %s not found" % path)
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.confidence = confidence
+
+    def measure(self, image):
+        rows, cols = image.shape[:2]
+        bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+        self.net.setInput(cv2.dnn.blobFromImage(bgr, 1.0, (cols, rows), (104.0, 177.0, 123.0)))
+        detections = self.net.forward()[0, 0]
+        detections = detections[detections[:, 2] > self.confidence]
+        detections = detections[np.argsort(-detections[:, 2])][:2]
+        boxes = detections[:, 3:7] * np.array([cols, rows, cols, rows])
+        mids = [((x0 + x1) / 2.0, (y0 + y1) / 2.0) for x0, y0, x1, y1 in boxes]
+        return _ordered(mids, [(y0, y1) for x0, y0, x1, y1 in boxes], self.pix)
@@ -0,0 +1,358 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Several cameras at once: one acquisition and measurement process per camera
+#
+#     python -m optical.supervisor [--cameras 1,2] [--seconds 60] [--out station.csv] [--every 5] [--sim 2]
+#
+# 4_points.py drives one camera from module-level state, so a station with a top and a side camera needed two copies
+# of it. The supervisor lists the connected cameras (is_GetCameraList, optical.camera.list_cameras), or takes the IDs
+# given with --cameras, and starts one worker process per camera. Every worker opens its camera and runs the
+# 4_points.py measurement on its own Pipeline (acquisition and measurement threads, optical/pipeline.py); the cameras
+# do not share a GIL, and each worker keeps OpenCV to one thread. Workers send their result rows and, every --every
+# seconds, their pipeline statistics back over one queue. The supervisor writes the rows of all cameras to one CSV
+# (--out, with a camera column), prints the throughput of each camera as it goes and a report at the end. A camera
+# that cannot be opened is reported and the others run on. Ctrl+C or --seconds stops every worker.
+#
+# --sim N runs against N simulated cameras (optical/sim.py), each worker with its own.
+#
+# With --analysts N a worker only acquires: it copies every frame into a FrameBus (optical/framebus.py) and N
+# analysis processes of its own measure one N-th of the frames each, straight from the shared slots, and send their
+# rows to the supervisor. One camera then uses up to N + 1 cores instead of sharing one GIL between acquisition and
+# measurement. The bus drops the oldest frames an analysis process has not got to, like the worker's pipeline.
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import csv
+import multiprocessing
+import queue
+import signal
+import time
+
+import cv2
+
+from optical.api import UEyeError, ueye_api
+from optical.buffers import BufferPool
+from optical.camera import Camera, list_cameras
+from optical.framebus import FrameBus
+from optical.orientation import Orientation, MODES as ORIENTATIONS
+from optical.pipeline import Pipeline, DROP_OLDEST
+from optical.scale import AcquisitionScale, MODES
+from optical.sources import RingSource, each_frame
+from optical.strategies import STRATEGIES, create, measure_frame
+
+COLUMNS = ("camera", "frame", "counter", "device_time", "timestamp", "ends", "x1", "y1", "x2", "y2",
+           "x_difference_um", "y_difference_um")
+
+OPTIONS = {
+    'downscale': 3,
+    'scale_mode': "auto",
+    'orientation': "auto",
+    'strategy': "4_points",
+    'pix': 2.75,
+    'queue': 2,
+    'parameters': None,     # parameter set file per camera, e.g. "station_{camera}.ini"
+    'every': 5.0,           # seconds between two statistics messages of a worker
+    'analysts': 0,          # analysis processes per camera behind a frame bus, 0 to measure in the worker
+    'sim': 0,               # number of simulated cameras, 0 for the real ones
+    'sim_fps': None,
+}
+
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Worker process
+
+def _row(camera_id, frame, m):
+    (x1, y1), (x2, y2) = m.mids[:2] if m.found else ((None, None), (None, None))
+    return (camera_id, frame.index, frame.counter, frame.device_time, frame.timestamp, len(m.mids), x1, y1, x2, y2,
+            m.x_um if m.found else None, m.y_um if m.found else None)
+
+
+def _stats(stats, source):
+    stats.update(sensor_missed=source.gaps.missed, sensor_fps=source.gaps.sensor_fps())
+    return stats
+
+
+def _bus_stats(bus, acquired, started):
+    # the keys of Pipeline.stats() for a worker with analysts: frames read by an analyst count as measured
+    s = bus.stats()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    measured = sum(r['read'] for r in s['readers'])
+    return {'elapsed_s': elapsed, 'acquired': acquired, 'measured': measured,
+            'dropped': s['dropped'] + sum(r['missed'] for r in s['readers']), 'acquired_fps': acquired / elapsed,
+            'measured_fps': measured / elapsed, 'analysts': len(s['readers']), 'policy': s['policy']}
+
+
+def analyze(camera_id, bus, part, scale, orientation, options, results):
+    """Analysis process of a worker with analysts: measure the part (i, n) of the frames on bus, sending
+    ("row", id, row) to results, until the worker closes the bus."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cv2.setNumThreads(1)
+    strategy = create(options['strategy'], scale, options['pix'])
+    buffers = BufferPool()
+    reader = bus.attach(part)
+    for frame in each_frame(reader):
+        m = measure_frame(frame.array, scale, orientation, strategy, buffers)
+        results.put(("row", camera_id, _row(camera_id, frame, m)))
+    reader.close()
+
+
+def _publish(camera_id, camera, source, scale, orientation, options, results, stop):
+    # --analysts: acquire into a frame bus until stop is set, and return the statistics
+    n = options['analysts']
+    bus = FrameBus(camera.width, camera.height, camera.bits_per_pixel, slots=n + options['queue'], readers=n,
+                   policy=DROP_OLDEST)
+    analysts = [multiprocessing.Process(target=analyze, name="camera %d analyst %d" % (camera_id, i),
+                                        args=(camera_id, bus, (i, n), scale, orientation, options, results),
+                                        daemon=True) for i in range(n)]
+    for process in analysts:
+        process.start()
+    while bus.attached() < n and all(process.is_alive() for process in analysts):
+        time.sleep(0.01)
+    acquired, error = 0, None
+    started = time.perf_counter()
+    next_stats = started + options['every']
+    try:
+        while not stop.is_set() and all(process.is_alive() for process in analysts):
+            frame = source.read()
+            try:
+                bus.publish(frame)
+            finally:
+                frame.release()
+            acquired += 1
+            if time.perf_counter() >= next_stats:
+                results.put(("stats", camera_id, _stats(_bus_stats(bus, acquired, started), source)))
+                next_stats += options['every']
+    except Exception as e:
+        error = e
+    # let the analysts get to the frames still in the bus before counting
+    deadline = time.perf_counter() + 2.0
+    while any(r['behind'] for r in bus.stats()['readers']) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    stats = _stats(_bus_stats(bus, acquired, started), source)
+    bus.close()
+    for process in analysts:
+        process.join(2.0)
+        if process.is_alive():
+            process.terminate()
+    if error is None and any(process.exitcode for process in analysts):
+        error = "an analysis process exited with code %s" % max(process.exitcode for process in analysts)
+    if error is not None:
+        stats['error'] = error if isinstance(error, str) else repr(error)
+    return stats
+
+
+def run_camera(camera_id, options, results, stop):
+    """Acquire and measure camera_id until stop (a multiprocessing.Event) is set, sending ("open", id, info),
+    ("row", id, row), ("stats", id, stats) and finally ("closed", id, stats) or ("error", id, message) to results."""
+    # Ctrl+C reaches every process of the console; the supervisor stops the workers through stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cv2.setNumThreads(1)
+    api = None
+    if options['sim']:
+        from optical.sim import SimulatedUEye
+        api = SimulatedUEye(cameras=options['sim'], frame_rate=options['sim_fps'])
+    scale = AcquisitionScale(options['downscale'], options['scale_mode'])
+    orientation = Orientation(options['orientation'])
+    parameters = options['parameters']
+    try:
+        strategy = create(options['strategy'], scale, options['pix'])
+        camera = Camera(camera_id, buffers=options['queue'] + 2, api=api, verbose=False, scale=scale,
+                        parameters=parameters.format(camera=camera_id) if parameters else None,
+                        orientation=orientation).open()
+    except (UEyeError, IOError) as e:
+        results.put(("error", camera_id, str(e)))
+        return
+    results.put(("open", camera_id, {'serial_no': camera.serial_no, 'sensor': camera.sensor_name,
+                                     'width': camera.width, 'height': camera.height, 'orientation': orientation.applied}))
+    source = RingSource(camera)
+    if options['analysts']:
+        stats = _publish(camera_id, camera, source, scale, orientation, options, results, stop)
+        source.close()
+        results.put(("closed", camera_id, stats))
+        return
+    buffers = BufferPool()
+
+    def measure(array):
+        return measure_frame(array, scale, orientation, strategy, buffers)
+
+    def sink(frame, m):
+        results.put(("row", camera_id, _row(camera_id, frame, m)))
+
+    pipeline = Pipeline(source, measure, depth=options['queue'], policy=DROP_OLDEST, sink=sink).start()
+    while not stop.wait(options['every']) and pipeline.running():
+        results.put(("stats", camera_id, _stats(pipeline.stats(), source)))
+    pipeline.stop()
+    stats = _stats(pipeline.stats(), source)
+    if pipeline.error is not None:
+        stats['error'] = repr(pipeline.error)
+    source.close()
+    results.put(("closed", camera_id, stats))
+
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Supervisor
+
+class Supervisor(object):
+    """One run_camera() process per camera ID, and what they report.
+
+    cameras[id] holds the state ("starting", "running", "closed" or "failed"), the info the worker sent when the
+    camera was open, its latest pipeline statistics, the number of rows received and of those with both fiber ends,
+    and the error, if any. sink(row) is called with every result row, in the order they arrive.
+    """
+
+    def __init__(self, camera_ids, options=None, sink=None):
+        self.options = dict(OPTIONS, **(options or {}))
+        self.sink = sink
+        self.cameras = dict((camera_id, {'state': "starting", 'info': {}, 'stats': {}, 'rows': 0, 'found': 0,
+                                         'error': None}) for camera_id in camera_ids)
+        self._results = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        self._processes = {}
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        for camera_id in self.cameras:
+            # a worker with analysts starts processes of its own, which a daemon process may not
+            process = multiprocessing.Process(target=run_camera, name="camera %d" % camera_id,
+                                              args=(camera_id, self.options, self._results, self._stop),
+                                              daemon=not self.options['analysts'])
+            process.start()
+            self._processes[camera_id] = process
+        return self
+
+    def _handle(self, kind, camera_id, payload):
+        camera = self.cameras[camera_id]
+        if kind == "row":
+            camera['rows'] += 1
+            camera['found'] += payload[5] >= 2
+            if self.sink is not None:
+                self.sink(payload)
+        elif kind == "open":
+            camera['state'], camera['info'] = "running", payload
+        elif kind == "stats":
+            camera['stats'] = payload
+        elif kind == "closed":
+            camera['state'], camera['stats'], camera['error'] = "closed", payload, payload.get('error')
+        elif kind == "error":
+            camera['state'], camera['error'] = "failed", payload
+
+    def poll(self, timeout=0.1):
+        """Handle the messages that arrive within timeout seconds; False once every worker is done."""
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                self._handle(*self._results.get(timeout=max(deadline - time.perf_counter(), 0)))
+            except queue.Empty:
+                break
+        for camera_id, process in self._processes.items():
+            if not process.is_alive() and self.cameras[camera_id]['state'] in ("starting", "running"):
+                # died without saying goodbye
+                self.cameras[camera_id].update(state="failed", error="exit code %s" % process.exitcode)
+        return any(camera['state'] in ("starting", "running") for camera in self.cameras.values())
+
+    def stop(self, timeout=10.0):
+        """Stop every worker and collect their last messages."""
+        self._stop.set()
+        deadline = time.perf_counter() + timeout
+        while self.poll(0.1) and time.perf_counter() < deadline:
+            pass
+        for process in self._processes.values():
+            process.join(max(deadline - time.perf_counter(), 0.1))
+            if process.is_alive():
+                process.terminate()
+        self.poll(0)
+
+    def status(self):
+        """One line per camera: state, frames acquired, measured and dropped, rates, sensor frames missed and how
+        often both fiber ends were found."""
+        lines = []
+        for camera_id, camera in sorted(self.cameras.items()):
+            s = camera['stats']
+            line = "camera %d %-8s %s" % (camera_id, camera['state'], camera['info'].get('serial_no', ""))
+            if s:
+                line += (": %d acquired (%.1f fps), %d measured (%.1f fps), %d dropped, %d sensor frames missed"
+                         % (s['acquired'], s['acquired_fps'], s['measured'], s['measured_fps'], s['dropped'],
+                            s['sensor_missed']))
+            if camera['rows']:
+                line += ", both ends in %.0f%%" % (100.0 * camera['found'] / camera['rows'])
+            if camera['error']:
+                line += " (%s)" % camera['error']
+            lines.append(line)
+        return "\n".join(lines)
+
+    def report(self):
+        elapsed = time.perf_counter() - self._started if self._started is not None else 0.0
+        rows = sum(camera['rows'] for camera in self.cameras.values())
+        return "%s\n%d cameras, %d results in %.1f s (%.1f per second together)" % (
+            self.status(), len(self.cameras), rows, elapsed, rows / max(elapsed, 1e-9))
+
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Command line
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure with every connected camera, one process per camera")
+    parser.add_argument("--cameras", help="comma separated camera IDs (default: every camera is_GetCameraList finds)")
+    parser.add_argument("--seconds", type=float, default=None, help="stop after this long (default: Ctrl+C)")
+    parser.add_argument("--out", help="write the results of all cameras to this CSV file")
+    parser.add_argument("--every", type=float, default=OPTIONS['every'], help="seconds between two status reports")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default=OPTIONS['strategy'],
+                        help="how the fiber ends are found (see optical/strategies.py)")
+    parser.add_argument("--downscale", type=int, default=OPTIONS['downscale'],
+                        help="shrink frames by this integer factor before measuring, as 4_points.py --downscale")
+    parser.add_argument("--scale-mode", choices=MODES, default=OPTIONS['scale_mode'])
+    parser.add_argument("--orientation", choices=ORIENTATIONS, default=OPTIONS['orientation'])
+    parser.add_argument("--queue", type=int, default=OPTIONS['queue'], help="frames buffered per camera")
+    parser.add_argument("--analysts", type=int, default=OPTIONS['analysts'], metavar="N",
+                        help="measure in N processes per camera, fed over shared memory (optical/framebus.py), "
+                             "instead of in the camera's worker")
+    parser.add_argument("--parameters", metavar="FILE.ini",
+                        help="parameter set file per camera, {camera} is replaced by the ID, e.g. station_{camera}.ini")
+    parser.add_argument("--sim", type=int, default=0, metavar="N", help="use N simulated cameras (optical/sim.py)")
+    parser.add_argument("--sim-fps", type=float, default=None,
+                        help="let the simulated cameras run freely at this frame rate")
+    args = parser.parse_args()
+
+    if args.cameras:
+        camera_ids = [int(c) for c in args.cameras.split(",")]
+    else:
+        if args.sim:
+            from optical.sim import SimulatedUEye
+            api = SimulatedUEye(cameras=args.sim)
+        else:
+            api = ueye_api()
+        found = list_cameras(api)
+        for c in found:
+            print("camera %(camera_id)d (device %(device_id)d): %(model)s %(serial_no)s%(busy)s"
+                  % dict(c, busy=", in use" if c['in_use'] else ""))
+        camera_ids = [c['open_id'] for c in found if not c['in_use']]
+    if not camera_ids:
+        raise SystemExit("no camera to measure with")
+
+    options = dict(downscale=args.downscale, scale_mode=args.scale_mode, orientation=args.orientation,
+                   strategy=args.strategy, queue=args.queue, parameters=args.parameters, every=args.every,
+                   analysts=args.analysts,
+                   sim=args.sim, sim_fps=args.sim_fps)
+    out = open(args.out, "w", newline="") if args.out else None
+    writer = None
+    if out is not None:
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+    supervisor = Supervisor(camera_ids, options, writer.writerow if writer is not None else None).start()
+    deadline = time.perf_counter() + args.seconds if args.seconds is not None else None
+    next_status = time.perf_counter() + args.every
+    try:
+        while supervisor.poll(0.1) and (deadline is None or time.perf_counter() < deadline):
+            if time.perf_counter() >= next_status:
+                print(supervisor.status())
+                next_status += args.every
+    except KeyboardInterrupt:
+        pass
+    supervisor.stop()
+    if out is not None:
+        out.close()
+    print(supervisor.report())
+
+
+if __name__ == "__main__":
+    main()
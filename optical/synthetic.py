@@ -0,0 +1,121 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Synthetic fiber end images with known offsets
+#
+# Renders the two fiber ends the way the camera sees them (bright fibers on a dark background, end faces facing
+# each other across a gap, slightly slanted) with a chosen sub-pixel offset of the second fiber, end face angle,
+# blur, noise and illumination gradient, at any resolution, and returns the true X/Y difference in um that
+# measure_4_points should report for it.
+#
+# The scene has a fixed field of view: the full 2560 x 1920 sensor at 0.825 um per pixel (2.75 um per pixel of the
+# 0.3-scaled image 4_points.py is calibrated on), so a smaller width/height renders the same scene with larger
+# pixels. Edges are anti-aliased with 8 fractional bits, so offsets well below a pixel change the image.
+# It is the only fiber scene: the simulated camera (optical/sim.py fiber_scene) and --synthetic render SCENE with it.
+#
+#     image, truth = render(dx_um=1.5, dy_um=-0.7, blur=1.0, noise=2.0)
+#     images, truth = generate(100, seed=1, dy_um=(-20, 20), angle=(0.5, 1.5), width=853, height=640)
+#     truth['y_um']                       # (100,) true Y differences, measured value should match in magnitude
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import math
+
+import cv2
+import numpy as np
+
+SENSOR = (2560, 1920)
+SENSOR_PIXEL_UM = 0.825         # um per sensor pixel; 2.75 um at 0.3 scale
+
+PARAMETERS = ("dx_um", "dy_um", "angle", "blur", "noise", "gradient")
+TRUTH_DTYPE = np.dtype([('x_um', '<f8'), ('y_um', '<f8')] + [(name, '<f8') for name in PARAMETERS])
+
+_SHIFT = 8                      # fractional bits of the polygon coordinates
+
+# render() arguments of the scene the simulated camera sees: the second fiber 3 sensor pixels lower, sharp and clean
+SCENE = dict(dy_um=3 * SENSOR_PIXEL_UM, blur=0.0, noise=0.0, background=0)
+
+
+def pixel_um(width):
+    """um per pixel of a rendered image width pixels wide."""
+    return SENSOR_PIXEL_UM * SENSOR[0] / float(width)
+
+
+def end_faces(width=2560, height=1920, dx_um=0.0, dy_um=0.0, angle=0.8):
+    """The two fiber outlines as float (4, 2) polygons, and the midpoints of their end faces.
+
+    dx_um / dy_um move the second (right) fiber; angle is the tilt of the end faces from vertical in degrees.
+    """
+    face = 0.38 * height                        # end face height, 219 px once scaled by 0.3 at 1920 lines
+    gap = max(4.0, width / 40.0)
+    slant = face * math.tan(math.radians(angle))
+    top = (height - face) / 2.0
+    mid = width / 2.0
+    dx, dy = dx_um / pixel_um(width), dy_um / pixel_um(width)
+    outside = 2.0 * width                       # the far ends of the fibers are off the image
+    left = np.array([[-outside, top], [mid - gap / 2, top], [mid - gap / 2 - slant, top + face],
+                     [-outside, top + face]])
+    right = np.array([[mid + gap / 2 + dx, top + dy], [outside, top + dy], [outside, top + face + dy],
+                      [mid + gap / 2 + slant + dx, top + face + dy]])
+    midpoints = np.array([(left[1] + left[2]) / 2, (right[0] + right[3]) / 2])
+    return left, right, midpoints
+
+
+def render(width=2560, height=1920, dx_um=0.0, dy_um=0.0, angle=0.8, blur=1.0, noise=2.0, gradient=0.0,
+           background=20, level=200, rng=None):
+    """One Mono8 image and its ground truth.
+
+    blur is the Gaussian sigma in pixels (0: none), noise the sigma of additive Gaussian noise in grey levels,
+    gradient the relative change of brightness from the left to the right edge (0.2: 10 % darker on the left,
+    10 % brighter on the right). Returns (image, truth) where truth has x_um / y_um, the X/Y difference between the
+    two end face midpoints (second minus first), and the parameters used.
+    """
+    left, right, midpoints = end_faces(width, height, dx_um, dy_um, angle)
+    mask = np.zeros((height, width), np.uint8)
+    polygons = [np.round(p * (1 << _SHIFT)).astype(np.int32) for p in (left, right)]
+    cv2.fillPoly(mask, polygons, 255, cv2.LINE_AA, _SHIFT)
+
+    image = mask.astype(np.float32) * ((level - background) / 255.0) + background
+    if gradient:
+        image *= np.linspace(1 - gradient / 2.0, 1 + gradient / 2.0, width, dtype=np.float32)
+    if blur > 0:
+        image = cv2.GaussianBlur(image, (0, 0), blur)
+    if noise > 0:
+        rng = rng if rng is not None else np.random.default_rng()
+        # cv2.randn is several times faster than numpy on a full frame; seeding it from rng keeps batches repeatable
+        cv2.setRNGSeed(int(rng.integers(1 << 31)))
+        image += cv2.randn(np.empty(image.shape, np.float32), 0.0, noise)
+    image = np.clip(np.rint(image), 0, 255).astype(np.uint8)
+
+    x_um, y_um = (midpoints[1] - midpoints[0]) * pixel_um(width)
+    truth = dict(x_um=float(x_um), y_um=float(y_um), dx_um=dx_um, dy_um=dy_um, angle=angle, blur=blur, noise=noise,
+                 gradient=gradient)
+    return image, truth
+
+
+def _values(value, n, rng):
+    # a scalar, a (low, high) range to draw uniformly from, or one value per image
+    if np.isscalar(value):
+        return np.full(n, float(value))
+    value = np.asarray(value, np.float64)
+    if value.shape == (2,) and n != 2:
+        return rng.uniform(value[0], value[1], n)
+    if value.shape != (n,):
+        raise ValueError("expected a number, a (low, high) range or %d values, got shape %s" % (n, value.shape))
+    return value
+
+
+def generate(n, seed=None, width=2560, height=1920, dx_um=0.0, dy_um=0.0, angle=0.8, blur=1.0, noise=2.0,
+             gradient=0.0):
+    """n images as one (n, height, width) uint8 array and their ground truth as a TRUTH_DTYPE array.
+
+    Every parameter of render() is a number, a (low, high) range drawn from uniformly per image, or a sequence of
+    n values (e.g. np.linspace(0, 5, n) for a fiber moving across a recording). seed makes the batch repeatable.
+    """
+    rng = np.random.default_rng(seed)
+    params = dict(dx_um=dx_um, dy_um=dy_um, angle=angle, blur=blur, noise=noise, gradient=gradient)
+    columns = dict((name, _values(params[name], n, rng)) for name in PARAMETERS)
+    images = np.empty((n, height, width), np.uint8)
+    truth = np.zeros(n, TRUTH_DTYPE)
+    for i in range(n):
+        values = dict((name, columns[name][i]) for name in PARAMETERS)
+        images[i], t = render(width, height, rng=rng, **values)
+        truth[i] = tuple(t[name] for name in TRUTH_DTYPE.names)
+    return images, truth
@@ -0,0 +1,97 @@
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Optical-flow tracking of the four end face corners
+#
+# The fiber ends barely move from one frame to the next, so once measure_4_points has found the two end faces
+# their four corners are followed with pyramidal Lucas-Kanade flow instead of running contours and
+# goodFeaturesToTrack again. Every tracked frame is checked twice:
+#   - forward-backward: the corners are tracked back to the previous frame and must land where they started
+#   - geometry: each end face's two corners must still be inside the y/x distance windows
+# If either check fails the frame is measured from scratch and tracking restarts from that detection.
+#
+#     tracker = CornerTracker(pix=2.75)
+#     dic2 = tracker.measure(image)       # same dictionary as measure_4_points, plus dic2['mode']
+#---------------------------------------------------------------------------------------------------------------------------------------
+
+import cv2
+import numpy as np
+
+from optical.measure import measure_4_points
+
+
+class CornerTracker(object):
+
+    def __init__(self, pix=2.75, y_window=(200, 223), x_window=(0, 8), fb_threshold=1.0, win_size=21, max_level=3,
+                 pool=None):
+        self.pix = pix
+        self.y_window = y_window
+        self.x_window = x_window
+        self.fb_threshold = fb_threshold        # largest forward-backward error accepted, in pixels
+        self.pool = pool                        # optical.buffers.BufferPool of the detections, or None
+        self.lk_params = dict(winSize=(win_size, win_size), maxLevel=max_level,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+        self.detections = 0
+        self.tracked = 0
+        self.losses = 0
+        self.reset()
+
+    def reset(self):
+        self._previous = None
+        self._points = None         # (4, 1, 2) float32: bottom and top corner of the first end face, then the second
+
+    def _detect(self, image):
+        dic2 = measure_4_points(image, self.pix, self.y_window, self.x_window, pool=self.pool)
+        dic2['mode'] = 'detect'
+        self.detections += 1
+        if len(dic2['pairs']) >= 2:
+            self._points = np.array([p for pair in dic2['pairs'][:2] for p in pair], np.float32).reshape(-1, 1, 2)
+            self._previous = image
+        else:
+            self.reset()
+        return dic2
+
+    def _track(self, image):
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self._previous, image, self._points, None, **self.lk_params)
+        if points is None or not status.all():
+            return None
+        back, status, _ = cv2.calcOpticalFlowPyrLK(image, self._previous, points, None, **self.lk_params)
+        if back is None or not status.all():
+            return None
+        if np.abs(back - self._points).reshape(-1, 2).max() > self.fb_threshold:
+            return None
+
+        xy = points.reshape(-1, 2)
+        rows, cols = image.shape[:2]
+        if (xy < 0).any() or (xy[:, 0] >= cols).any() or (xy[:, 1] >= rows).any():
+            return None
+        # each end face: bottom corner minus top corner must still look like an end face
+        y_distance = xy[0::2, 1] - xy[1::2, 1]
+        x_distance = np.abs(xy[0::2, 0] - xy[1::2, 0])
+        if not ((self.y_window[0] < y_distance) & (y_distance < self.y_window[1]) &
+                (self.x_window[0] < x_distance) & (x_distance < self.x_window[1])).all():
+            return None
+        return points
+
+    def measure(self, image):
+        """Measure one scaled and flipped Mono8 frame, tracking the corners of the previous one when possible."""
+        if self._points is None or self._previous.shape != image.shape:
+            return self._detect(image)
+        points = self._track(image)
+        if points is None:
+            self.losses += 1
+            return self._detect(image)
+
+        self.tracked += 1
+        self._points = points
+        self._previous = image
+        xy = points.reshape(-1, 2).astype(np.float64)
+        midpoints = (xy[0::2] + xy[1::2]) * 0.5
+        xDifference, yDifference = midpoints[0] - midpoints[1]
+        return {
+            'XYTupleList': [(float(cX), float(cY)) for cX, cY in midpoints],
+            'XDifference': float(xDifference) * self.pix,
+            'YDifference': float(yDifference) * self.pix,
+            'corners': points,
+            'groups': [],
+            'pairs': [(tuple(xy[0]), tuple(xy[1])), (tuple(xy[2]), tuple(xy[3]))],
+            'mode': 'track',
+        }